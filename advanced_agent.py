@@ -3,9 +3,11 @@ Advanced Car Detailer Marketing Agent
 Extended features for sophisticated marketing automation
 """
 
-from main import CarDetailerMarketingAgent
-from typing import Dict, List
+from main import CarDetailerMarketingAgent, print_output
+from registry import ADVANCED_GENERATORS, CORE_GENERATORS
+from typing import Dict, Iterator, List, Optional
 import json
+import sys
 
 
 class AdvancedMarketingAgent(CarDetailerMarketingAgent):
@@ -13,226 +15,72 @@ class AdvancedMarketingAgent(CarDetailerMarketingAgent):
     Extended marketing agent with advanced features
     """
 
+    generators = CORE_GENERATORS + ADVANCED_GENERATORS
+
     def generate_local_seo_strategy(self, business_name: str, service_area: str, google_rating: float) -> str:
         """Generate comprehensive local SEO strategy"""
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Create a detailed local SEO strategy for a car detailing business:
-        
-        Business Name: {business_name}
-        Service Area: {service_area}
-        Current Google Rating: {google_rating}/5.0
-        
-        Include:
-        1. Google My Business Optimization Checklist
-        2. Local Keyword Strategy
-        3. Citation Building Plan
-        4. Review Generation System
-        5. Local Link Building
-        6. Schema Markup Implementation
-        7. Monthly Action Items
-        8. Expected Traffic Growth Timeline
-        """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1600,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("generate_local_seo_strategy", business_name, service_area, google_rating)
 
     def create_video_marketing_strategy(self, business_type: str, monthly_budget: float) -> str:
         """Design a video marketing strategy for TikTok and YouTube Shorts"""
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Create a viral video marketing strategy for a {business_type} car detailing business 
-        with a ${monthly_budget} monthly video budget.
-        
-        Provide:
-        1. Video Content Ideas (30 short videos)
-        2. Equipment & Production Requirements
-        3. Platform-Specific Strategies (TikTok, YouTube Shorts, Instagram Reels)
-        4. Hashtag & SEO Strategy for Videos
-        5. Monetization Opportunities
-        6. Team & Resource Requirements
-        7. Budget Breakdown
-        8. Expected Viral Metrics & KPIs
-        9. Editing & Publishing Workflow
-        10. Collaboration Opportunities
-        """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=2000,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("create_video_marketing_strategy", business_type, monthly_budget)
 
     def create_fleet_marketing_strategy(self, industry_targets: List[str], service_area: str) -> str:
         """Generate B2B fleet customer acquisition strategy"""
-        
-        industries = ", ".join(industry_targets)
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Create a B2B fleet marketing strategy for car detailing targeting:
-        Industries: {industries}
-        Service Area: {service_area}
-        
-        Include:
-        1. Fleet Manager Buyer Personas
-        2. Target Company List & Criteria
-        3. Cold Outreach Email Sequences
-        4. ROI Case Studies & Proposals
-        5. Fleet Contract Templates
-        6. Volume Pricing Strategy
-        7. Account Management Plans
-        8. Partnership Opportunities
-        9. Implementation Timeline
-        10. Expected Close Rates & Deal Size
-        """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1800,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("create_fleet_marketing_strategy", industry_targets, service_area)
 
     def create_influencer_partnership_plan(self, niche: str, region: str, budget: float) -> str:
         """Design influencer marketing partnerships"""
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Create an influencer partnership strategy for a car detailing business:
-        Niche: {niche}
-        Region: {region}
-        Partnership Budget: ${budget}
-        
-        Include:
-        1. Influencer Tier Strategy (Macro, Micro, Nano)
-        2. Ideal Influencer Profiles & Niches
-        3. Finding & Vetting Process
-        4. Outreach Email Templates
-        5. Partnership Deal Structures
-        6. Content Requirements & Guidelines
-        7. Performance Metrics & Tracking
-        8. Budget Allocation
-        9. Contract Template Elements
-        10. Long-term Relationship Building
-        """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1600,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("create_influencer_partnership_plan", niche, region, budget)
 
     def generate_crisis_management_plan(self, business_name: str) -> str:
         """Create crisis communication and reputation management plan"""
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Create a crisis management and reputation protection plan for {business_name}.
-        
-        Include:
-        1. Potential Crisis Scenarios
-        2. Response Templates for Each Scenario
-        3. Media Response Procedures
-        4. Social Media Crisis Protocol
-        5. Review Management Strategy
-        6. Legal Coordination Guidelines
-        7. Customer Communication Templates
-        8. Team Communication Plan
-        9. Prevention Strategies
-        10. Recovery & Rebuilding Strategy
-        """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1500,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("generate_crisis_management_plan", business_name)
 
     def generate_partnership_strategy(self, potential_partners: List[str], service_area: str) -> str:
         """Design strategic partnership opportunities"""
-        
-        partners = ", ".join(potential_partners)
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Create a strategic partnership strategy for a car detailing business in {service_area}.
-        Potential Partners: {partners}
-        
-        Include:
-        1. Partner Evaluation Criteria
-        2. Partnership Models (Revenue Share, Referral, Co-Marketing)
-        3. Outreach & Pitch Templates
-        4. Mutual Benefit Analysis for Each Partner
-        5. Contract Framework
-        6. Co-Marketing Campaign Ideas
-        7. Integration & Operational Plans
-        8. Performance Metrics
-        9. Long-term Relationship Building
-        10. Scaling Partnership Model
-        """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1700,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("generate_partnership_strategy", potential_partners, service_area)
+
+    def create_retention_marketing_strategy(self, average_customer_lifetime: int, repeat_rate: float,
+                                            figures: Optional[Dict[str, float]] = None) -> str:
+        """Design customer retention and lifetime value optimization
 
-    def create_retention_marketing_strategy(self, average_customer_lifetime: int, repeat_rate: float) -> str:
-        """Design customer retention and lifetime value optimization"""
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Create a comprehensive customer retention strategy for a car detailing business:
-        Average Customer Lifetime (months): {average_customer_lifetime}
-        Current Repeat Purchase Rate: {repeat_rate*100}%
-        
-        Include:
-        1. Customer Lifecycle Mapping
-        2. Retention Marketing Funnel
-        3. Win-Back Campaigns for Inactive Customers
-        4. Loyalty Program Design
-        5. Subscription Model Options
-        6. VIP/Premium Tier Strategy
-        7. Personalized Communication Plan
-        8. Customer Satisfaction Surveys
-        9. NPS Improvement Strategies
-        10. Lifetime Value Projections
+        figures (e.g. from analytics.LocationMetrics.figures) are given to the
+        model as computed values instead of being estimated.
         """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1600,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("create_retention_marketing_strategy", average_customer_lifetime, repeat_rate, figures)
+
+    def stream_local_seo_strategy(self, business_name: str, service_area: str, google_rating: float) -> Iterator[str]:
+        """Stream generate_local_seo_strategy output as text deltas"""
+        return self.stream("generate_local_seo_strategy", business_name, service_area, google_rating)
+
+    def stream_video_marketing_strategy(self, business_type: str, monthly_budget: float) -> Iterator[str]:
+        """Stream create_video_marketing_strategy output as text deltas"""
+        return self.stream("create_video_marketing_strategy", business_type, monthly_budget)
+
+    def stream_fleet_marketing_strategy(self, industry_targets: List[str], service_area: str) -> Iterator[str]:
+        """Stream create_fleet_marketing_strategy output as text deltas"""
+        return self.stream("create_fleet_marketing_strategy", industry_targets, service_area)
+
+    def stream_influencer_partnership_plan(self, niche: str, region: str, budget: float) -> Iterator[str]:
+        """Stream create_influencer_partnership_plan output as text deltas"""
+        return self.stream("create_influencer_partnership_plan", niche, region, budget)
+
+    def stream_crisis_management_plan(self, business_name: str) -> Iterator[str]:
+        """Stream generate_crisis_management_plan output as text deltas"""
+        return self.stream("generate_crisis_management_plan", business_name)
+
+    def stream_partnership_strategy(self, potential_partners: List[str], service_area: str) -> Iterator[str]:
+        """Stream generate_partnership_strategy output as text deltas"""
+        return self.stream("generate_partnership_strategy", potential_partners, service_area)
+
+    def stream_retention_marketing_strategy(self, average_customer_lifetime: int, repeat_rate: float,
+                                            figures: Optional[Dict[str, float]] = None) -> Iterator[str]:
+        """Stream create_retention_marketing_strategy output as text deltas"""
+        return self.stream("create_retention_marketing_strategy", average_customer_lifetime, repeat_rate, figures)
 
 
-def demo_advanced_features():
+def demo_advanced_features(stream: bool = False):
     """Demonstrate advanced agent capabilities"""
     
     agent = AdvancedMarketingAgent()
@@ -243,34 +91,36 @@ def demo_advanced_features():
     
     # Local SEO
     print("\n1. LOCAL SEO STRATEGY\n")
-    seo_strategy = agent.generate_local_seo_strategy(
-        "Shine & Sparkle Detailing",
-        "Austin, TX",
-        4.8
-    )
-    print(seo_strategy)
+    if stream:
+        print_output(agent.stream_local_seo_strategy("Shine & Sparkle Detailing", "Austin, TX", 4.8))
+    else:
+        print_output(agent.generate_local_seo_strategy("Shine & Sparkle Detailing", "Austin, TX", 4.8))
     print("\n" + "=" * 80)
     
     # Video Marketing
     print("\n2. VIDEO MARKETING STRATEGY\n")
-    video_strategy = agent.create_video_marketing_strategy("independent", 500)
-    print(video_strategy)
+    if stream:
+        print_output(agent.stream_video_marketing_strategy("independent", 500))
+    else:
+        print_output(agent.create_video_marketing_strategy("independent", 500))
     print("\n" + "=" * 80)
     
     # Fleet Marketing
     print("\n3. FLEET MARKETING STRATEGY\n")
-    fleet_strategy = agent.create_fleet_marketing_strategy(
-        ["Taxi Services", "Rental Companies", "Logistics"],
-        "Austin, TX"
-    )
-    print(fleet_strategy)
+    industries = ["Taxi Services", "Rental Companies", "Logistics"]
+    if stream:
+        print_output(agent.stream_fleet_marketing_strategy(industries, "Austin, TX"))
+    else:
+        print_output(agent.create_fleet_marketing_strategy(industries, "Austin, TX"))
     print("\n" + "=" * 80)
     
     # Retention Strategy
     print("\n4. CUSTOMER RETENTION STRATEGY\n")
-    retention = agent.create_retention_marketing_strategy(24, 0.45)
-    print(retention)
+    if stream:
+        print_output(agent.stream_retention_marketing_strategy(24, 0.45))
+    else:
+        print_output(agent.create_retention_marketing_strategy(24, 0.45))
 
 
 if __name__ == "__main__":
-    demo_advanced_features()
+    demo_advanced_features(stream="--stream" in sys.argv[1:])
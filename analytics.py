@@ -0,0 +1,204 @@
+"""
+Local analytics for the Car Detailer Marketing Agent
+Holds BusinessMetrics for many locations as NumPy columns and computes
+lifetime value, projected leads, channel budget splits and location rankings
+in one vectorized pass, so prompts get real figures instead of asking the
+model to estimate them
+"""
+
+from dataclasses import asdict, fields
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError as exc:  # only this module needs numpy
+    raise ImportError("analytics requires numpy: pip install numpy") from exc
+
+from config import BusinessMetrics, MarketingChannels, MarketingConfig
+
+
+METRIC_FIELDS: Tuple[str, ...] = tuple(field.name for field in fields(BusinessMetrics))
+
+CHANNELS: Tuple[str, ...] = (
+    "social_media", "email", "local_seo", "paid_ads", "content_marketing", "partnerships", "referral", "video",
+)
+
+# Default cost per lead ($) and lead quality relative to the location's own
+# conversion rate, per channel. Override with the benchmarks argument.
+CHANNEL_BENCHMARKS: Dict[str, Tuple[float, float]] = {
+    "social_media": (28.0, 0.8),
+    "email": (8.0, 1.3),
+    "local_seo": (18.0, 1.2),
+    "paid_ads": (45.0, 1.0),
+    "content_marketing": (30.0, 0.7),
+    "partnerships": (25.0, 1.1),
+    "referral": (15.0, 1.6),
+    "video": (35.0, 0.8),
+}
+
+MAX_REPEAT_RATE = 0.95  # caps expected visits at 20 per customer
+
+
+def _channel_flags(channels: Optional[MarketingChannels]) -> List[bool]:
+    if channels is None:
+        return [True] * len(CHANNELS)
+    return [bool(channels.social_media) if name == "social_media" else bool(getattr(channels, name))
+            for name in CHANNELS]
+
+
+def _safe_divide(numerator: "np.ndarray", denominator: "np.ndarray") -> "np.ndarray":
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, float), np.asarray(denominator, float))
+    return np.divide(numerator, denominator, out=np.zeros(numerator.shape), where=denominator != 0)
+
+
+class LocationMetrics:
+    """
+    Columnar BusinessMetrics for many locations
+    One float64 array per metric field, plus each location's monthly budget
+    and a locations x CHANNELS matrix of the channels it runs.
+    """
+
+    def __init__(self, names: Sequence[str], columns: Dict[str, "np.ndarray"], budgets: "np.ndarray",
+                 channels: "np.ndarray", benchmarks: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.names = list(names)
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("Location names must be unique")
+        self.columns = {name: np.asarray(columns[name], dtype=float) for name in METRIC_FIELDS}
+        self.budgets = np.asarray(budgets, dtype=float)
+        self.channels = np.asarray(channels, dtype=bool)
+        benchmarks = {**CHANNEL_BENCHMARKS, **(benchmarks or {})}
+        self.cost_per_lead = np.array([benchmarks[name][0] for name in CHANNELS])
+        self.lead_quality = np.array([benchmarks[name][1] for name in CHANNELS])
+        self._index = {name: row for row, name in enumerate(self.names)}
+        self._summaries: Dict[float, Dict[str, "np.ndarray"]] = {}
+
+    @classmethod
+    def from_metrics(cls, metrics: Dict[str, BusinessMetrics], budgets: Optional[Dict[str, float]] = None,
+                     channels: Optional[Dict[str, MarketingChannels]] = None, **kwargs) -> "LocationMetrics":
+        """Build the store from {location: BusinessMetrics}, with optional budgets and channels per location"""
+        names = list(metrics)
+        rows = [asdict(metrics[name]) for name in names]
+        columns = {field: np.array([row[field] for row in rows], dtype=float) for field in METRIC_FIELDS}
+        budget_column = np.array([(budgets or {}).get(name, 0.0) for name in names], dtype=float)
+        channel_matrix = np.array([_channel_flags((channels or {}).get(name)) for name in names],
+                                  dtype=bool).reshape(len(names), len(CHANNELS))
+        return cls(names, columns, budget_column, channel_matrix, **kwargs)
+
+    @classmethod
+    def from_configs(cls, configs: Iterable[MarketingConfig], **kwargs) -> "LocationMetrics":
+        """Build the store from MarketingConfigs, keyed by business name; each needs metrics"""
+        configs = list(configs)
+        missing = [config.business_name for config in configs if config.metrics is None]
+        if missing:
+            raise ValueError(f"Configs without metrics: {', '.join(missing)}")
+        return cls.from_metrics(
+            {config.business_name: config.metrics for config in configs},
+            budgets={config.business_name: config.monthly_budget for config in configs},
+            channels={config.business_name: config.channels for config in configs},
+            **kwargs,
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def row(self, name: str) -> int:
+        try:
+            return self._index[name]
+        except KeyError:
+            raise KeyError(f"Unknown location: {name}") from None
+
+    def expected_visits(self) -> "np.ndarray":
+        """Visits per customer over their lifetime, treating repeat rate as the chance of each return"""
+        return 1.0 / (1.0 - np.clip(self.columns["repeat_customer_rate"], 0.0, MAX_REPEAT_RATE))
+
+    def lifetime_months(self) -> "np.ndarray":
+        """Average customer lifetime: expected visits over visits per customer per month"""
+        monthly_visits = _safe_divide(self.columns["monthly_revenue"], self.columns["average_customer_value"])
+        visits_per_customer = _safe_divide(monthly_visits, self.columns["current_customer_base"])
+        return _safe_divide(self.expected_visits(), visits_per_customer)
+
+    def lifetime_value(self, gross_margin: float = 1.0) -> "np.ndarray":
+        """Customer lifetime value in dollars"""
+        return self.columns["average_customer_value"] * self.expected_visits() * gross_margin
+
+    def allocate_budget(self, budgets: Optional["np.ndarray"] = None) -> "np.ndarray":
+        """Split each location's budget across its channels in proportion to customers per dollar
+
+        Returns a locations x CHANNELS array of dollars; locations with no
+        channels enabled get nothing.
+        """
+        budgets = self.budgets if budgets is None else np.broadcast_to(np.asarray(budgets, float), self.budgets.shape)
+        weights = self.channels * (self.lead_quality / self.cost_per_lead)
+        return budgets[:, None] * _safe_divide(weights, weights.sum(axis=1, keepdims=True))
+
+    def projected_leads(self, budgets: Optional["np.ndarray"] = None) -> "np.ndarray":
+        """Monthly leads: current inquiries plus those the allocated budget buys"""
+        return self.columns["monthly_inquiries"] + (self.allocate_budget(budgets) / self.cost_per_lead).sum(axis=1)
+
+    def projected_customers(self, budgets: Optional["np.ndarray"] = None) -> "np.ndarray":
+        """Monthly new customers from current inquiries and paid leads, weighted by channel lead quality"""
+        conversion = np.clip(self.columns["conversion_rate"], 0.0, 1.0)
+        paid_leads = self.allocate_budget(budgets) / self.cost_per_lead
+        paid = (paid_leads * np.clip(conversion[:, None] * self.lead_quality, 0.0, 1.0)).sum(axis=1)
+        return self.columns["monthly_inquiries"] * conversion + paid
+
+    def summary(self, budgets: Optional["np.ndarray"] = None, gross_margin: float = 1.0) -> Dict[str, "np.ndarray"]:
+        """Every computed figure as a column, one entry per location
+
+        marketing_roi is NaN (missing) where nothing is spent: no budget, or no
+        channels enabled to spend it on.
+        """
+        ltv = self.lifetime_value(gross_margin)
+        budget = self.budgets if budgets is None else np.broadcast_to(np.asarray(budgets, float), self.budgets.shape)
+        customers = self.projected_customers(budget)
+        paid_customers = customers - self.columns["monthly_inquiries"] * np.clip(self.columns["conversion_rate"], 0.0, 1.0)
+        allocation = self.allocate_budget(budget)
+        roi = np.where(allocation.sum(axis=1) > 0, _safe_divide(paid_customers * ltv - budget, budget), np.nan)
+        return {
+            "lifetime_value": ltv,
+            "expected_visits": self.expected_visits(),
+            "lifetime_months": self.lifetime_months(),
+            "projected_leads": self.projected_leads(budget),
+            "projected_customers": customers,
+            "projected_revenue": customers * self.columns["average_customer_value"],
+            "marketing_roi": roi,
+            "allocation": allocation,  # locations x CHANNELS
+        }
+
+    def rank(self, by: str = "projected_revenue", descending: bool = True,
+             limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Locations ordered by a summary figure or metric column; missing (NaN) values come last"""
+        values = self.columns[by] if by in self.columns else self.summary()[by]
+        order = np.argsort(-values if descending else values, kind="stable")[:limit]
+        return [(self.names[row], float(values[row])) for row in order]
+
+    def figures(self, name: str, gross_margin: float = 1.0) -> Dict[str, float]:
+        """Labeled figures for one location, ready for a prompt's figures argument"""
+        row = self.row(name)
+        # Per-location lookups share one vectorized pass over every location
+        if gross_margin not in self._summaries:
+            self._summaries[gross_margin] = self.summary(gross_margin=gross_margin)
+        summary = self._summaries[gross_margin]
+        figures = {
+            "Customer lifetime value ($)": round(float(summary["lifetime_value"][row]), 2),
+            "Expected visits per customer": round(float(summary["expected_visits"][row]), 2),
+            "Average customer lifetime (months)": round(float(summary["lifetime_months"][row]), 1),
+            "Projected monthly leads": round(float(summary["projected_leads"][row]), 1),
+            "Projected new customers per month": round(float(summary["projected_customers"][row]), 1),
+            "Projected monthly revenue from new customers ($)": round(float(summary["projected_revenue"][row]), 2),
+        }
+        if not np.isnan(summary["marketing_roi"][row]):
+            figures["Marketing ROI on customer lifetime value"] = round(float(summary["marketing_roi"][row]), 2)
+            for channel, dollars in zip(CHANNELS, summary["allocation"][row]):
+                if dollars > 0:
+                    figures[f"Monthly budget for {channel.replace('_', ' ')} ($)"] = round(float(dollars), 2)
+        return figures
+
+    def retention_args(self, name: str) -> Dict[str, Any]:
+        """Arguments for create_retention_marketing_strategy, with the figures filled in"""
+        figures = self.figures(name)
+        return {
+            "average_customer_lifetime": max(1, int(round(figures["Average customer lifetime (months)"]))),
+            "repeat_rate": float(self.columns["repeat_customer_rate"][self.row(name)]),
+            "figures": figures,
+        }
@@ -0,0 +1,275 @@
+"""
+Artifact store for the Car Detailer Marketing Agent
+Keeps every generated output with its client, method, arguments, model, usage
+and timestamp. A SQLite index answers lookups by client, method and date
+range; bodies live in an append-only file and are read one at a time
+"""
+
+import argparse
+import codecs
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, is_dataclass
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+
+DEFAULT_ARTIFACTS_PATH = os.path.join(os.path.expanduser("~"), ".cache", "car-detailer-agent", "artifacts.sqlite3")
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+READ_CHUNK = 64 * 1024
+
+When = Union[float, datetime, date]
+
+
+def _timestamp(value: Optional[When]) -> Optional[float]:
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return value.timestamp()
+
+
+def _jsonable(value: Any) -> Any:
+    if is_dataclass(value):
+        return asdict(value)
+    return repr(value)
+
+
+def client_of(args: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The client an output belongs to, read from the generator's arguments"""
+    if not args:
+        return None
+    for name in ("client", "config"):
+        value = args.get(name)
+        for attribute in ("name", "business_name"):
+            if isinstance(getattr(value, attribute, None), str):
+                return getattr(value, attribute)
+        if isinstance(value, dict):
+            return value.get("name") or value.get("business_name")
+    for name in ("client_id", "business_name"):
+        if isinstance(args.get(name), str):
+            return args[name]
+    return None
+
+
+@dataclass(frozen=True)
+class Artifact:
+    """Index entry for one stored output; read its text with ArtifactStore.text"""
+    id: int
+    client: Optional[str]
+    method: str
+    args: Dict[str, Any]
+    model: Optional[str]
+    usage: Dict[str, int]
+    cache_hit: bool
+    created_at: float
+    body_hash: str
+    size: int  # body length in bytes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ArtifactStore:
+    """
+    Persistent, indexed store of generated outputs
+    The index is a SQLite database at path; bodies are appended to
+    path + ".bodies" and stored once per distinct text, so re-serving a cached
+    response only adds an index row.
+    """
+
+    _COLUMNS = "id, client, method, args, model, usage, cache_hit, created_at, body_hash, size"
+
+    def __init__(self, path: str = DEFAULT_ARTIFACTS_PATH):
+        self.path = path
+        self.bodies_path = path + ".bodies" if path != ":memory:" else None
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS bodies (
+                hash TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS artifacts (
+                id INTEGER PRIMARY KEY,
+                client TEXT,
+                method TEXT NOT NULL,
+                args TEXT NOT NULL,
+                model TEXT,
+                usage TEXT NOT NULL,
+                cache_hit INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                body_hash TEXT NOT NULL REFERENCES bodies (hash),
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS artifacts_client ON artifacts (client, created_at);
+            CREATE INDEX IF NOT EXISTS artifacts_method ON artifacts (method, created_at);
+            CREATE INDEX IF NOT EXISTS artifacts_created ON artifacts (created_at);
+            """
+        )
+        self._memory_bodies = bytearray() if self.bodies_path is None else None
+
+    def _append_body(self, data: bytes) -> int:
+        """Append a body and return its offset; called with the lock held"""
+        if self._memory_bodies is not None:
+            offset = len(self._memory_bodies)
+            self._memory_bodies += data
+            return offset
+        with open(self.bodies_path, "ab") as handle:
+            offset = handle.tell()
+            handle.write(data)
+        return offset
+
+    def save(self, method: str, text: str, args: Optional[Dict[str, Any]] = None, client: Optional[str] = None,
+             model: Optional[str] = None, usage: Optional[Dict[str, int]] = None, cache_hit: bool = False,
+             created_at: Optional[float] = None) -> int:
+        """Store one output and return its artifact id; client defaults to the one named in args"""
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        args_json = json.dumps(args or {}, sort_keys=True, ensure_ascii=False, default=_jsonable)
+        usage_json = json.dumps({field: int((usage or {}).get(field) or 0) for field in USAGE_FIELDS})
+        with self._lock:
+            # The body is written before the index row, so a crash can only leave unreferenced bytes
+            if self._conn.execute("SELECT 1 FROM bodies WHERE hash = ?", (digest,)).fetchone() is None:
+                offset = self._append_body(data)
+                self._conn.execute("INSERT INTO bodies VALUES (?, ?, ?)", (digest, offset, len(data)))
+            cursor = self._conn.execute(
+                "INSERT INTO artifacts (client, method, args, model, usage, cache_hit, created_at, body_hash, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (client or client_of(args), method, args_json, model, usage_json, int(cache_hit),
+                 time.time() if created_at is None else created_at, digest, len(data)),
+            )
+            return cursor.lastrowid
+
+    @staticmethod
+    def _artifact(row) -> Artifact:
+        id_, client, method, args, model, usage, cache_hit, created_at, body_hash, size = row
+        return Artifact(id_, client, method, json.loads(args), model, json.loads(usage), bool(cache_hit),
+                        created_at, body_hash, size)
+
+    def get(self, artifact_id: int) -> Optional[Artifact]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self._COLUMNS} FROM artifacts WHERE id = ?",
+                                     (artifact_id,)).fetchone()
+        return self._artifact(row) if row else None
+
+    def query(self, client: Optional[str] = None, method: Optional[str] = None, since: Optional[When] = None,
+              until: Optional[When] = None, limit: Optional[int] = None,
+              newest_first: bool = True) -> List[Artifact]:
+        """Index entries matching every given filter; bodies are not read"""
+        clauses, params = [], []
+        for column, value in (("client", client), ("method", method)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(_timestamp(since))
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(_timestamp(until))
+        sql = f"SELECT {self._COLUMNS} FROM artifacts"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY created_at {'DESC' if newest_first else 'ASC'}, id {'DESC' if newest_first else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._artifact(row) for row in rows]
+
+    def latest(self, client: Optional[str], method: str) -> Optional[Artifact]:
+        """Most recent output of method for client"""
+        found = self.query(client=client, method=method, limit=1)
+        return found[0] if found else None
+
+    def iter_text(self, artifact: Union[Artifact, int], chunk_size: int = READ_CHUNK) -> Iterator[str]:
+        """Yield an artifact's text in chunks, without reading the whole body at once"""
+        if not isinstance(artifact, Artifact):
+            found = self.get(artifact)
+            if found is None:
+                raise KeyError(f"Unknown artifact: {artifact}")
+            artifact = found
+        body_hash = artifact.body_hash
+        with self._lock:
+            offset, size = self._conn.execute("SELECT offset, size FROM bodies WHERE hash = ?",
+                                              (body_hash,)).fetchone()
+        if self._memory_bodies is not None:
+            yield bytes(self._memory_bodies[offset:offset + size]).decode("utf-8")
+            return
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        with open(self.bodies_path, "rb") as handle:
+            handle.seek(offset)
+            remaining = size
+            while remaining:
+                data = handle.read(min(chunk_size, remaining))
+                if not data:
+                    raise IOError(f"Artifact body {body_hash} is truncated")
+                remaining -= len(data)
+                text = decoder.decode(data, final=not remaining)
+                if text:
+                    yield text
+
+    def text(self, artifact: Union[Artifact, int]) -> str:
+        """An artifact's full text"""
+        return "".join(self.iter_text(artifact))
+
+    def export(self, path: str, **filters) -> int:
+        """Write matching artifacts, with their text, to a JSONL file one at a time; returns the count"""
+        count = 0
+        with open(path, "w", encoding="utf-8") as handle:
+            for artifact in self.query(**filters):
+                record = {**artifact.to_dict(), "text": self.text(artifact)}
+                handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    """Command-line entry point for browsing and exporting artifacts"""
+    parser = argparse.ArgumentParser(description="Query and export stored marketing outputs")
+    parser.add_argument("--path", default=DEFAULT_ARTIFACTS_PATH, help="artifact index (default: ~/.cache/...)")
+    parser.add_argument("--client")
+    parser.add_argument("--method")
+    parser.add_argument("--since", type=date.fromisoformat, help="YYYY-MM-DD, inclusive")
+    parser.add_argument("--until", type=date.fromisoformat, help="YYYY-MM-DD, exclusive")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--show", type=int, metavar="ID", help="print one artifact's text")
+    parser.add_argument("--export", metavar="JSONL", help="write matching artifacts with their text")
+    args = parser.parse_args()
+
+    store = ArtifactStore(args.path)
+    if args.show is not None:
+        for chunk in store.iter_text(args.show):
+            print(chunk, end="")
+        print()
+        return
+    filters = {"client": args.client, "method": args.method, "since": args.since, "until": args.until,
+               "limit": args.limit}
+    if args.export:
+        print(f"Exported {store.export(args.export, **filters)} artifacts to {args.export}")
+        return
+    for artifact in store.query(**filters):
+        created = datetime.fromtimestamp(artifact.created_at).isoformat(timespec="seconds")
+        print(f"{artifact.id}\t{created}\t{artifact.client or '-'}\t{artifact.method}\t{artifact.size} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Async Car Detailer Marketing Agent
+Concurrent generation of full client marketing packages on anthropic.AsyncAnthropic
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional, Tuple
+
+from cache import make_cache_key
+from hedging import DeadlineExceeded, deadline_at, deadline_errors, resolve_deadline, time_left
+from main import CarDetailerMarketingAgent, DetailingClient, response_text, stream_delta
+from ratelimit import stream_usage
+from canonical import Fingerprint
+from structured import ItemStreamParser, StructuredOutput, get_output
+from telemetry import CallRecord
+from advanced_agent import AdvancedMarketingAgent
+
+
+DEFAULT_MAX_CONCURRENCY = 5
+
+
+async def gather_with_limit(calls: Dict[str, Awaitable[str]],
+                            max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> Dict[str, str]:
+    """Await a mapping of named calls with at most max_concurrency in flight
+
+    Results are returned under the same names, in the order the calls were given.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(call: Awaitable[str]) -> str:
+        async with semaphore:
+            return await call
+
+    results = await asyncio.gather(*(run(call) for call in calls.values()))
+    return dict(zip(calls.keys(), results))
+
+
+class AsyncCarDetailerMarketingAgent(CarDetailerMarketingAgent):
+    """
+    Marketing agent backed by anthropic.AsyncAnthropic
+    Every generator returns an awaitable instead of a string, and every
+    stream_* variant returns an async iterator of text deltas
+    """
+
+    def _create_client(self, api_key: Optional[str]):
+        """Build the async Anthropic SDK client used for all API calls"""
+        import anthropic
+
+        max_retries = 0 if self.scheduler is not None else anthropic.DEFAULT_MAX_RETRIES
+        return anthropic.AsyncAnthropic(api_key=api_key, base_url=self.base_url, max_retries=max_retries)
+
+    async def _send(self, request, call: Optional[CallRecord] = None, deadline: Optional[float] = None):
+        """Call messages.create, through the rate limit scheduler when one is configured
+
+        A deadline cancels the call once it passes; with a hedge policy the
+        request is hedged.
+        """
+        if self.hedging is not None:
+            return await self._send_hedged(request, call, deadline)
+        if self.scheduler is None:
+            sending = self.client.messages.create(**request)
+        else:
+            on_retry = call.add_retry if call is not None else None
+            sending = self.scheduler.call_async(self.client.messages.create, request, self.priority,
+                                                on_retry=on_retry, deadline=deadline)
+        if deadline is None:
+            return await sending
+        try:
+            return await asyncio.wait_for(sending, time_left(deadline))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Generator call exceeded its deadline") from None
+
+    def _open_stream(self, request, call: Optional[CallRecord] = None, deadline: Optional[float] = None):
+        """Open a message stream (an async context manager), through the scheduler when one is configured"""
+        if self.scheduler is None:
+            return self._deadline_client(deadline).messages.stream(**request)
+        on_retry = call.add_retry if call is not None else None
+        return self.scheduler.stream_async(self.client.messages.stream, request, self.priority, on_retry=on_retry,
+                                           deadline=deadline)
+
+    async def _send_hedged(self, request, call: Optional[CallRecord], deadline: Optional[float]):
+        """Stream the request so a late first token can trigger a duplicate; return the winner's message
+
+        Each attempt goes through the scheduler on its own; a cancelled
+        attempt's tokens are added to the agent's usage.
+        """
+        async def attempt(first_token):
+            async with self._open_stream(request, call, deadline) as stream:
+                started = False
+                try:
+                    async for event in stream:
+                        if not started and stream_delta(event):
+                            started = True
+                            first_token()
+                    return await stream.get_final_message()
+                except asyncio.CancelledError:
+                    self._add_usage(stream_usage(stream))
+                    raise
+
+        return await self.hedging.run_async(call.method if call is not None else "messages.create",
+                                            attempt, deadline)
+
+    async def _complete(self, method: str, prompt: str, max_tokens: int,
+                        output: Optional[StructuredOutput] = None,
+                        fingerprint: Optional[Fingerprint] = None, model: Optional[str] = None,
+                        values: Optional[Dict[str, Any]] = None, deadline: Optional[float] = None) -> str:
+        """Send a single prompt to the model and return the response text"""
+        request = self._build_request(prompt, max_tokens, output, model)
+        key = make_cache_key(request)
+        deadline = resolve_deadline(deadline)
+
+        with self._track(method, request) as call:
+            cached = self._cached(key, request, fingerprint)
+            if cached is not None:
+                call.cache_hit = True
+                text = cached
+            elif self.coalescer is not None:
+                text = await self.coalescer.do_async(key, lambda: self._fetch(method, key, request, call, deadline))
+                self._remember(key, request, fingerprint)
+            else:
+                text = await self._fetch(method, key, request, call, deadline)
+                self._remember(key, request, fingerprint)
+        self.last_call = call
+        self._save_artifact(method, request, call, text, values)
+        return text
+
+    async def _fetch(self, method: str, key: str, request, call: CallRecord,
+                     deadline: Optional[float] = None) -> str:
+        """Call the API for a request that missed the cache and store the result"""
+        response = await self._send(request, call, deadline)
+        limit = self._truncation_limit(method, request, response)
+        spent = None
+        if limit is not None:
+            spent = self._add_usage(response.usage)
+            response = await self._send({**request, "max_tokens": limit}, call, deadline)
+        call.set_usage(self._record_retried_usage(response, spent))
+        text = response_text(response)
+
+        if self.cache is not None:
+            self.cache.set(key, method, text)
+        return text
+
+    async def _stream(self, method: str, prompt: str, max_tokens: int,
+                      output: Optional[StructuredOutput] = None,
+                      fingerprint: Optional[Fingerprint] = None,
+                      model: Optional[str] = None,
+                      values: Optional[Dict[str, Any]] = None,
+                      deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """Send a single prompt to the model and yield text deltas as they arrive"""
+        request = self._build_request(prompt, max_tokens, output, model)
+        key = make_cache_key(request)
+        deadline = resolve_deadline(deadline)
+
+        with self._track(method, request) as call:
+            call.streamed = True
+            cached = self._cached(key, request, fingerprint)
+            if cached is not None:
+                call.cache_hit = True
+                yield cached
+                self.last_call = call
+                self._save_artifact(method, request, call, cached, values)
+                return
+
+            chunks, finals = [], []
+            with deadline_errors(deadline):
+                async for text in self._stream_attempt(request, call, deadline, chunks, finals):
+                    yield text
+                limit, spent = self._truncation_limit(method, request, finals[-1]), None
+                if limit is not None and "tools" not in request:
+                    spent = self._add_usage(finals[-1].usage)
+                    continuation = self._continuation(request, "".join(chunks), limit, finals[-1])
+                    async for text in self._stream_attempt(continuation, call, deadline, chunks, finals):
+                        yield text
+                    limit = None
+                call.set_usage(self._record_retried_usage(finals[-1], spent))
+
+            text = "".join(chunks)
+            if self.cache is not None and limit is None:
+                self.cache.set(key, method, text)
+                self._remember(key, request, fingerprint)
+        self.last_call = call
+        self._save_artifact(method, request, call, text, values)
+
+    async def _stream_attempt(self, request, call: CallRecord, deadline: Optional[float], chunks: list,
+                              finals: list) -> AsyncIterator[str]:
+        """Stream one request, yielding and collecting its text deltas; appends the final message to finals"""
+        async with self._open_stream(request, call, deadline) as stream:
+            async for event in stream:
+                time_left(deadline)
+                text = stream_delta(event)
+                if not text:
+                    continue
+                call.mark_first_byte()
+                chunks.append(text)
+                yield text
+            finals.append(await stream.get_final_message())
+
+    async def generate_structured(self, name: str, *args, deadline: Optional[float] = None,
+                                  **kwargs) -> Dict[str, Any]:
+        """Run a generator in structured mode and return its parsed JSON result"""
+        output = get_output(name)
+        prepared = self.prepare(name, args, kwargs, output)
+        return json.loads(await self._complete(name, prepared.prompt, prepared.max_tokens, output,
+                                               prepared.fingerprint, prepared.model, prepared.values,
+                                               deadline_at(deadline)))
+
+    async def stream_structured(self, name: str, *args, deadline: Optional[float] = None,
+                                **kwargs) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Run a generator in structured mode, yielding (field, item) as each list item completes"""
+        output = get_output(name)
+        prepared = self.prepare(name, args, kwargs, output)
+        parser = ItemStreamParser(output.item_fields)
+        async for chunk in self._stream(name, prepared.prompt, prepared.max_tokens, output, prepared.fingerprint,
+                                        prepared.model, prepared.values, deadline_at(deadline)):
+            for item in parser.feed(chunk):
+                yield item
+
+    def _client_package_calls(self, client: DetailingClient) -> Dict[str, Awaitable[str]]:
+        """Build the generator calls that make up a client marketing package"""
+        return {
+            "marketing_strategy": self.generate_marketing_strategy(client),
+            "social_media_content": self.create_social_media_content("Ceramic Coating Services", num_posts=3),
+            "email_campaign": self.generate_email_campaign("Past Customers", "Seasonal Promotion"),
+            "referral_program": self.generate_referral_program(client.business_type, "premium"),
+            "pricing_strategy": self.generate_pricing_strategy("small", "premium", client.service_area),
+        }
+
+    async def generate_client_package(self, client: DetailingClient,
+                                      max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> Dict[str, str]:
+        """Generate every deliverable for a client concurrently"""
+        return await gather_with_limit(self._client_package_calls(client), max_concurrency)
+
+
+class AsyncAdvancedMarketingAgent(AsyncCarDetailerMarketingAgent, AdvancedMarketingAgent):
+    """
+    Advanced marketing agent backed by anthropic.AsyncAnthropic
+    """
+
+    def _client_package_calls(self, client: DetailingClient) -> Dict[str, Awaitable[str]]:
+        """Build the core package plus the advanced generators for a client"""
+        calls = super()._client_package_calls(client)
+        calls.update({
+            "local_seo_strategy": self.generate_local_seo_strategy(client.name, client.service_area, 4.8),
+            "video_marketing_strategy": self.create_video_marketing_strategy(client.business_type, 500),
+            "fleet_marketing_strategy": self.create_fleet_marketing_strategy(
+                ["Taxi Services", "Rental Companies", "Logistics"],
+                client.service_area
+            ),
+            "retention_marketing_strategy": self.create_retention_marketing_strategy(24, 0.45),
+        })
+        return calls
+
+
+async def main_async():
+    """Demo concurrent package generation"""
+
+    agent = AsyncAdvancedMarketingAgent()
+
+    client = DetailingClient(
+        name="Shine & Sparkle Detailing",
+        email="owner@shinesparkle.com",
+        phone="555-0123",
+        business_type="independent",
+        service_area="Austin, TX",
+        monthly_budget=2000,
+        goals=["Increase leads by 40%", "Build brand awareness", "Develop corporate clients"]
+    )
+
+    print("=" * 80)
+    print("ASYNC CAR DETAILER MARKETING AGENT")
+    print("=" * 80)
+    print(f"\nGenerating full package for: {client.name}\n")
+
+    package = await agent.generate_client_package(client)
+
+    for name, text in package.items():
+        print(name.replace("_", " ").upper() + ":")
+        print("-" * 80)
+        print(text)
+        print("\n" + "=" * 80)
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
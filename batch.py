@@ -0,0 +1,189 @@
+"""
+Message Batches backend for the Car Detailer Marketing Agent
+Collects generator calls into Message Batch submissions for overnight bulk work
+"""
+
+import itertools
+import re
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from cache import make_cache_key
+from canonical import Fingerprint
+from main import CarDetailerMarketingAgent, response_text
+
+
+# The API caps a single batch at 100,000 requests
+MAX_BATCH_SIZE = 100_000
+
+
+@dataclass
+class BatchCall:
+    """A generator call queued for batch execution"""
+    custom_id: str
+    method: str
+    args: Tuple[Any, ...]
+    kwargs: Dict[str, Any]
+    params: Dict[str, Any]
+    values: Dict[str, Any] = field(default_factory=dict)  # canonical bound arguments, as generate() sees them
+    fingerprint: Optional[Fingerprint] = None
+
+
+@dataclass
+class BatchResult:
+    """Outcome of a batched generator call, mapped back to its original arguments"""
+    custom_id: str
+    method: str
+    args: Tuple[Any, ...]
+    kwargs: Dict[str, Any]
+    text: Optional[str] = None
+    error: Optional[str] = None
+    usage: Dict[str, int] = field(default_factory=dict)
+    cached: bool = False
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+
+class BatchRunner:
+    """
+    Queues generator calls, submits them as Message Batches and polls for results
+    Calls already in the agent's response cache are answered without submission
+    """
+
+    def __init__(self, agent: CarDetailerMarketingAgent, batch_size: int = 10_000,
+                 poll_interval: float = 60.0, sleep: Callable[[float], None] = time.sleep):
+        if not 0 < batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+        self.agent = agent
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.sleep = sleep
+        self.calls: List[BatchCall] = []
+        self._ids = itertools.count()
+
+    def add(self, method: str, *args, **kwargs) -> str:
+        """Queue agent.<method>(*args, **kwargs) and return its custom_id"""
+        prepared = self.agent.prepare(method, args, kwargs)
+        params = self.agent._build_request(prepared.prompt, prepared.max_tokens, model=prepared.model)
+        custom_id = f"{re.sub(r'[^a-zA-Z0-9_-]', '', method)[:48]}-{next(self._ids)}"
+        self.calls.append(BatchCall(custom_id, method, args, kwargs, params, prepared.values, prepared.fingerprint))
+        return custom_id
+
+    def run(self) -> List[BatchResult]:
+        """Submit every queued call, wait for completion and return results in queue order"""
+        calls, self.calls = self.calls, []
+        results: Dict[str, BatchResult] = {}
+        pending = []
+        first_by_key: Dict[str, BatchCall] = {}
+        duplicates: List[Tuple[BatchCall, BatchCall]] = []
+        for call in calls:
+            key = make_cache_key(call.params)
+            cached = self.agent._cached(key, call.params, call.fingerprint)
+            if cached is not None:
+                results[call.custom_id] = BatchResult(call.custom_id, call.method, call.args, call.kwargs,
+                                                      text=cached, cached=True)
+            elif key in first_by_key:
+                # Identical requests are submitted once and share the result
+                duplicates.append((call, first_by_key[key]))
+            else:
+                first_by_key[key] = call
+                pending.append(call)
+
+        by_id = {call.custom_id: call for call in pending}
+        batch_ids = [self._submit(chunk) for chunk in _chunks(pending, self.batch_size)]
+        for batch_id in batch_ids:
+            self._wait(batch_id)
+            for entry in self.agent.client.messages.batches.results(batch_id):
+                call = by_id[entry.custom_id]
+                results[call.custom_id] = self._to_result(call, entry.result)
+
+        for call, original in duplicates:
+            shared = results[original.custom_id]
+            results[call.custom_id] = BatchResult(call.custom_id, call.method, call.args, call.kwargs,
+                                                  text=shared.text, error=shared.error)
+
+        return [results[call.custom_id] for call in calls]
+
+    def _submit(self, calls: List[BatchCall]) -> str:
+        batch = self.agent.client.messages.batches.create(
+            requests=[{"custom_id": call.custom_id, "params": call.params} for call in calls]
+        )
+        return batch.id
+
+    def _wait(self, batch_id: str):
+        while self.agent.client.messages.batches.retrieve(batch_id).processing_status != "ended":
+            self.sleep(self.poll_interval)
+
+    def _to_result(self, call: BatchCall, result) -> BatchResult:
+        batch_result = BatchResult(call.custom_id, call.method, call.args, call.kwargs)
+        if result.type != "succeeded":
+            error = getattr(result, "error", None)
+            batch_result.error = f"{result.type}: {error}" if error is not None else result.type
+            return batch_result
+
+        message = result.message
+        batch_result.text = response_text(message)
+        batch_result.usage = self.agent._record_usage(message)
+        if self.agent.cache is not None:
+            key = make_cache_key(call.params)
+            self.agent.cache.set(key, call.method, batch_result.text)
+            self.agent._remember(key, call.params, call.fingerprint)
+        if self.agent.artifacts is not None:
+            self.agent.artifacts.save(call.method, batch_result.text, call.values, client=self.agent.client_name,
+                                      model=call.params["model"], usage=batch_result.usage)
+        return batch_result
+
+
+def _chunks(items: List[Any], size: int) -> Iterator[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class FakeMessageBatches:
+    """
+    Offline stand-in for client.messages.batches
+    Batches end after polls_until_ended retrieve() calls; respond builds each reply
+    """
+
+    def __init__(self, respond: Optional[Callable[[Dict[str, Any]], str]] = None, polls_until_ended: int = 1,
+                 fail_ids: Tuple[str, ...] = ()):
+        self.respond = respond or (lambda params: f"[batched] {params['messages'][0]['content'].strip()[:60]}")
+        self.polls_until_ended = polls_until_ended
+        self.fail_ids = set(fail_ids)
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+
+    def create(self, requests):
+        batch_id = f"msgbatch_fake_{next(self._ids)}"
+        self.batches[batch_id] = {"requests": list(requests), "polls": 0}
+        return SimpleNamespace(id=batch_id, processing_status="in_progress")
+
+    def retrieve(self, batch_id: str):
+        batch = self.batches[batch_id]
+        batch["polls"] += 1
+        status = "ended" if batch["polls"] >= self.polls_until_ended else "in_progress"
+        return SimpleNamespace(id=batch_id, processing_status=status)
+
+    def results(self, batch_id: str):
+        for request in self.batches[batch_id]["requests"]:
+            if request["custom_id"] in self.fail_ids:
+                result = SimpleNamespace(type="errored", error="invalid_request_error")
+            else:
+                text = self.respond(request["params"])
+                usage = SimpleNamespace(input_tokens=len(str(request["params"])) // 4,
+                                        output_tokens=len(text) // 4,
+                                        cache_creation_input_tokens=0, cache_read_input_tokens=0)
+                message = SimpleNamespace(content=[SimpleNamespace(type="text", text=text)], usage=usage)
+                result = SimpleNamespace(type="succeeded", message=message)
+            yield SimpleNamespace(custom_id=request["custom_id"], result=result)
+
+
+class FakeBatchClient:
+    """Client exposing only messages.batches, backed by FakeMessageBatches"""
+
+    def __init__(self, batches: Optional[FakeMessageBatches] = None):
+        self.messages = SimpleNamespace(batches=batches or FakeMessageBatches())
@@ -0,0 +1,235 @@
+"""
+Offline benchmark suite for the Car Detailer Marketing Agent
+Runs all 13 generators against the local fake Messages API at several
+concurrency levels and appends machine-readable results for comparison
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Any, Dict, List, Sequence, Tuple
+
+from advanced_agent import AdvancedMarketingAgent
+from async_agent import AsyncAdvancedMarketingAgent, gather_with_limit
+from fake_server import FakeServerConfig, fetch_stats, serve_in_subprocess
+from hedging import HedgePolicy
+from main import DetailingClient
+from routing import Router
+from telemetry import Telemetry, percentile
+
+
+SAMPLE_CLIENT = DetailingClient(
+    name="Shine & Sparkle Detailing",
+    email="owner@shinesparkle.com",
+    phone="555-0123",
+    business_type="independent",
+    service_area="Austin, TX",
+    monthly_budget=2000,
+    goals=["Increase leads by 40%", "Build brand awareness", "Develop corporate clients"]
+)
+
+# One call per generator, with representative arguments
+GENERATOR_CALLS: List[Tuple[str, Tuple[Any, ...]]] = [
+    ("generate_marketing_strategy", (SAMPLE_CLIENT,)),
+    ("create_social_media_content", ("Ceramic Coating Services", 3)),
+    ("generate_email_campaign", ("Past Customers", "Seasonal Promotion")),
+    ("analyze_competitor", ("Elite Auto Spa", "Austin, TX")),
+    ("generate_referral_program", ("independent", "premium")),
+    ("generate_pricing_strategy", ("small", "premium", "Austin, TX")),
+    ("generate_local_seo_strategy", ("Shine & Sparkle Detailing", "Austin, TX", 4.8)),
+    ("create_video_marketing_strategy", ("independent", 500)),
+    ("create_fleet_marketing_strategy", (["Taxi Services", "Rental Companies", "Logistics"], "Austin, TX")),
+    ("create_influencer_partnership_plan", ("Car enthusiasts", "Central Texas", 1500)),
+    ("generate_crisis_management_plan", ("Shine & Sparkle Detailing",)),
+    ("generate_partnership_strategy", (["Car dealerships", "Auto body shops"], "Austin, TX")),
+    ("create_retention_marketing_strategy", (24, 0.45)),
+]
+
+STREAM_METHODS = {method: "stream_" + method.split("_", 1)[1] for method, _ in GENERATOR_CALLS}
+STREAM_METHODS["analyze_competitor"] = "stream_competitor_analysis"
+
+DEFAULT_RESULTS_PATH = "benchmark_results.jsonl"
+
+
+def _workload(rounds: int) -> List[Tuple[str, Tuple[Any, ...]]]:
+    return [call for _ in range(rounds) for call in GENERATOR_CALLS]
+
+
+def _run_sync(agent: AdvancedMarketingAgent, calls, concurrency: int, stream: bool) -> int:
+    def run(call):
+        method, args = call
+        try:
+            if stream:
+                for _ in getattr(agent, STREAM_METHODS[method])(*args):
+                    pass
+            else:
+                getattr(agent, method)(*args)
+            return 0
+        except Exception:
+            return 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return sum(pool.map(run, calls))
+
+
+def _run_async(agent: AsyncAdvancedMarketingAgent, calls, concurrency: int) -> int:
+    async def run(method, args):
+        try:
+            await getattr(agent, method)(*args)
+            return 0
+        except Exception:
+            return 1
+
+    async def run_all():
+        named = {f"{index}-{method}": run(method, args) for index, (method, args) in enumerate(calls)}
+        results = await gather_with_limit(named, concurrency)
+        await agent.client.close()
+        return sum(results.values())
+
+    return asyncio.run(run_all())
+
+
+def run_scenario(base_url: str, concurrency: int, rounds: int, mode: str, routing: bool = False,
+                 hedging: bool = False) -> Dict[str, Any]:
+    """Run every generator `rounds` times at one concurrency level and summarize"""
+    calls = _workload(rounds)
+    telemetry = Telemetry(window=len(calls))
+    router = Router(telemetry=telemetry, min_samples=max(1, rounds // 2)) if routing else None
+    policy = HedgePolicy(min_samples=max(1, rounds // 2)) if hedging else None
+    agent_class = AsyncAdvancedMarketingAgent if mode == "async" else AdvancedMarketingAgent
+    agent = agent_class(api_key="benchmark", base_url=base_url, telemetry=telemetry, router=router,
+                        hedging=policy)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    if mode == "async":
+        errors = _run_async(agent, calls, concurrency)
+    else:
+        errors = _run_sync(agent, calls, concurrency, stream=(mode == "stream"))
+    elapsed = time.perf_counter() - started
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = [record.latency for record in telemetry.records if record.error is None]
+    ttfb = [record.ttfb for record in telemetry.records if record.error is None]
+    per_method = {
+        method: {"p50": stats["latency"]["p50"], "p95": stats["latency"]["p95"]}
+        for method, stats in telemetry.snapshot()["methods"].items()
+    }
+    return {
+        "mode": mode,
+        "routing": routing,
+        "hedging": hedging,
+        "concurrency": concurrency,
+        "calls": len(calls),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_calls_per_s": round(len(calls) / elapsed, 3),
+        "latency_s": {f"p{q}": round(percentile(latencies, q / 100), 4) for q in (50, 95, 99)},
+        "ttfb_s": {f"p{q}": round(percentile(ttfb, q / 100), 4) for q in (50, 95, 99)},
+        "retries": sum(record.retries for record in telemetry.records),
+        "peak_traced_memory_bytes": peak_bytes,
+        "per_method_latency_s": per_method,
+        "routing_report": router.report() if router is not None else None,
+        "hedging_report": policy.report() if policy is not None else None,
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmark(config: FakeServerConfig, concurrency_levels: Sequence[int] = (1, 4, 16),
+                  rounds: int = 2, modes: Sequence[str] = ("sync",), routing: bool = False,
+                  hedging: bool = False) -> Dict[str, Any]:
+    """Start a fake server and run every scenario against it
+
+    With hedging, each scenario runs without and then with a HedgePolicy so
+    tail latency can be compared.
+    """
+    with serve_in_subprocess(config) as base_url:
+        scenarios = [
+            run_scenario(base_url, concurrency, rounds, mode, routing, hedged)
+            for mode in modes
+            for concurrency in concurrency_levels
+            for hedged in ((False, True) if hedging else (False,))
+        ]
+        injected_errors = fetch_stats(base_url)["errors"]
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "server": asdict(config),
+        "injected_errors": injected_errors,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "scenarios": scenarios,
+    }
+
+
+def main():
+    """Command-line entry point for the benchmark suite"""
+    parser = argparse.ArgumentParser(description="Benchmark the marketing agents against a local fake API")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--rounds", type=int, default=2, help="passes over all 13 generators per scenario")
+    parser.add_argument("--modes", default="sync", help="comma-separated modes from: sync, async, stream")
+    parser.add_argument("--latency", default="lognormal", choices=["fixed", "uniform", "lognormal"])
+    parser.add_argument("--ttft", type=float, default=0.4, help="time to first token in seconds (median)")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--overload-rate", type=float, default=0.0, help="fraction of requests answered 529")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--routing", action="store_true", help="route model tier and max_tokens per call")
+    parser.add_argument("--hedging", action="store_true",
+                        help="also run each scenario with hedged requests and compare tail latency")
+    parser.add_argument("--output", default=DEFAULT_RESULTS_PATH, help="JSONL file results are appended to")
+    args = parser.parse_args()
+
+    config = FakeServerConfig(
+        latency_distribution=args.latency,
+        ttft_s=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        rate_limit_rate=args.rate_limit_rate,
+        overload_rate=args.overload_rate,
+        retry_after_s=0.2,
+        seed=args.seed,
+    )
+    result = run_benchmark(
+        config,
+        concurrency_levels=[int(level) for level in args.concurrency.split(",")],
+        rounds=args.rounds,
+        modes=[mode.strip() for mode in args.modes.split(",")],
+        routing=args.routing,
+        hedging=args.hedging,
+    )
+    with open(args.output, "a", encoding="utf-8") as handle:
+        handle.write(json.dumps(result) + "\n")
+
+    print(f"{'mode':<10}{'conc':>6}{'calls':>7}{'err':>5}{'calls/s':>10}{'p50':>8}{'p95':>8}{'p99':>8}{'peak MB':>9}")
+    for scenario in result["scenarios"]:
+        latency = scenario["latency_s"]
+        mode = scenario["mode"] + ("+hedge" if scenario["hedging"] else "")
+        print(f"{mode:<10}{scenario['concurrency']:>6}{scenario['calls']:>7}{scenario['errors']:>5}"
+              f"{scenario['throughput_calls_per_s']:>10.2f}{latency['p50']:>8.3f}{latency['p95']:>8.3f}"
+              f"{latency['p99']:>8.3f}{scenario['peak_traced_memory_bytes'] / 1e6:>9.2f}")
+    for scenario in result["scenarios"]:
+        report = scenario["hedging_report"]
+        if report is not None:
+            print(f"{scenario['mode']} at concurrency {scenario['concurrency']}: hedged {report['hedge_rate']:.1%} "
+                  f"of calls, duplicate won {report['hedge_won']}")
+    print(f"\nResults appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
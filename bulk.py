@@ -0,0 +1,283 @@
+"""
+Bulk client runner for the Car Detailer Marketing Agent
+Streams DetailingClient / MarketingConfig records from CSV or JSONL through a
+bounded worker pool, with an append-only output file and checkpoint/resume
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from advanced_agent import AdvancedMarketingAgent
+from config import BusinessMetrics, MarketingChannels, MarketingConfig
+from main import DetailingClient
+from ratelimit import BULK, RequestScheduler
+
+
+Record = Union[DetailingClient, MarketingConfig]
+
+LIST_FIELDS = ("goals", "unique_selling_points", "target_demographics", "social_media")
+
+
+def to_detailing_client(record: Record) -> DetailingClient:
+    """Return the DetailingClient view of a bulk record"""
+    if isinstance(record, DetailingClient):
+        return record
+    return DetailingClient(
+        name=record.business_name,
+        email="",
+        phone="",
+        business_type=record.business_type,
+        service_area=record.service_area,
+        monthly_budget=record.monthly_budget,
+        goals=record.goals,
+    )
+
+
+def _rating(record: Record) -> float:
+    metrics = getattr(record, "metrics", None)
+    return metrics.google_rating if metrics else 4.5
+
+
+def _repeat_rate(record: Record) -> float:
+    metrics = getattr(record, "metrics", None)
+    return metrics.repeat_customer_rate if metrics else 0.3
+
+
+# Deliverables the bulk runner can produce for each record
+JOBS: Dict[str, Callable[[AdvancedMarketingAgent, Record], str]] = {
+    "marketing_strategy": lambda agent, r: agent.generate_marketing_strategy(to_detailing_client(r)),
+    "social_media_content": lambda agent, r: agent.create_social_media_content("Ceramic Coating Services", num_posts=3),
+    "email_campaign": lambda agent, r: agent.generate_email_campaign("Past Customers", "Seasonal Promotion"),
+    "referral_program": lambda agent, r: agent.generate_referral_program(r.business_type, "premium"),
+    "pricing_strategy": lambda agent, r: agent.generate_pricing_strategy("small", "premium", r.service_area),
+    "local_seo_strategy": lambda agent, r: agent.generate_local_seo_strategy(
+        to_detailing_client(r).name, r.service_area, _rating(r)
+    ),
+    "retention_marketing_strategy": lambda agent, r: agent.create_retention_marketing_strategy(24, _repeat_rate(r)),
+}
+
+DEFAULT_JOBS = ("marketing_strategy",)
+
+
+def _split_list(value: Any) -> List[str]:
+    """Accept JSON lists, or semicolon-separated strings from CSV cells"""
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    value = str(value).strip()
+    if value.startswith("["):
+        return [str(item) for item in json.loads(value)]
+    return [item.strip() for item in value.split(";") if item.strip()]
+
+
+def parse_record(row: Dict[str, Any]) -> Record:
+    """Build a MarketingConfig (rows with business_name) or a DetailingClient from a row"""
+    row = {key: value for key, value in row.items() if value not in (None, "")}
+    for field in LIST_FIELDS:
+        if field in row:
+            row[field] = _split_list(row[field])
+
+    if "business_name" not in row:
+        return DetailingClient(
+            name=row["name"],
+            email=row.get("email", ""),
+            phone=row.get("phone", ""),
+            business_type=row.get("business_type", "independent"),
+            service_area=row["service_area"],
+            monthly_budget=float(row.get("monthly_budget", 0)),
+            goals=row.get("goals", []),
+        )
+
+    channels = row.get("channels")
+    if isinstance(channels, dict):
+        channels = MarketingChannels(**channels)
+    else:
+        channels = MarketingChannels(social_media=row.get("social_media") or None)
+
+    metrics = row.get("metrics")
+    if isinstance(metrics, dict):
+        metrics = BusinessMetrics(**metrics)
+
+    return MarketingConfig(
+        business_name=row["business_name"],
+        business_type=row.get("business_type", "independent"),
+        service_area=row["service_area"],
+        monthly_budget=float(row.get("monthly_budget", 0)),
+        channels=channels,
+        metrics=metrics,
+        goals=row.get("goals") or None,
+        unique_selling_points=row.get("unique_selling_points") or None,
+        target_demographics=row.get("target_demographics") or None,
+    )
+
+
+def iter_records(path: str) -> Iterator[Tuple[int, Optional[Record], Optional[str]]]:
+    """Lazily yield (index, record, error) from a CSV or JSONL file
+
+    A row that cannot be read or parsed is yielded with record None and the
+    error, so one bad row does not stop the rest.
+    """
+    csv_file = path.lower().endswith(".csv")
+    with open(path, newline="", encoding="utf-8") as handle:
+        rows = csv.DictReader(handle) if csv_file else (line for line in handle if line.strip())
+        for index in itertools.count():
+            try:
+                row = next(rows)
+                record, error = parse_record(row if csv_file else json.loads(row)), None
+            except StopIteration:
+                return
+            except (ValueError, KeyError, TypeError, AttributeError, csv.Error) as exc:
+                record, error = None, f"Malformed record: {type(exc).__name__}: {exc}"
+            yield index, record, error
+
+
+class Checkpoint:
+    """
+    Resume point for a bulk run
+    Stores the first unfinished index, any later records finished out of order
+    and the indices of records that failed. A failure is terminal: the resume
+    point moves past it, so done_ahead only ever holds the records in flight.
+    With retry_failed, failed records count as unfinished and are run again.
+    """
+
+    def __init__(self, path: str, retry_failed: bool = False):
+        self.path = path
+        self.retry_failed = retry_failed
+        self.next_index = 0
+        self.done_ahead = set()
+        self.failed = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as handle:
+                state = json.load(handle)
+            self.next_index = state["next_index"]
+            self.done_ahead = set(state["done_ahead"])
+            self.failed = set(state.get("failed", ()))
+
+    def is_done(self, index: int) -> bool:
+        """Return whether the record at index already finished"""
+        with self._lock:
+            if self.retry_failed and index in self.failed:
+                return False
+            return index < self.next_index or index in self.done_ahead
+
+    def mark_done(self, index: int, failed: bool = False):
+        """Record a success or terminal failure, advance the resume point and persist it"""
+        with self._lock:
+            if failed:
+                self.failed.add(index)
+            else:
+                self.failed.discard(index)
+            if index >= self.next_index:
+                self.done_ahead.add(index)
+            while self.next_index in self.done_ahead:
+                self.done_ahead.remove(self.next_index)
+                self.next_index += 1
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump({"next_index": self.next_index, "done_ahead": sorted(self.done_ahead),
+                       "failed": sorted(self.failed)}, handle)
+        os.replace(tmp_path, self.path)
+
+
+def run_bulk(input_path: str, output_path: str, checkpoint_path: Optional[str] = None,
+             agent: Optional[AdvancedMarketingAgent] = None, jobs=DEFAULT_JOBS,
+             max_workers: int = 4, retry_failed: bool = False) -> Dict[str, int]:
+    """Generate deliverables for every record in input_path
+
+    Results are appended to output_path as JSON lines as soon as each record
+    finishes; malformed rows are written as failed records. Finished records
+    are recorded in the checkpoint, so rerunning after a crash skips them,
+    along with failed ones unless retry_failed is set. At most
+    2 * max_workers records are in memory.
+    """
+    agent = agent or AdvancedMarketingAgent(priority=BULK)
+    checkpoint = Checkpoint(checkpoint_path or output_path + ".checkpoint", retry_failed)
+    unknown = [job for job in jobs if job not in JOBS]
+    if unknown:
+        raise ValueError(f"Unknown jobs: {', '.join(unknown)}")
+
+    in_flight = threading.BoundedSemaphore(max_workers * 2)
+    write_lock = threading.Lock()
+    counts = {"completed": 0, "failed": 0, "skipped": 0}
+
+    def finish(index: int, line: Dict[str, Any], output):
+        succeeded = "error" not in line
+        with write_lock:
+            output.write(json.dumps(line) + "\n")
+            output.flush()
+            counts["completed" if succeeded else "failed"] += 1
+        checkpoint.mark_done(index, failed=not succeeded)
+
+    def process(index: int, record: Record, output):
+        try:
+            name = to_detailing_client(record).name
+            line = {"index": index, "name": name}
+            worker = agent.for_client(name)
+            try:
+                line["results"] = {job: JOBS[job](worker, record) for job in jobs}
+            except Exception as exc:
+                line["error"] = f"{type(exc).__name__}: {exc}"
+            finish(index, line, output)
+        finally:
+            in_flight.release()
+
+    agent.client  # build the SDK client once, so every record's copy of the agent shares it
+    with open(output_path, "a", encoding="utf-8") as output, \
+            ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for index, record, error in iter_records(input_path):
+            if checkpoint.is_done(index):
+                counts["skipped"] += 1
+                continue
+            if record is None:
+                finish(index, {"index": index, "name": None, "error": error}, output)
+                continue
+            in_flight.acquire()
+            pool.submit(process, index, record, output)
+
+    return counts
+
+
+def main():
+    """Command-line entry point for bulk runs"""
+    parser = argparse.ArgumentParser(description="Generate marketing deliverables for many clients")
+    parser.add_argument("input", help="CSV or JSONL file of DetailingClient / MarketingConfig records")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--jobs", default=",".join(DEFAULT_JOBS),
+                        help=f"comma-separated deliverables from: {', '.join(JOBS)}")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent records")
+    parser.add_argument("--rpm", type=int, help="requests per minute limit for the account")
+    parser.add_argument("--tpm", type=int, help="tokens per minute limit for the account")
+    parser.add_argument("--retry-failed", action="store_true", help="rerun records that failed in earlier runs")
+    args = parser.parse_args()
+
+    scheduler = None
+    if args.rpm or args.tpm:
+        scheduler = RequestScheduler(requests_per_minute=args.rpm or 50, tokens_per_minute=args.tpm or 80_000)
+
+    counts = run_bulk(
+        args.input,
+        args.output,
+        checkpoint_path=args.checkpoint,
+        agent=AdvancedMarketingAgent(scheduler=scheduler, priority=BULK),
+        jobs=[job.strip() for job in args.jobs.split(",") if job.strip()],
+        max_workers=args.workers,
+        retry_failed=args.retry_failed,
+    )
+    print(f"Completed {counts['completed']}, failed {counts['failed']}, "
+          f"skipped {counts['skipped']} already-finished records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Response cache for the Car Detailer Marketing Agent
+Content-addressed SQLite store with per-method TTLs and LRU eviction
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "car-detailer-agent", "responses.sqlite3")
+
+DAY = 24 * 60 * 60
+
+# How long each generator's output stays fresh. Market-facing analysis goes
+# stale faster than evergreen program design.
+DEFAULT_METHOD_TTLS: Dict[str, float] = {
+    "analyze_competitor": 7 * DAY,
+    "generate_pricing_strategy": 14 * DAY,
+    "create_social_media_content": 7 * DAY,
+    "generate_email_campaign": 14 * DAY,
+    "generate_marketing_strategy": 30 * DAY,
+    "generate_referral_program": 30 * DAY,
+    "generate_local_seo_strategy": 30 * DAY,
+    "create_video_marketing_strategy": 30 * DAY,
+    "create_fleet_marketing_strategy": 30 * DAY,
+    "create_influencer_partnership_plan": 30 * DAY,
+    "generate_crisis_management_plan": 90 * DAY,
+    "generate_partnership_strategy": 30 * DAY,
+    "create_retention_marketing_strategy": 30 * DAY,
+}
+
+
+def make_cache_key(request: Dict[str, Any]) -> str:
+    """Hash a fully rendered messages.create request into a cache key"""
+    payload = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RefreshingCache:
+    """
+    View of a response cache whose lookups all miss
+    Calls made through it are regenerated and their output replaces the
+    stored entry, with a fresh TTL
+    """
+
+    def __init__(self, cache: "ResponseCache"):
+        self._cache = cache
+
+    def get(self, key: str) -> Optional[str]:
+        return None
+
+    def get_any(self, keys: Iterable[str]) -> Optional[str]:
+        return None
+
+    def __getattr__(self, name: str):
+        return getattr(self._cache, name)
+
+
+class ResponseCache:
+    """
+    Persistent response cache keyed on the rendered request
+    Entries expire per method and the least recently used are evicted first.
+    Entry count and size are kept as running totals, so a write does not
+    scan the table; expired entries are purged, and the totals re-read from
+    the table, at most once per purge_interval seconds.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 5000,
+                 max_bytes: Optional[int] = 200 * 1024 * 1024, default_ttl: float = 30 * DAY,
+                 method_ttls: Optional[Dict[str, float]] = None, purge_interval: float = 60.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.method_ttls = dict(DEFAULT_METHOD_TTLS)
+        if method_ttls:
+            self.method_ttls.update(method_ttls)
+        self.purge_interval = purge_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # entries dropped to stay within max_entries / max_bytes
+        self.expirations = 0  # entries dropped because their TTL ran out
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                method TEXT NOT NULL,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_accessed)")
+        self._entries, self._bytes = self._totals()
+        self._purged_at = time.monotonic()
+
+    def _totals(self) -> Tuple[int, int]:
+        return self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+
+    def ttl_for(self, method: str) -> float:
+        """Return the time-to-live in seconds for a generator's output"""
+        return self.method_ttls.get(method, self.default_ttl)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached text for key, or None on a miss or expired entry"""
+        return self.get_any((key,))
+
+    def get_any(self, keys: Iterable[str]) -> Optional[str]:
+        """Return the text of the first key with a live entry; the lookup counts as one hit or miss"""
+        for key in keys:
+            now = time.time()
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT text, expires_at, size FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    continue
+                text, expires_at, size = row
+                if expires_at <= now:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._entries -= 1
+                    self._bytes -= size
+                    self.expirations += 1
+                    continue
+                self._conn.execute("UPDATE responses SET last_accessed = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return text
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def expires_at(self, key: str) -> Optional[float]:
+        """Expiry time of a cached entry, without counting a lookup or touching its recency"""
+        with self._lock:
+            row = self._conn.execute("SELECT expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, method: str, text: str):
+        """Store a response and evict least recently used entries over the limits"""
+        now = time.time()
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, method, text, size, now, now + self.ttl_for(method), now),
+            )
+            if old is None:
+                self._entries += 1
+            else:
+                self._bytes -= old[0]
+            self._bytes += size
+            if time.monotonic() - self._purged_at >= self.purge_interval:
+                self._purge_expired()
+            self._evict()
+
+    def _purge_expired(self):
+        """Delete expired entries and re-read the totals, which other processes sharing the file may have moved"""
+        cursor = self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        self.expirations += max(0, cursor.rowcount)
+        self._entries, self._bytes = self._totals()
+        self._purged_at = time.monotonic()
+
+    def _evict(self):
+        """Drop the least recently used entries until within limits"""
+        excess_entries = self._entries - self.max_entries
+        excess_bytes = self._bytes - self.max_bytes if self.max_bytes is not None else 0
+        if excess_entries <= 0 and excess_bytes <= 0:
+            return
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_accessed"):
+            if len(victims) >= excess_entries and excess_bytes <= 0:
+                break
+            victims.append((key,))
+            excess_bytes -= size
+            self._entries -= 1
+            self._bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def clear(self):
+        """Remove every cached response"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._entries, self._bytes = 0, 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current store size"""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": count,
+            "bytes": total,
+        }
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
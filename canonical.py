@@ -0,0 +1,283 @@
+"""
+Input canonicalization for the Car Detailer Marketing Agent
+Normalizes locations, list fields, categories and budgets so equivalent
+requests render the same prompt, and finds near-duplicate requests with
+MinHash signatures over their arguments
+"""
+
+import hashlib
+import random
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, is_dataclass, replace
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import MarketingChannels, MarketingConfig
+
+
+US_STATES: Dict[str, str] = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "district of columbia": "DC", "florida": "FL",
+    "georgia": "GA", "hawaii": "HI", "idaho": "ID", "illinois": "IL", "indiana": "IN", "iowa": "IA",
+    "kansas": "KS", "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD",
+    "massachusetts": "MA", "michigan": "MI", "minnesota": "MN", "mississippi": "MS", "missouri": "MO",
+    "montana": "MT", "nebraska": "NE", "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ",
+    "new mexico": "NM", "new york": "NY", "north carolina": "NC", "north dakota": "ND", "ohio": "OH",
+    "oklahoma": "OK", "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT",
+    "virginia": "VA", "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+}
+STATE_CODES = {code: name for name, code in US_STATES.items()}
+
+# "Central Texas" names a region, not a city called Central
+REGION_QUALIFIERS = {"central", "north", "south", "east", "west", "northern", "southern", "eastern", "western",
+                     "northeast", "northwest", "southeast", "southwest", "greater", "upstate", "downstate"}
+
+# Monthly budgets are rounded to the nearest bucket; above the last, to the nearest 5,000
+BUDGET_BUCKETS: Tuple[int, ...] = (250, 500, 750, 1000, 1250, 1500, 2000, 2500, 3000, 4000, 5000,
+                                   7500, 10000, 15000, 20000, 25000)
+
+# Generator parameters that hold a place, a category or a budget
+LOCATION_PARAMS = {"service_area", "region"}
+CATEGORY_PARAMS = {"business_type", "service_level", "business_size", "market_position"}
+BUDGET_PARAMS = {"monthly_budget", "budget"}
+
+# Contact details never reach a prompt, so they don't distinguish requests
+IGNORED_FIELDS = {"email", "phone"}
+
+# Fields naming a place or a business must match exactly for two calls to be
+# near-duplicates; one business's content is never served for another
+EXACT_FIELDS = LOCATION_PARAMS | {"location", "name", "business_name", "competitor_name"}
+
+
+def canonical_text(text: str) -> str:
+    """Collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", str(text)).strip().rstrip(".,;")
+
+
+def _capitalize(word: str) -> str:
+    """Capitalize each hyphenated part ("miami-dade" to "Miami-Dade"); all-caps codes are kept"""
+    if word.isupper():
+        return word
+    return "-".join(part.capitalize() for part in word.split("-"))
+
+
+def canonical_location(text: str) -> str:
+    """Normalize "austin tx", "Austin Texas" and "Austin, TX" to "Austin, TX"
+
+    Places outside the US keep their comma-separated parts, so "toronto, ON"
+    becomes "Toronto, ON".
+    """
+    words = re.sub(r"[,.]", " ", str(text)).split()
+    if not words:
+        return ""
+    lowered = [word.lower() for word in words]
+    for size in (3, 2, 1):
+        if len(words) <= size:
+            continue
+        tail = " ".join(lowered[-size:])
+        code = US_STATES.get(tail) or (tail.upper() if size == 1 and tail.upper() in STATE_CODES else None)
+        if code is None:
+            continue
+        city = " ".join(_capitalize(word) for word in lowered[:-size])
+        if lowered[-size - 1] in REGION_QUALIFIERS and len(words) == size + 1:
+            return f"{city} {STATE_CODES[code].title()}"
+        return f"{city}, {code}"
+    parts = (" ".join(_capitalize(word) for word in part.replace(".", " ").split()) for part in str(text).split(","))
+    return ", ".join(part for part in parts if part)
+
+
+def canonical_list(values: List[str]) -> List[str]:
+    """Normalize items, drop case-insensitive duplicates and sort"""
+    unique: Dict[str, str] = {}
+    for value in values or []:
+        item = canonical_text(value)
+        if item:
+            unique.setdefault(item.casefold(), item)
+    return [unique[key] for key in sorted(unique)]
+
+
+def bucket_budget(amount: float, buckets: Tuple[int, ...] = BUDGET_BUCKETS) -> int:
+    """Round a budget to the nearest bucket; 0 (unknown) and below stay 0"""
+    amount = float(amount)
+    if amount <= 0:
+        return 0
+    if amount > buckets[-1]:
+        return int(round(amount / 5000) * 5000)
+    return min(buckets, key=lambda bucket: (abs(bucket - amount), bucket))
+
+
+def canonical_client(client, buckets: Tuple[int, ...] = BUDGET_BUCKETS):
+    """Return a DetailingClient with canonical location, category, budget and goals"""
+    return replace(
+        client,
+        name=canonical_text(client.name),
+        business_type=canonical_text(client.business_type).lower(),
+        service_area=canonical_location(client.service_area),
+        monthly_budget=bucket_budget(client.monthly_budget, buckets),
+        goals=canonical_list(client.goals),
+    )
+
+
+def canonical_config(config: MarketingConfig, buckets: Tuple[int, ...] = BUDGET_BUCKETS) -> MarketingConfig:
+    """Return a MarketingConfig with canonical location, category, budget and list fields"""
+    return replace(
+        config,
+        business_name=canonical_text(config.business_name),
+        business_type=canonical_text(config.business_type).lower(),
+        service_area=canonical_location(config.service_area),
+        monthly_budget=bucket_budget(config.monthly_budget, buckets),
+        channels=replace(config.channels, social_media=canonical_list(config.channels.social_media)),
+        goals=canonical_list(config.goals),
+        unique_selling_points=canonical_list(config.unique_selling_points),
+        target_demographics=canonical_list(config.target_demographics),
+    )
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """Near-duplicate identity of a call: exact scope plus a MinHash signature"""
+    scope: str  # method, numeric arguments, places and business names, which must match exactly
+    signature: Tuple[int, ...]
+
+
+_MERSENNE = (1 << 61) - 1
+
+
+class NearDuplicateIndex:
+    """
+    In-memory MinHash LSH index from call fingerprints to cache keys
+    Signatures are split into bands; calls sharing a band are compared and the
+    most similar one above threshold is returned. Share one index between agents.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, bands: int = 16,
+                 max_entries: int = 20_000, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = random.Random(seed)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.matches = 0
+        self._permutations = [(rng.randrange(1, _MERSENNE), rng.randrange(_MERSENNE)) for _ in range(num_perm)]
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Fingerprint]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], Set[str]] = {}
+
+    def signature(self, shingles: Set[str]) -> Tuple[int, ...]:
+        """MinHash signature of a shingle set"""
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+                  for s in shingles]
+        return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in self._permutations)
+
+    def _bands(self, fingerprint: Fingerprint):
+        for band in range(self.bands):
+            yield fingerprint.scope, band, fingerprint.signature[band * self.rows:(band + 1) * self.rows]
+
+    def add(self, key: str, fingerprint: Fingerprint):
+        """Remember that the result for fingerprint is cached under key"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = fingerprint
+            for band in self._bands(fingerprint):
+                self._buckets.setdefault(band, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, old = self._entries.popitem(last=False)
+                for band in self._bands(old):
+                    keys = self._buckets.get(band)
+                    keys.discard(old_key)
+                    if not keys:
+                        del self._buckets[band]
+
+    def lookup(self, fingerprint: Fingerprint) -> Optional[str]:
+        """Return the cache key of the most similar indexed call, if similar enough"""
+        with self._lock:
+            candidates = set()
+            for band in self._bands(fingerprint):
+                candidates |= self._buckets.get(band, set())
+            best, best_score = None, self.threshold
+            for key in candidates:
+                other = self._entries[key].signature
+                score = sum(a == b for a, b in zip(fingerprint.signature, other)) / len(other)
+                if score >= best_score:
+                    best, best_score = key, score
+            if best is not None:
+                self.matches += 1
+            return best
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _flatten(name: str, value: Any, exact: List[str], shingles: Set[str]):
+    if is_dataclass(value):
+        value = asdict(value)
+    if isinstance(value, dict):
+        for field, item in value.items():
+            if field not in IGNORED_FIELDS:
+                _flatten(f"{name}.{field}", item, exact, shingles)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _flatten(name, item, exact, shingles)
+    elif isinstance(value, (int, float)) or value is None:
+        exact.append(f"{name}={value}")
+    elif name.rsplit(".", 1)[-1] in EXACT_FIELDS:
+        exact.append(f"{name}={canonical_text(value).casefold()}")
+    else:
+        text = f"  {canonical_text(value).casefold()}  "
+        shingles.update(f"{name}:{text[i:i + 3]}" for i in range(len(text) - 2))
+
+
+class Canonicalizer:
+    """
+    Canonicalizes generator arguments before prompts are rendered
+    With a NearDuplicateIndex, also fingerprints calls so an equivalent
+    earlier result can be served from the response cache.
+    """
+
+    def __init__(self, budget_buckets: Tuple[int, ...] = BUDGET_BUCKETS,
+                 near_duplicates: Optional[NearDuplicateIndex] = None):
+        self.budget_buckets = budget_buckets
+        self.near_duplicates = near_duplicates
+
+    def canonical_value(self, name: str, value: Any) -> Any:
+        """Canonicalize one argument by its parameter name and type"""
+        if isinstance(value, MarketingConfig):
+            return canonical_config(value, self.budget_buckets)
+        if is_dataclass(value) and hasattr(value, "service_area") and hasattr(value, "goals"):
+            return canonical_client(value, self.budget_buckets)
+        if isinstance(value, MarketingChannels):
+            return replace(value, social_media=canonical_list(value.social_media))
+        if isinstance(value, (list, tuple)):
+            return canonical_list(value)
+        if name in BUDGET_PARAMS and isinstance(value, (int, float)):
+            return bucket_budget(value, self.budget_buckets)
+        if not isinstance(value, str):
+            return value
+        if name in LOCATION_PARAMS:
+            return canonical_location(value)
+        if name in CATEGORY_PARAMS:
+            return canonical_text(value).lower()
+        return canonical_text(value)
+
+    def canonicalize(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Canonicalize every bound argument of a generator call"""
+        return {name: self.canonical_value(name, value) for name, value in values.items()}
+
+    def fingerprint(self, method: str, values: Dict[str, Any]) -> Optional[Fingerprint]:
+        """Fingerprint canonical arguments for near-duplicate lookup; None without an index"""
+        if self.near_duplicates is None:
+            return None
+        exact: List[str] = []
+        shingles: Set[str] = set()
+        for name, value in values.items():
+            _flatten(name, value, exact, shingles)
+        if not shingles:
+            return None
+        scope = hashlib.sha256("\n".join([method] + sorted(exact)).encode("utf-8")).hexdigest()
+        return Fingerprint(scope, self.near_duplicates.signature(shingles))
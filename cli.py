@@ -0,0 +1,165 @@
+"""
+Command-line interface for the Car Detailer Marketing Agent
+One subcommand per registered generator. Only the registry is imported up
+front: the agent modules load once a command runs, and the Anthropic SDK only
+when a request misses the cache.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+from registry import GENERATOR_SPECS, GeneratorSpec, Param
+
+
+# Cold start budget for importing the agent modules, enforced by check-imports
+DEFAULT_IMPORT_BUDGET_MS = 150.0
+
+# Modules a cached request must load without pulling in the SDK
+AGENT_MODULES = ("advanced_agent", "cache", "canonical")
+
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {modules}
+print(json.dumps({{"ms": (time.perf_counter() - started) * 1000,
+                  "heavy": sorted(m for m in ("anthropic", "httpx", "asyncio", "numpy") if m in sys.modules)}}))
+"""
+
+
+def _option(name: str) -> str:
+    return "--" + name.replace("_", "-")
+
+
+def _client_argument(value: str) -> Dict[str, Any]:
+    """Parse --client as inline JSON or @path to a JSON file"""
+    if value.startswith("@"):
+        with open(value[1:], encoding="utf-8") as handle:
+            return json.load(handle)
+    return json.loads(value)
+
+
+def _add_param(parser: argparse.ArgumentParser, param: Param):
+    kwargs: Dict[str, Any] = {"dest": param.name, "required": param.required}
+    if param.kind == "int":
+        kwargs["type"] = int
+    elif param.kind == "float":
+        kwargs["type"] = float
+    elif param.kind == "list[str]":
+        kwargs["nargs"] = "+"
+    elif param.kind == "figures":
+        kwargs["type"] = json.loads
+        kwargs["metavar"] = "JSON"
+    elif param.kind == "client":
+        kwargs["type"] = _client_argument
+        kwargs["metavar"] = "JSON|@FILE"
+    if not param.required:
+        kwargs["default"] = param.default
+        kwargs["help"] = f"default: {param.default}"
+    parser.add_argument(_option(param.name), **kwargs)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Argument parser with a subcommand per registered generator"""
+    parser = argparse.ArgumentParser(prog="cli.py", description="Generate car detailing marketing content")
+    parser.add_argument("--stream", action="store_true", help="print text as it arrives")
+    parser.add_argument("--structured", action="store_true",
+                        help="return JSON (social media, email and strategy generators)")
+    parser.add_argument("--cache-path", default=None, help="response cache file (default: ~/.cache/...)")
+    parser.add_argument("--no-cache", action="store_true", help="always call the API")
+    parser.add_argument("--artifacts", metavar="PATH", help="also record the output in this artifact store")
+    parser.add_argument("--canonicalize", action="store_true",
+                        help="normalize inputs so equivalent requests share cache entries")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    for spec in GENERATOR_SPECS:
+        summary = re.sub(r"\{(\w+)\}", lambda match: match.group(1).upper(), spec.template.text.splitlines()[0])
+        command = commands.add_parser(spec.name, help=f"[{spec.tier}] {summary}", description=summary)
+        for param in spec.params:
+            _add_param(command, param)
+
+    check = commands.add_parser("check-imports", help="fail if a cold start exceeds the import budget")
+    check.add_argument("--budget-ms", type=float, default=DEFAULT_IMPORT_BUDGET_MS)
+    check.add_argument("--runs", type=int, default=3, help="best of this many cold starts")
+    return parser
+
+
+def check_import_budget(budget_ms: float = DEFAULT_IMPORT_BUDGET_MS, runs: int = 3) -> Dict[str, Any]:
+    """Time cold imports of the agent modules in fresh interpreters
+
+    Passes when the fastest run is within budget_ms and none of the SDK, HTTP
+    or asyncio stacks were imported.
+    """
+    probe = _IMPORT_PROBE.format(modules=", ".join(AGENT_MODULES))
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [here, os.environ.get("PYTHONPATH")]))}
+    samples = []
+    for _ in range(max(1, runs)):
+        output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True,
+                                cwd=here, env=env).stdout
+        samples.append(json.loads(output))
+    best = min(samples, key=lambda sample: sample["ms"])
+    heavy = sorted({module for sample in samples for module in sample["heavy"]})
+    return {
+        "ms": round(best["ms"], 1),
+        "budget_ms": budget_ms,
+        "heavy_modules": heavy,
+        "ok": best["ms"] <= budget_ms and not heavy,
+    }
+
+
+def _build_agent(spec: GeneratorSpec, args: argparse.Namespace):
+    from cache import DEFAULT_CACHE_PATH, ResponseCache
+
+    if spec.tier == "core":
+        from main import CarDetailerMarketingAgent as agent_class
+    else:
+        from advanced_agent import AdvancedMarketingAgent as agent_class
+    canonicalizer = None
+    if args.canonicalize:
+        from canonical import Canonicalizer
+        canonicalizer = Canonicalizer()
+    artifacts = None
+    if args.artifacts:
+        from artifacts import ArtifactStore
+        artifacts = ArtifactStore(args.artifacts)
+    cache = None if args.no_cache else ResponseCache(args.cache_path or DEFAULT_CACHE_PATH)
+    return agent_class(cache=cache, canonicalizer=canonicalizer, artifacts=artifacts)
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    """Parse argv, run the chosen generator and print its output"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == "check-imports":
+        result = check_import_budget(args.budget_ms, args.runs)
+        print(json.dumps(result))
+        return 0 if result["ok"] else 1
+
+    spec = next(spec for spec in GENERATOR_SPECS if spec.name == args.command)
+    values = {param.name: getattr(args, param.name) for param in spec.params}
+    if "client" in values and isinstance(values["client"], dict):
+        from main import DetailingClient
+        values["client"] = DetailingClient(**{"email": "", "phone": "", **values["client"]})
+
+    agent = _build_agent(spec, args)
+    if args.structured:
+        if args.stream:
+            for field, item in agent.stream_structured(spec.name, **values):
+                print(json.dumps({"field": field, "item": item}), flush=True)
+        else:
+            print(json.dumps(agent.generate_structured(spec.name, **values), indent=2))
+        return 0
+
+    from main import print_output
+    print_output(agent.stream(spec.name, **values) if args.stream else agent.generate(spec.name, **values))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,116 @@
+"""
+Request coalescing for the Car Detailer Marketing Agent
+Single-flight: identical in-flight calls share one API round-trip
+"""
+
+import threading
+from typing import Any, Awaitable, Callable, Dict
+
+
+# Result of an async flight whose leader was cancelled; its followers start over
+_ABANDONED = object()
+
+
+class _Flight:
+    """An in-flight threaded call that followers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one
+    The first caller runs the call and later callers receive its result or error.
+    Works for threads (do) and asyncio tasks (do_async); share one instance
+    between every agent that should coalesce.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.saved = 0
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[str, "asyncio.Future"] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn for key unless an identical call is already in flight"""
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.saved += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn() for key unless an identical call is already in flight
+
+        Cancelling the leader cancels only the leader: its followers start
+        over and one of them leads a fresh call.
+        """
+        import asyncio  # Deferred: only async callers should pay for importing asyncio
+
+        with self._lock:
+            self.calls += 1
+        while True:
+            with self._lock:
+                future = self._async_flights.get(key)
+                leader = future is None
+                if leader:
+                    future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+                else:
+                    self.saved += 1
+
+            if leader:
+                return await self._lead_async(key, fn, future)
+            result = await asyncio.shield(future)
+            if result is not _ABANDONED:
+                return result
+            with self._lock:
+                self.saved -= 1
+
+    async def _lead_async(self, key: str, fn: Callable[[], Awaitable[Any]], future: "asyncio.Future") -> Any:
+        import asyncio
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_result(_ABANDONED)
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark the exception retrieved so a call without followers doesn't warn
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._async_flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Return how many calls were made and how many were served by another caller"""
+        with self._lock:
+            return {"calls": self.calls, "saved": self.saved, "in_flight": len(self._flights) + len(self._async_flights)}
@@ -0,0 +1,300 @@
+"""
+Local stand-in for the Anthropic Messages API
+Serves POST /v1/messages with simulated latency, token rates, streaming and
+injected 429/529 errors, so agents can be exercised without paid calls
+"""
+
+import json
+import multiprocessing
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional
+
+
+@dataclass
+class FakeServerConfig:
+    """Simulated API behaviour"""
+    # Time to first token: "fixed", "uniform" (ttft_s to ttft_max_s) or "lognormal" (median ttft_s)
+    latency_distribution: str = "lognormal"
+    ttft_s: float = 0.4
+    ttft_max_s: float = 1.2
+    ttft_sigma: float = 0.5
+    # Output generation speed and length (as a fraction of max_tokens)
+    tokens_per_second: float = 80.0
+    output_fraction: float = 0.6
+    # Fixed output length instead; a max_tokens below it cuts the output off with stop_reason "max_tokens"
+    output_tokens: Optional[int] = None
+    # Probability of answering with an injected error instead of a message
+    rate_limit_rate: float = 0.0
+    overload_rate: float = 0.0
+    retry_after_s: float = 1.0
+    # Tokens per streamed text delta
+    tokens_per_chunk: int = 8
+    seed: Optional[int] = None
+
+
+# Rough characters-per-token ratio used for synthetic usage numbers
+CHARS_PER_TOKEN = 4
+
+_FILLER = ("Detailing shops win on before-and-after proof, fast booking and repeat visits. ")
+
+
+class FakeMessagesServer:
+    """
+    Threaded HTTP server mimicking the Messages API
+    Use as a context manager; point agents at server.base_url
+    """
+
+    def __init__(self, config: Optional[FakeServerConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeServerConfig()
+        self.random = random.Random(self.config.seed)
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeMessagesServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeMessagesServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def sample_ttft(self) -> float:
+        """Draw a time-to-first-token from the configured distribution"""
+        config = self.config
+        with self._lock:
+            if config.latency_distribution == "fixed":
+                return config.ttft_s
+            if config.latency_distribution == "uniform":
+                return self.random.uniform(config.ttft_s, config.ttft_max_s)
+            return self.random.lognormvariate(0.0, config.ttft_sigma) * config.ttft_s
+
+    def sample_error(self) -> Optional[int]:
+        """Return 429 or 529 when an error should be injected for this request"""
+        with self._lock:
+            self.requests += 1
+            roll = self.random.random()
+            if roll < self.config.rate_limit_rate:
+                self.errors += 1
+                return 429
+            if roll < self.config.rate_limit_rate + self.config.overload_rate:
+                self.errors += 1
+                return 529
+            return None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Streamed deltas are small writes; don't let Nagle batch them
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client hung up, as cancelled hedges and expired deadlines do
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/_fake/stats":
+                    self._send_json(200, {"requests": server.requests, "errors": server.errors})
+                else:
+                    self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+                if self.path.rstrip("/") != "/v1/messages":
+                    self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+                    return
+
+                status = server.sample_error()
+                if status == 429:
+                    self._send_json(429, {"type": "error", "error": {"type": "rate_limit_error",
+                                                                     "message": "Simulated rate limit"}},
+                                    {"retry-after": str(server.config.retry_after_s)})
+                    return
+                if status == 529:
+                    self._send_json(529, {"type": "error", "error": {"type": "overloaded_error",
+                                                                     "message": "Simulated overload"}})
+                    return
+
+                input_tokens = len(json.dumps([body.get("system"), body.get("messages")])) // CHARS_PER_TOKEN
+                max_tokens = body.get("max_tokens", 1024)
+                output_tokens = max(1, int(max_tokens * server.config.output_fraction))
+                if server.config.output_tokens is not None:
+                    output_tokens = min(max_tokens, server.config.output_tokens)
+                stop_reason = "max_tokens" if output_tokens < (server.config.output_tokens or 0) else None
+                ttft = server.sample_ttft()
+                tool = _forced_tool(body)
+                if body.get("stream"):
+                    self._stream(body, input_tokens, output_tokens, ttft, tool, stop_reason)
+                else:
+                    time.sleep(ttft + output_tokens / server.config.tokens_per_second)
+                    message = _message(body, _text(output_tokens), input_tokens, output_tokens)
+                    if tool is not None:
+                        message["content"] = [_tool_use(tool, _tool_input(tool["input_schema"], output_tokens))]
+                        message["stop_reason"] = "tool_use"
+                    message["stop_reason"] = stop_reason or message["stop_reason"]
+                    self._send_json(200, message)
+
+            def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self.send_header("request-id", f"req_fake_{uuid.uuid4().hex[:12]}")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _event(self, name: str, payload: Dict[str, Any]):
+                data = f"event: {name}\ndata: {json.dumps(payload)}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _stream(self, body: Dict[str, Any], input_tokens: int, output_tokens: int, ttft: float,
+                        tool: Optional[Dict[str, Any]] = None, stop_reason: Optional[str] = None):
+                self.send_response(200)
+                self.send_header("content-type", "text/event-stream")
+                self.send_header("transfer-encoding", "chunked")
+                self.end_headers()
+
+                message = _message(body, "", input_tokens, 1)
+                message["content"] = []
+                message["stop_reason"] = None
+                time.sleep(ttft)
+                self._event("message_start", {"type": "message_start", "message": message})
+                if tool is None:
+                    block = {"type": "text", "text": ""}
+                    text = _text(output_tokens)
+                    delta_type, delta_field = "text_delta", "text"
+                else:
+                    block = _tool_use(tool, {})
+                    text = json.dumps(_tool_input(tool["input_schema"], output_tokens))
+                    delta_type, delta_field = "input_json_delta", "partial_json"
+                self._event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": block})
+                chunk_chars = server.config.tokens_per_chunk * CHARS_PER_TOKEN
+                for start in range(0, len(text), chunk_chars):
+                    piece = text[start:start + chunk_chars]
+                    if start:
+                        time.sleep(len(piece) / CHARS_PER_TOKEN / server.config.tokens_per_second)
+                    self._event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                        "delta": {"type": delta_type, delta_field: piece}})
+                self._event("content_block_stop", {"type": "content_block_stop", "index": 0})
+                stop_reason = stop_reason or ("end_turn" if tool is None else "tool_use")
+                self._event("message_delta", {"type": "message_delta",
+                                              "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                                              "usage": {"output_tokens": output_tokens}})
+                self._event("message_stop", {"type": "message_stop"})
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def _text(tokens: int) -> str:
+    chars = tokens * CHARS_PER_TOKEN
+    return (_FILLER * (chars // len(_FILLER) + 1))[:chars]
+
+
+def _forced_tool(body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The tool a request forces with tool_choice, if any"""
+    choice = body.get("tool_choice") or {}
+    if choice.get("type") != "tool":
+        return None
+    return next((tool for tool in body.get("tools", []) if tool["name"] == choice.get("name")), None)
+
+
+def _tool_input(schema: Dict[str, Any], tokens: int) -> Any:
+    """Synthetic value matching a JSON schema; lists get one item per ~100 tokens"""
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: _tool_input(prop, tokens) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_tool_input(schema["items"], tokens) for _ in range(max(1, min(30, tokens // 100)))]
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 100.0
+    return _text(8)
+
+
+def _tool_use(tool: Dict[str, Any], tool_input: Any) -> Dict[str, Any]:
+    return {"type": "tool_use", "id": f"toolu_fake_{uuid.uuid4().hex[:12]}", "name": tool["name"], "input": tool_input}
+
+
+def _message(body: Dict[str, Any], text: str, input_tokens: int, output_tokens: int) -> Dict[str, Any]:
+    return {
+        "id": f"msg_fake_{uuid.uuid4().hex[:16]}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "claude-3-5-sonnet-20241022"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+        },
+    }
+
+
+def _serve(config: FakeServerConfig, connection):
+    server = FakeMessagesServer(config)
+    connection.send(server.base_url)
+    server._httpd.serve_forever()
+
+
+@contextmanager
+def serve_in_subprocess(config: Optional[FakeServerConfig] = None) -> Iterator[str]:
+    """Run the fake server in its own process and yield its base URL
+
+    Keeps the server's threads from competing with the client for the GIL,
+    which otherwise inflates measured streaming latency.
+    """
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe()
+    process = context.Process(target=_serve, args=(config or FakeServerConfig(), child), daemon=True)
+    process.start()
+    try:
+        yield parent.recv()
+    finally:
+        process.terminate()
+        process.join()
+
+
+def fetch_stats(base_url: str) -> Dict[str, int]:
+    """Read request and injected-error counts from a running fake server"""
+    with urllib.request.urlopen(f"{base_url}/_fake/stats") as response:
+        return json.loads(response.read())
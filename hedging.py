@@ -0,0 +1,308 @@
+"""
+Hedged requests and deadlines for the Car Detailer Marketing Agent
+A call that has not produced its first token by a learned percentile of past
+time-to-first-token gets a duplicate request; the first to finish wins and
+the other is cancelled. Deadlines bound how long any generator call may take.
+"""
+
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from telemetry import percentile
+
+
+class DeadlineExceeded(TimeoutError):
+    """A generator call ran past its deadline"""
+
+
+# Absolute time.monotonic() deadline for calls made in the current context
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("marketing_agent_deadline", default=None)
+
+
+@contextmanager
+def time_limit(seconds: Optional[float]) -> Iterator[None]:
+    """Bound every generator call made inside the block; nested limits keep the earliest"""
+    if seconds is None:
+        yield
+        return
+    at = time.monotonic() + seconds
+    current = _DEADLINE.get()
+    token = _DEADLINE.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def deadline_at(seconds: Optional[float]) -> Optional[float]:
+    """Absolute deadline for a call given seconds from now"""
+    return None if seconds is None else time.monotonic() + seconds
+
+
+def resolve_deadline(at: Optional[float]) -> Optional[float]:
+    """The earlier of a call's own deadline and the enclosing time_limit"""
+    current = _DEADLINE.get()
+    if at is None or current is None:
+        return at if current is None else current
+    return min(at, current)
+
+
+def time_left(at: Optional[float]) -> Optional[float]:
+    """Seconds until deadline at, raising DeadlineExceeded once it has passed"""
+    if at is None:
+        return None
+    left = at - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Generator call exceeded its deadline")
+    return left
+
+
+@contextmanager
+def deadline_errors(at: Optional[float]) -> Iterator[None]:
+    """Report an error raised once deadline at has passed (a read timeout, say) as DeadlineExceeded"""
+    try:
+        yield
+    except DeadlineExceeded:
+        raise
+    except Exception as exc:
+        if at is not None and time.monotonic() >= at:
+            raise DeadlineExceeded("Generator call exceeded its deadline") from exc
+        raise
+
+
+class Cancellation(threading.Event):
+    """Set when a hedged attempt loses; runs its on_cancel callbacks, such as closing its stream"""
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks: List[Callable[[], None]] = []
+        self._callbacks_lock = threading.Lock()
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Run callback when the attempt is cancelled, or now if it already was"""
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def set(self):
+        with self._callbacks_lock:
+            if self.is_set():
+                return
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass  # the attempt has already lost; a failed cleanup must not fail the call
+
+
+class HedgePolicy:
+    """
+    Decides when to hedge and keeps the numbers to judge it by
+
+    The hedge delay for a generator is the q-th percentile of its recent
+    time-to-first-token, once min_samples have been seen; before that it is
+    initial_delay. Only first attempts are sampled (one cancelled before its
+    first token counts as the time it ran), so hedging does not hide the tail
+    it is measuring. At most one duplicate is sent per call.
+    """
+
+    def __init__(self, q: float = 0.95, min_samples: int = 20, initial_delay: float = 5.0,
+                 min_delay: float = 0.05, window: int = 500):
+        self.q = q
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self._lock = threading.Lock()
+        self._ttfb: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._latency: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "hedged": 0, "hedge_won": 0,
+                                                                       "deadline_exceeded": 0})
+
+    def delay(self, method: str) -> float:
+        """Seconds to wait for a first token before sending a duplicate"""
+        with self._lock:
+            samples = list(self._ttfb[method])
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, percentile(samples, self.q))
+
+    def observe_first_token(self, method: str, ttfb: float):
+        with self._lock:
+            self._ttfb[method].append(ttfb)
+
+    def observe_call(self, method: str, latency: Optional[float], hedged: bool, hedge_won: bool,
+                     deadline_exceeded: bool = False):
+        with self._lock:
+            counts = self._counts[method]
+            counts["calls"] += 1
+            counts["hedged"] += int(hedged)
+            counts["hedge_won"] += int(hedge_won)
+            counts["deadline_exceeded"] += int(deadline_exceeded)
+            if latency is not None:
+                self._latency[method].append(latency)
+
+    def report(self) -> Dict[str, Any]:
+        """Hedge rate, hedge wins and latency percentiles per generator and overall"""
+        with self._lock:
+            counts = {method: dict(values) for method, values in self._counts.items()}
+            latencies = {method: list(values) for method, values in self._latency.items()}
+        methods = {}
+        for method, values in counts.items():
+            methods[method] = {
+                **values,
+                "hedge_rate": values["hedged"] / values["calls"] if values["calls"] else 0.0,
+                "hedge_delay": self.delay(method),
+                "latency_p50": percentile(latencies.get(method, []), 0.5),
+                "latency_p99": percentile(latencies.get(method, []), 0.99),
+            }
+        everything = [value for values in latencies.values() for value in values]
+        calls = sum(values["calls"] for values in counts.values())
+        hedged = sum(values["hedged"] for values in counts.values())
+        return {
+            "calls": calls,
+            "hedge_rate": hedged / calls if calls else 0.0,
+            "hedge_won": sum(values["hedge_won"] for values in counts.values()),
+            "latency_p50": percentile(everything, 0.5),
+            "latency_p99": percentile(everything, 0.99),
+            "methods": methods,
+        }
+
+    def run(self, method: str, attempt: Callable[[Cancellation, Callable[[], None]], Any],
+            deadline: Optional[float] = None) -> Any:
+        """Run attempt(cancelled, first_token), hedging it once if the first token is late
+
+        attempt must call first_token() when output starts and should return
+        early once cancelled is set; a blocking read is interrupted by
+        registering cancelled.on_cancel(stream.close). Attempts run on daemon
+        threads; the first to finish wins and the others are cancelled.
+        """
+        started = time.perf_counter()
+        events: "queue.Queue" = queue.Queue()
+        cancels: List[Cancellation] = []
+        primary_output = threading.Event()
+
+        def launch():
+            index, cancelled = len(cancels), Cancellation()
+            cancels.append(cancelled)
+            attempt_started = time.perf_counter()
+
+            def first_token():
+                if index == 0 and not cancelled.is_set() and not primary_output.is_set():
+                    primary_output.set()
+                    self.observe_first_token(method, time.perf_counter() - attempt_started)
+                events.put(("first", index))
+
+            def work():
+                try:
+                    events.put(("done", index, attempt(cancelled, first_token), None))
+                except BaseException as exc:
+                    events.put(("done", index, None, exc))
+
+            threading.Thread(target=work, name=f"hedge-{method}-{index}", daemon=True).start()
+
+        def cancel_all(winner: Optional[int] = None):
+            if not primary_output.is_set():
+                primary_output.set()
+                self.observe_first_token(method, time.perf_counter() - started)
+            for index, cancelled in enumerate(cancels):
+                if index != winner:
+                    cancelled.set()
+
+        launch()
+        hedge_at = started + self.delay(method)
+        first_seen, failures, error = False, 0, None
+        while True:
+            now = time.perf_counter()
+            waits = [] if first_seen or len(cancels) > 1 else [hedge_at - now]
+            if deadline is not None:
+                waits.append(deadline - time.monotonic())
+            try:
+                event = events.get(timeout=max(0.0, min(waits)) if waits else None)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    cancel_all()
+                    self.observe_call(method, None, len(cancels) > 1, False, deadline_exceeded=True)
+                    raise DeadlineExceeded(f"{method} exceeded its deadline") from None
+                launch()
+                continue
+
+            if event[0] == "first":
+                first_seen = first_seen or event[1] == 0
+                continue
+
+            _, index, result, exc = event
+            if exc is None:
+                cancel_all(index)
+                self.observe_call(method, time.perf_counter() - started, len(cancels) > 1, index > 0)
+                return result
+            failures += 1
+            error = error or exc
+            if failures == len(cancels):
+                self.observe_call(method, None, len(cancels) > 1, False)
+                raise error
+
+    async def run_async(self, method: str, attempt: Callable[[Callable[[], None]], Any],
+                        deadline: Optional[float] = None) -> Any:
+        """Await attempt(first_token), hedging it once if the first token is late
+
+        The losing attempt's task is cancelled, which closes its connection.
+        """
+        import asyncio
+
+        started = time.perf_counter()
+        first_token_seen = asyncio.Event()
+        tasks: List["asyncio.Task"] = []
+
+        def launch():
+            primary = not tasks
+
+            def first_token():
+                if primary and not first_token_seen.is_set():
+                    self.observe_first_token(method, time.perf_counter() - started)
+                    first_token_seen.set()
+
+            tasks.append(asyncio.ensure_future(attempt(first_token)))
+
+        def left() -> Optional[float]:
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        launch()
+        first_waiter = asyncio.ensure_future(first_token_seen.wait())
+        try:
+            hedge_delay = self.delay(method)
+            timeout = hedge_delay if deadline is None else min(hedge_delay, left())
+            await asyncio.wait([tasks[0], first_waiter], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not tasks[0].done() and not first_token_seen.is_set() and (deadline is None or left() > 0):
+                launch()
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=left(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.observe_call(method, None, len(tasks) > 1, False, deadline_exceeded=True)
+                    raise DeadlineExceeded(f"{method} exceeded its deadline")
+                for task in done:
+                    if task.exception() is None:
+                        self.observe_call(method, time.perf_counter() - started, len(tasks) > 1,
+                                          task is not tasks[0])
+                        return task.result()
+                    error = error or task.exception()
+            self.observe_call(method, None, len(tasks) > 1, False)
+            raise error
+        finally:
+            if not first_token_seen.is_set():
+                self.observe_first_token(method, time.perf_counter() - started)
+            first_waiter.cancel()
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
@@ -3,12 +3,61 @@ Car Detailer Marketing Agent
 AI-powered marketing automation system for car detailing businesses
 """
 
+import copy
+import json
 import os
+import sys
+import threading
+from contextlib import nullcontext
+from functools import cached_property
 from datetime import datetime
-from typing import Optional
-import anthropic
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
 from dataclasses import dataclass
 
+from artifacts import ArtifactStore
+from cache import ResponseCache, make_cache_key
+from canonical import Canonicalizer, Fingerprint
+from coalesce import SingleFlight
+from hedging import HedgePolicy, deadline_at, deadline_errors, resolve_deadline, time_left
+from registry import CORE_GENERATORS, GeneratorSpec, get_spec, normalize_whitespace
+from routing import Router
+from ratelimit import INTERACTIVE, RequestScheduler, stream_usage
+from structured import ItemStreamParser, StructuredOutput, get_output
+from telemetry import CallRecord, Telemetry
+
+
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+)
+
+
+def response_text(message) -> str:
+    """Text of a Messages API response; a forced tool call is returned as its JSON input"""
+    for block in message.content:
+        if block.type == "tool_use":
+            return json.dumps(block.input)
+    return "".join(block.text for block in message.content if block.type == "text")
+
+
+def stream_delta(event) -> str:
+    """Text or partial tool-input JSON carried by a stream event, "" for other events"""
+    if event.type != "content_block_delta":
+        return ""
+    return getattr(event.delta, "text", None) or getattr(event.delta, "partial_json", None) or ""
+
+
+@dataclass(frozen=True)
+class PreparedCall:
+    """A generator call ready to send: rendered prompt, routing and cache identity"""
+    prompt: str
+    max_tokens: int
+    model: Optional[str] = None
+    fingerprint: Optional[Fingerprint] = None
+    values: Optional[Dict[str, Any]] = None  # bound arguments, recorded with the output
+
 
 @dataclass
 class DetailingClient:
@@ -28,10 +77,73 @@ class CarDetailerMarketingAgent:
     Handles lead generation, content creation, and campaign management
     """
 
-    def __init__(self, api_key: Optional[str] = None):
-        self.client = anthropic.Anthropic(api_key=api_key or os.environ.get("ANTHROPIC_API_KEY"))
+    generators = CORE_GENERATORS
+
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[ResponseCache] = None, client=None,
+                 scheduler: Optional[RequestScheduler] = None, priority: int = INTERACTIVE,
+                 coalescer: Optional[SingleFlight] = None, telemetry: Optional[Telemetry] = None,
+                 base_url: Optional[str] = None, canonicalizer: Optional[Canonicalizer] = None,
+                 router: Optional[Router] = None, artifacts: Optional[ArtifactStore] = None,
+                 hedging: Optional[HedgePolicy] = None):
+        self.base_url = base_url
+        self.artifacts = artifacts
+        self.hedging = hedging
+        self.canonicalizer = canonicalizer
+        self.router = router
+        self.scheduler = scheduler
+        self.priority = priority
+        self.coalescer = coalescer
+        self.telemetry = telemetry
+        # The SDK is imported and the client built on first use, so cache hits never pay for either
+        self._api_key = api_key
+        self._client = client
+        self._client_lock = threading.Lock()
         self.model = "claude-3-5-sonnet-20241022"
-        self.marketing_context = self._load_marketing_knowledge()
+        self.cache = cache
+        self.usage = {field: 0 for field in USAGE_FIELDS}
+        self._usage_lock = threading.Lock()
+        self.last_usage: Dict[str, int] = {}
+        self.last_call: Optional[CallRecord] = None  # set per instance; copy the agent to track calls per thread
+        # Set on a ClientSession's copy of the agent to add the client's context after the shared prefix
+        self.session = None
+        # Client every artifact is filed under; None reads it from the generator's arguments
+        self.client_name: Optional[str] = None
+
+    @property
+    def client(self):
+        """The Anthropic SDK client, created on first access"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client(self._api_key or os.environ.get("ANTHROPIC_API_KEY"))
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def _create_client(self, api_key: Optional[str]):
+        """Build the Anthropic SDK client used for all API calls"""
+        import anthropic
+
+        # With a scheduler, retries are handled there so they respect the shared limits
+        max_retries = 0 if self.scheduler is not None else anthropic.DEFAULT_MAX_RETRIES
+        return anthropic.Anthropic(api_key=api_key, base_url=self.base_url, max_retries=max_retries)
+
+    def for_client(self, name: Optional[str]) -> "CarDetailerMarketingAgent":
+        """A shallow copy that files every artifact it saves under client name
+
+        It shares the SDK client (once built), caches and telemetry, and keeps
+        its own last_usage and last_call.
+        """
+        agent = copy.copy(self)
+        agent.client_name = name
+        return agent
+
+    @cached_property
+    def marketing_context(self) -> str:
+        """Normalized domain knowledge sent as the shared system prompt"""
+        return normalize_whitespace(self._load_marketing_knowledge())
 
     def _load_marketing_knowledge(self) -> str:
         """Load domain knowledge about car detailing marketing"""
@@ -63,176 +175,405 @@ class CarDetailerMarketingAgent:
         - Referral systems
         """
 
+    def _system_blocks(self) -> list[Dict[str, Any]]:
+        """Shared system prefix, marked so every generator reuses one prompt cache entry"""
+        # The API only caches prefixes above the model's minimum length (1024
+        # tokens for Sonnet); anything shorter is processed uncached as before.
+        blocks = [{
+            "type": "text",
+            "text": self.marketing_context,
+            "cache_control": {"type": "ephemeral"},
+        }]
+        if self.session is not None:
+            blocks += self.session.system_blocks()
+        return blocks
+
+    def _build_request(self, prompt: str, max_tokens: int, output: Optional[StructuredOutput] = None,
+                       model: Optional[str] = None) -> Dict[str, Any]:
+        """Build the keyword arguments for a messages.create call"""
+        request = {
+            "model": model or self.model,
+            "max_tokens": max_tokens,
+            "system": self._system_blocks(),
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        if output is not None:
+            request["messages"][0]["content"] += output.instruction()
+            request["tools"] = [output.tool()]
+            request["tool_choice"] = output.tool_choice()
+        return request
+
+    def _record_usage(self, response) -> Dict[str, int]:
+        """Accumulate token usage, including prompt cache reads and writes"""
+        self.last_usage = self._add_usage(getattr(response, "usage", None))
+        return self.last_usage
+
+    def _record_retried_usage(self, response, spent: Optional[Dict[str, int]]) -> Dict[str, int]:
+        """_record_usage for a call that may have needed a second attempt; its usage covers both"""
+        usage = self._record_usage(response)
+        if spent is not None:
+            usage = self.last_usage = {field: usage[field] + spent[field] for field in USAGE_FIELDS}
+        return usage
+
+    def _add_usage(self, usage) -> Dict[str, int]:
+        """Add an API usage object to the running totals, without making it the last call's usage"""
+        counts = {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+        with self._usage_lock:
+            for field, value in counts.items():
+                self.usage[field] += value
+        return counts
+
+    def _track(self, method: str, request: Dict[str, Any]):
+        """Context manager measuring one call; a no-op record when telemetry is off"""
+        if self.telemetry is None:
+            return nullcontext(CallRecord(method, request["model"], request["max_tokens"]))
+        return self.telemetry.track(method, request["model"], request["max_tokens"])
+
+    def _send(self, request: Dict[str, Any], call: Optional[CallRecord] = None, deadline: Optional[float] = None):
+        """Call messages.create, through the rate limit scheduler when one is configured
+
+        With a deadline each attempt is bounded by the time left; with a hedge
+        policy the request is hedged.
+        """
+        if self.hedging is not None:
+            return self._send_hedged(request, call, deadline)
+        with deadline_errors(deadline):
+            if self.scheduler is None:
+                return self._deadline_client(deadline).messages.create(**request)
+            on_retry = call.add_retry if call is not None else None
+            return self.scheduler.call(self.client.messages.create, request, self.priority, on_retry=on_retry,
+                                       deadline=deadline)
+
+    def _deadline_client(self, deadline: Optional[float]):
+        """The SDK client, bounded by the time left when there is a deadline
+
+        A timed-out attempt has used up the deadline, so there is nothing left
+        to retry in. With a scheduler, the scheduler bounds each attempt instead.
+        """
+        if deadline is None:
+            return self.client
+        return self.client.with_options(timeout=time_left(deadline), max_retries=0)
+
+    def _open_stream(self, request: Dict[str, Any], call: Optional[CallRecord] = None,
+                     deadline: Optional[float] = None):
+        """Open a message stream, through the rate limit scheduler when one is configured"""
+        if self.scheduler is None:
+            return self._deadline_client(deadline).messages.stream(**request)
+        on_retry = call.add_retry if call is not None else None
+        return self.scheduler.stream(self.client.messages.stream, request, self.priority, on_retry=on_retry,
+                                     deadline=deadline)
+
+    def _send_hedged(self, request: Dict[str, Any], call: Optional[CallRecord], deadline: Optional[float]):
+        """Stream the request so a late first token can trigger a duplicate; return the winner's message
+
+        Each attempt goes through the scheduler on its own. A losing attempt's
+        stream is closed, even mid-read, and the tokens it used are added to
+        the agent's usage.
+        """
+        def attempt(cancelled, first_token):
+            with self._open_stream(request, call, deadline) as stream:
+                def lose():
+                    self._add_usage(stream_usage(stream))
+                    stream.close()
+
+                cancelled.on_cancel(lose)
+                started = False
+                for event in stream:
+                    if cancelled.is_set():
+                        return None
+                    if not started and stream_delta(event):
+                        started = True
+                        first_token()
+                return stream.get_final_message()
+
+        return self.hedging.run(call.method if call is not None else "messages.create", attempt, deadline)
+
+    def _near_duplicate_scope(self, request: Dict[str, Any], fingerprint: Fingerprint) -> Fingerprint:
+        """Widen a fingerprint's scope to the model, max_tokens, system prompt and tools"""
+        scope = make_cache_key({**request, "messages": fingerprint.scope})
+        return Fingerprint(scope, fingerprint.signature)
+
+    def _cached(self, key: str, request: Dict[str, Any], fingerprint: Optional[Fingerprint]) -> Optional[str]:
+        """Return a cached response for the exact request, else for a near-duplicate one"""
+        if self.cache is None:
+            return None
+
+        def keys():
+            yield key
+            if fingerprint is not None:
+                similar = self.canonicalizer.near_duplicates.lookup(self._near_duplicate_scope(request, fingerprint))
+                if similar is not None and similar != key:
+                    yield similar
+
+        # One lookup, counted once, however many keys it tries
+        return self.cache.get_any(keys())
+
+    def _remember(self, key: str, request: Dict[str, Any], fingerprint: Optional[Fingerprint]):
+        """Index a freshly cached response for near-duplicate lookups"""
+        if self.cache is not None and fingerprint is not None:
+            self.canonicalizer.near_duplicates.add(key, self._near_duplicate_scope(request, fingerprint))
+
+    def _save_artifact(self, method: str, request: Dict[str, Any], call: CallRecord, text: str,
+                       values: Optional[Dict[str, Any]]):
+        """Record an output in the artifact store, when one is configured"""
+        if self.artifacts is not None:
+            usage = {field: getattr(call, field) for field in USAGE_FIELDS}
+            self.artifacts.save(method, text, values, client=self.client_name, model=request["model"], usage=usage,
+                                cache_hit=call.cache_hit)
+
+    def _complete(self, method: str, prompt: str, max_tokens: int, output: Optional[StructuredOutput] = None,
+                  fingerprint: Optional[Fingerprint] = None, model: Optional[str] = None,
+                  values: Optional[Dict[str, Any]] = None, deadline: Optional[float] = None) -> str:
+        """Send a single prompt to the model and return the response text
+
+        deadline is an absolute time.monotonic() value; the earlier of it and
+        any enclosing time_limit applies.
+        """
+        request = self._build_request(prompt, max_tokens, output, model)
+        key = make_cache_key(request)
+        deadline = resolve_deadline(deadline)
+
+        with self._track(method, request) as call:
+            cached = self._cached(key, request, fingerprint)
+            if cached is not None:
+                call.cache_hit = True
+                text = cached
+            elif self.coalescer is not None:
+                text = self.coalescer.do(key, lambda: self._fetch(method, key, request, call, deadline))
+                self._remember(key, request, fingerprint)
+            else:
+                text = self._fetch(method, key, request, call, deadline)
+                self._remember(key, request, fingerprint)
+        self.last_call = call
+        self._save_artifact(method, request, call, text, values)
+        return text
+
+    def _truncation_limit(self, method: str, request: Dict[str, Any], response) -> Optional[int]:
+        """A larger max_tokens to retry a response the router's observed limit cut off with, or None"""
+        if self.router is None or getattr(response, "stop_reason", None) != "max_tokens":
+            return None
+        return self.router.retry_limit(method, request["max_tokens"])
+
+    def _fetch(self, method: str, key: str, request: Dict[str, Any], call: CallRecord,
+               deadline: Optional[float] = None) -> str:
+        """Call the API for a request that missed the cache and store the result
+
+        The result is cached under the original request's key, so a call cut
+        off and retried with a larger limit is served whole next time.
+        """
+        response = self._send(request, call, deadline)
+        limit = self._truncation_limit(method, request, response)
+        spent = None
+        if limit is not None:
+            spent = self._add_usage(response.usage)
+            response = self._send({**request, "max_tokens": limit}, call, deadline)
+        call.set_usage(self._record_retried_usage(response, spent))
+        text = response_text(response)
+
+        if self.cache is not None:
+            self.cache.set(key, method, text)
+        return text
+
+    def _stream(self, method: str, prompt: str, max_tokens: int, output: Optional[StructuredOutput] = None,
+                fingerprint: Optional[Fingerprint] = None, model: Optional[str] = None,
+                values: Optional[Dict[str, Any]] = None, deadline: Optional[float] = None) -> Iterator[str]:
+        """Send a single prompt to the model and yield text deltas as they arrive"""
+        request = self._build_request(prompt, max_tokens, output, model)
+        key = make_cache_key(request)
+        deadline = resolve_deadline(deadline)
+
+        with self._track(method, request) as call:
+            call.streamed = True
+            cached = self._cached(key, request, fingerprint)
+            if cached is not None:
+                call.cache_hit = True
+                yield cached
+                self.last_call = call
+                self._save_artifact(method, request, call, cached, values)
+                return
+
+            chunks = []
+            with deadline_errors(deadline):
+                final = yield from self._stream_attempt(request, call, deadline, chunks)
+                limit, spent = self._truncation_limit(method, request, final), None
+                if limit is not None and "tools" not in request:
+                    spent = self._add_usage(final.usage)
+                    continuation = self._continuation(request, "".join(chunks), limit, final)
+                    final = yield from self._stream_attempt(continuation, call, deadline, chunks)
+                    limit = None
+                call.set_usage(self._record_retried_usage(final, spent))
+
+            text = "".join(chunks)
+            # Structured output cannot be continued, so when cut off it is returned but not kept
+            if self.cache is not None and limit is None:
+                self.cache.set(key, method, text)
+                self._remember(key, request, fingerprint)
+        self.last_call = call
+        self._save_artifact(method, request, call, text, values)
+
+    def _stream_attempt(self, request: Dict[str, Any], call: CallRecord, deadline: Optional[float],
+                        chunks: list) -> Iterator[str]:
+        """Stream one request, yielding and collecting its text deltas; returns the final message"""
+        with self._open_stream(request, call, deadline) as stream:
+            for event in stream:
+                time_left(deadline)
+                text = stream_delta(event)
+                if not text:
+                    continue
+                call.mark_first_byte()
+                chunks.append(text)
+                yield text
+            return stream.get_final_message()
+
+    @staticmethod
+    def _continuation(request: Dict[str, Any], text: str, limit: int, cut) -> Dict[str, Any]:
+        """Request that continues a streamed response cut off at the router's limit
+
+        What was already streamed is sent back as the start of the assistant's
+        turn, so the model carries on from where it stopped and nothing is
+        streamed twice. Together the two attempts stay within limit.
+        """
+        return {
+            **request,
+            "max_tokens": max(1, limit - cut.usage.output_tokens),
+            "messages": request["messages"] + [{"role": "assistant", "content": text.rstrip()}],
+        }
+
+    def _spec(self, name: str) -> GeneratorSpec:
+        """Look up a generator this agent offers"""
+        if name not in self.generators:
+            raise ValueError(f"{type(self).__name__} has no generator named {name!r}")
+        return get_spec(name)
+
+    def prepare(self, name: str, args=(), kwargs=None, output: Optional[StructuredOutput] = None,
+                record: bool = True) -> PreparedCall:
+        """Bind and canonicalize a call's arguments, render its prompt and route it
+
+        Helpers that adapt a generator's prompt (pipelines, packing, batches)
+        start here so they see the same values, model and limit as generate().
+        Planners pass record=False so the router does not count a call that
+        may never be sent.
+        """
+        kwargs = kwargs or {}
+        spec = self._spec(name)
+        values = spec.bind(args, kwargs)
+        fingerprint = None
+        if self.canonicalizer is not None:
+            values = self.canonicalizer.canonicalize(values)
+            fingerprint = self.canonicalizer.fingerprint(name, values)
+        if self.router is None:
+            return PreparedCall(spec.template.render(values), spec.max_tokens, fingerprint=fingerprint, values=values)
+        route = self.router.route(spec, values, structured=output is not None, record=record)
+        return PreparedCall(spec.template.render(values), route.max_tokens, route.model, fingerprint, values)
+
+    def complete(self, method: str, prompt: str, max_tokens: int, model: Optional[str] = None,
+                 values: Optional[Dict[str, Any]] = None, deadline: Optional[float] = None) -> str:
+        """Send a prompt built outside the generator registry, filed under method
+
+        It is cached, scheduled, recorded and saved like any generator call.
+        deadline is in seconds from now. On the async agent this is a coroutine.
+        """
+        return self._complete(method, prompt, max_tokens, model=model, values=values,
+                              deadline=deadline_at(deadline))
+
+    def generate(self, name: str, *args, deadline: Optional[float] = None, **kwargs) -> str:
+        """Run a registered generator by name; every generator method dispatches here
+
+        deadline is in seconds from now; wrap named generator methods in
+        hedging.time_limit() to bound them the same way.
+        """
+        prepared = self.prepare(name, args, kwargs)
+        return self._complete(name, prepared.prompt, prepared.max_tokens, fingerprint=prepared.fingerprint,
+                              model=prepared.model, values=prepared.values, deadline=deadline_at(deadline))
+
+    def stream(self, name: str, *args, deadline: Optional[float] = None, **kwargs) -> Iterator[str]:
+        """Run a registered generator by name, yielding text deltas"""
+        prepared = self.prepare(name, args, kwargs)
+        return self._stream(name, prepared.prompt, prepared.max_tokens, fingerprint=prepared.fingerprint,
+                            model=prepared.model, values=prepared.values, deadline=deadline_at(deadline))
+
+    def generate_structured(self, name: str, *args, deadline: Optional[float] = None, **kwargs) -> Dict[str, Any]:
+        """Run a generator in structured mode and return its parsed JSON result"""
+        output = get_output(name)
+        prepared = self.prepare(name, args, kwargs, output)
+        return json.loads(self._complete(name, prepared.prompt, prepared.max_tokens, output, prepared.fingerprint,
+                                         prepared.model, prepared.values, deadline_at(deadline)))
+
+    def stream_structured(self, name: str, *args, deadline: Optional[float] = None,
+                          **kwargs) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Run a generator in structured mode, yielding (field, item) as each list item completes
+
+        Posts, emails, calendar entries and budget lines arrive while the rest
+        of the response is still streaming.
+        """
+        output = get_output(name)
+        prepared = self.prepare(name, args, kwargs, output)
+        parser = ItemStreamParser(output.item_fields)
+        for chunk in self._stream(name, prepared.prompt, prepared.max_tokens, output, prepared.fingerprint,
+                                  prepared.model, prepared.values, deadline_at(deadline)):
+            yield from parser.feed(chunk)
+
     def generate_marketing_strategy(self, client: DetailingClient) -> str:
         """Generate a customized marketing strategy for a detailing business"""
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Please create a detailed, actionable marketing strategy for this car detailing business:
-        
-        Business Name: {client.name}
-        Business Type: {client.business_type}
-        Service Area: {client.service_area}
-        Monthly Marketing Budget: ${client.monthly_budget}
-        Goals: {', '.join(client.goals)}
-        
-        Provide:
-        1. Executive Summary
-        2. Target Audience Analysis
-        3. Recommended Marketing Channels (with expected ROI)
-        4. 90-Day Action Plan
-        5. Content Calendar (next 30 days)
-        6. Key Performance Indicators (KPIs)
-        7. Budget Allocation Strategy
-        8. Competitive Positioning
-        """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=2000,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("generate_marketing_strategy", client)
 
     def create_social_media_content(self, service_type: str, num_posts: int = 5) -> str:
         """Generate social media content calendar"""
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Create {num_posts} engaging social media posts for a car detailing business promoting {service_type}.
-        
-        For each post, provide:
-        - Platform (Instagram, TikTok, Facebook)
-        - Caption (with relevant hashtags)
-        - Recommended visuals/video idea
-        - Best posting time
-        - Engagement strategy
-        
-        Make content viral-worthy and conversion-focused.
-        """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1500,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("create_social_media_content", service_type, num_posts)
 
     def generate_email_campaign(self, audience_segment: str, campaign_type: str) -> str:
         """Create email marketing campaigns"""
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Create a 5-email marketing campaign for {audience_segment} focused on {campaign_type}.
-        
-        Include:
-        1. Subject lines (A/B testing variants)
-        2. Email templates with copy
-        3. CTA strategies
-        4. Timing/frequency recommendations
-        5. Expected conversion rates
-        6. Personalization elements
-        
-        Make it high-converting and value-focused.
-        """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1800,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("generate_email_campaign", audience_segment, campaign_type)
 
     def analyze_competitor(self, competitor_name: str, service_area: str) -> str:
         """Analyze competitor marketing strategies"""
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Analyze the likely marketing strategy for a car detailing competitor:
-        Business: {competitor_name}
-        Service Area: {service_area}
-        
-        Provide:
-        1. Estimated Marketing Channels
-        2. Likely Target Customer Profile
-        3. Probable Pricing Strategy
-        4. Competitive Advantages & Weaknesses
-        5. Differentiation Opportunities
-        6. Win-Back Strategies
-        """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1200,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("analyze_competitor", competitor_name, service_area)
 
     def generate_referral_program(self, business_type: str, service_level: str) -> str:
         """Design a referral program"""
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Design a high-performing referral program for a {business_type} car detailing business at {service_level} level.
-        
-        Include:
-        1. Referral Incentive Structure
-        2. Program Rules & Terms
-        3. Marketing Materials Needed
-        4. Implementation Steps
-        5. Tracking Mechanisms
-        6. Expected Conversion Rates
-        7. Budget Requirements
-        8. Launch Strategy
-        """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1400,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("generate_referral_program", business_type, service_level)
 
     def generate_pricing_strategy(self, business_size: str, market_position: str, service_area: str) -> str:
         """Generate pricing and promotional strategy"""
-        
-        prompt = f"""
-        {self.marketing_context}
-        
-        Create a pricing and promotional strategy for a {business_size} car detailing business
-        positioned as {market_position} in the {service_area} market.
-        
-        Provide:
-        1. Service Pricing Recommendations
-        2. Seasonal Promotions Calendar
-        3. Bundle Strategies
-        4. Dynamic Pricing Rules
-        5. Discount Strategy Framework
-        6. Psychological Pricing Tactics
-        7. Upsell Opportunities
-        8. Package Recommendations
-        """
-        
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1400,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        return response.content[0].text
+        return self.generate("generate_pricing_strategy", business_size, market_position, service_area)
+
+    def stream_marketing_strategy(self, client: DetailingClient) -> Iterator[str]:
+        """Stream generate_marketing_strategy output as text deltas"""
+        return self.stream("generate_marketing_strategy", client)
+
+    def stream_social_media_content(self, service_type: str, num_posts: int = 5) -> Iterator[str]:
+        """Stream create_social_media_content output as text deltas"""
+        return self.stream("create_social_media_content", service_type, num_posts)
+
+    def stream_email_campaign(self, audience_segment: str, campaign_type: str) -> Iterator[str]:
+        """Stream generate_email_campaign output as text deltas"""
+        return self.stream("generate_email_campaign", audience_segment, campaign_type)
+
+    def stream_competitor_analysis(self, competitor_name: str, service_area: str) -> Iterator[str]:
+        """Stream analyze_competitor output as text deltas"""
+        return self.stream("analyze_competitor", competitor_name, service_area)
+
+    def stream_referral_program(self, business_type: str, service_level: str) -> Iterator[str]:
+        """Stream generate_referral_program output as text deltas"""
+        return self.stream("generate_referral_program", business_type, service_level)
+
+    def stream_pricing_strategy(self, business_size: str, market_position: str, service_area: str) -> Iterator[str]:
+        """Stream generate_pricing_strategy output as text deltas"""
+        return self.stream("generate_pricing_strategy", business_size, market_position, service_area)
+
+
+def print_output(output: Union[str, Iterator[str]]):
+    """Print a generator result, writing streamed deltas as soon as they arrive"""
+    if isinstance(output, str):
+        print(output)
+        return
+    for text in output:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    print()
 
 
-def main():
+def main(stream: bool = False):
     """Demo the marketing agent"""
     
     agent = CarDetailerMarketingAgent()
@@ -254,43 +595,53 @@ def main():
     print(f"\nGenerating strategy for: {client.name}\n")
     
     # Generate strategy
-    strategy = agent.generate_marketing_strategy(client)
     print("MARKETING STRATEGY:")
     print("-" * 80)
-    print(strategy)
+    if stream:
+        print_output(agent.stream_marketing_strategy(client))
+    else:
+        print_output(agent.generate_marketing_strategy(client))
     print("\n" + "=" * 80)
     
     # Generate social content
     print("\nGenerating social media content...\n")
-    social_content = agent.create_social_media_content("Ceramic Coating Services", num_posts=3)
     print("SOCIAL MEDIA CONTENT:")
     print("-" * 80)
-    print(social_content)
+    if stream:
+        print_output(agent.stream_social_media_content("Ceramic Coating Services", num_posts=3))
+    else:
+        print_output(agent.create_social_media_content("Ceramic Coating Services", num_posts=3))
     print("\n" + "=" * 80)
     
     # Generate email campaign
     print("\nGenerating email campaign...\n")
-    email_campaign = agent.generate_email_campaign("Past Customers", "Seasonal Promotion")
     print("EMAIL CAMPAIGN:")
     print("-" * 80)
-    print(email_campaign)
+    if stream:
+        print_output(agent.stream_email_campaign("Past Customers", "Seasonal Promotion"))
+    else:
+        print_output(agent.generate_email_campaign("Past Customers", "Seasonal Promotion"))
     print("\n" + "=" * 80)
     
     # Referral program
     print("\nGenerating referral program...\n")
-    referral = agent.generate_referral_program("independent", "premium")
     print("REFERRAL PROGRAM:")
     print("-" * 80)
-    print(referral)
+    if stream:
+        print_output(agent.stream_referral_program("independent", "premium"))
+    else:
+        print_output(agent.generate_referral_program("independent", "premium"))
     print("\n" + "=" * 80)
     
     # Pricing strategy
     print("\nGenerating pricing strategy...\n")
-    pricing = agent.generate_pricing_strategy("small", "premium", "Austin, TX")
     print("PRICING STRATEGY:")
     print("-" * 80)
-    print(pricing)
+    if stream:
+        print_output(agent.stream_pricing_strategy("small", "premium", "Austin, TX"))
+    else:
+        print_output(agent.generate_pricing_strategy("small", "premium", "Austin, TX"))
 
 
 if __name__ == "__main__":
-    main()
+    main(stream="--stream" in sys.argv[1:])
@@ -0,0 +1,194 @@
+"""
+Multi-location prompt packing for the Car Detailer Marketing Agent
+Sends one request for several locations of the same business: the model
+writes the shared plan once plus a short delta per location, and the
+response is split back into one result per location
+"""
+
+import math
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from main import CarDetailerMarketingAgent, PreparedCall
+from ratelimit import CHARS_PER_TOKEN
+
+
+DEFAULT_OUTPUT_LIMIT = 8192  # max output tokens of a packed request
+
+_SECTION = re.compile(r"^=+\s*(BASE|LOCATION\s+(\d+))\s*=+\s*$", re.MULTILINE | re.IGNORECASE)
+
+PACKED_INSTRUCTIONS = """
+Write this deliverable for {count} locations of the same business. Values in
+[brackets] above differ by location:
+
+{locations}
+
+Write everything the locations share once, then only what is specific to
+each location. Use exactly this layout, with the marker lines as shown:
+
+=== BASE ===
+(the full shared plan)
+{markers}
+""".strip()
+
+
+class _Varies:
+    """Stands in for a per-location argument when rendering the shared prompt"""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attribute: str) -> "_Varies":
+        return _Varies(f"{self._name} {attribute}")
+
+    def __format__(self, format_spec: str) -> str:
+        return f"[{self._name.replace('_', ' ')}]"
+
+
+@dataclass
+class PackedResult:
+    """Per-location outputs of a packed run, plus what the packing saved"""
+    results: Dict[str, str] = field(default_factory=dict)  # location -> base plan plus its delta
+    bases: List[str] = field(default_factory=list)  # one shared plan per packed request
+    deltas: Dict[str, str] = field(default_factory=dict)
+    requests: int = 0
+    pack_sizes: List[int] = field(default_factory=list)
+    fallbacks: List[str] = field(default_factory=list)  # locations answered by a single call
+
+
+def _tokens(text: str) -> float:
+    return len(text) / CHARS_PER_TOKEN
+
+
+def split_packed(text: str, count: int) -> Tuple[str, Dict[int, str]]:
+    """Split a packed response into its base plan and {location number: delta}"""
+    matches = list(_SECTION.finditer(text))
+    base, deltas = "", {}
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        if match.group(2) is None:
+            base = body
+        elif 1 <= int(match.group(2)) <= count and body:
+            deltas[int(match.group(2))] = body
+    if not matches:
+        base = text.strip()
+    return base, deltas
+
+
+class LocationPacker:
+    """
+    Packs per-location calls of one generator into fewer, larger requests
+
+    Pack size is the number of deltas that fit in output_limit after the base
+    plan. Base and delta lengths start as fractions of the generator's
+    max_tokens and then follow what packed responses actually contained, so
+    later packs grow or shrink to fit. Locations missing from a response (for
+    example when it was cut off) are generated with a single call.
+    """
+
+    def __init__(self, agent: CarDetailerMarketingAgent, output_limit: int = DEFAULT_OUTPUT_LIMIT,
+                 max_pack: int = 25, delta_fraction: float = 0.3, headroom: float = 1.2, smoothing: float = 0.5):
+        self.agent = agent
+        self.output_limit = output_limit
+        self.max_pack = max_pack
+        self.delta_fraction = delta_fraction
+        self.headroom = headroom
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._observed: Dict[str, Tuple[float, float]] = {}  # generator -> (base tokens, delta tokens)
+
+    def estimates(self, name: str) -> Tuple[float, float]:
+        """Expected (base, per-location delta) output tokens for a generator"""
+        with self._lock:
+            if name in self._observed:
+                return self._observed[name]
+        max_tokens = self.agent._spec(name).max_tokens
+        return float(max_tokens), max_tokens * self.delta_fraction
+
+    def _observe(self, name: str, base: str, deltas: List[str]):
+        if not base or not deltas:
+            return
+        sample = (_tokens(base), max(_tokens(delta) for delta in deltas))
+        with self._lock:
+            previous = self._observed.get(name)
+            self._observed[name] = sample if previous is None else tuple(
+                self.smoothing * new + (1 - self.smoothing) * old for new, old in zip(sample, previous))
+
+    def pack_size(self, name: str) -> int:
+        """How many locations fit in one request's output limit"""
+        base, delta = self.estimates(name)
+        room = self.output_limit / self.headroom - base
+        return max(1, min(self.max_pack, int(room // max(delta, 1.0))))
+
+    def _prompt(self, name: str, batch: List[Tuple[str, Dict[str, Any]]], prepared: List[PreparedCall]) -> str:
+        spec = self.agent._spec(name)
+        bound = [call.values for call in prepared]
+        varying = [param.name for param in spec.params if len({repr(values[param.name]) for values in bound}) > 1]
+        shared = {**bound[0], **{param: _Varies(param) for param in varying}}
+        locations = "\n".join(
+            f"Location {number}: {label}" + "".join(f"; {param.replace('_', ' ')}: {values[param]}"
+                                                     for param in varying)
+            for number, ((label, _), values) in enumerate(zip(batch, bound), 1)
+        )
+        markers = "\n".join(f"=== LOCATION {number} ===\n(only what differs for {label})"
+                            for number, (label, _) in enumerate(batch, 1))
+        instructions = PACKED_INSTRUCTIONS.format(count=len(batch), locations=locations, markers=markers)
+        return f"{spec.template.render(shared)}\n\n{instructions}"
+
+    def _run_pack(self, name: str, batch: List[Tuple[str, Dict[str, Any]]], result: PackedResult):
+        base_estimate, delta_estimate = self.estimates(name)
+        max_tokens = min(self.output_limit,
+                         math.ceil((base_estimate + delta_estimate * len(batch)) * self.headroom))
+        # Canonical values and routing as for a single call; locations of one generator route alike
+        prepared = [self.agent.prepare(name, (), args) for _, args in batch]
+        text = self.agent.complete(f"{name}.packed", self._prompt(name, batch, prepared), max_tokens,
+                                   model=prepared[0].model, values={"locations": [label for label, _ in batch]})
+        base, deltas = split_packed(text, len(batch))
+        self._observe(name, base, list(deltas.values()))
+        result.requests += 1
+        result.pack_sizes.append(len(batch))
+        result.bases.append(base)
+
+        for number, ((label, args), call) in enumerate(zip(batch, prepared), 1):
+            delta = deltas.get(number)
+            if delta is None or not base:
+                result.fallbacks.append(label)
+                result.results[label] = self.agent.generate(name, **args)
+                result.requests += 1
+                continue
+            result.deltas[label] = delta
+            result.results[label] = f"{base}\n\n## {label}\n\n{delta}"
+            if self.agent.artifacts is not None:
+                self.agent.artifacts.save(name, result.results[label],
+                                          {**call.values, "location": label, "packed": True},
+                                          client=self.agent.client_name, model=call.model or self.agent.model)
+
+    def generate(self, name: str, locations: Dict[str, Dict[str, Any]]) -> PackedResult:
+        """Run a generator for every location: {label: generator arguments}
+
+        Returns one result per label, in the order given.
+        """
+        result = PackedResult()
+        pending = list(locations.items())
+        while pending:
+            size = self.pack_size(name)
+            batch, pending = pending[:size], pending[size:]
+            if len(batch) == 1:
+                label, args = batch[0]
+                result.results[label] = self.agent.generate(name, **args)
+                result.requests += 1
+                result.pack_sizes.append(1)
+                continue
+            self._run_pack(name, batch, result)
+        result.results = {label: result.results[label] for label in locations}
+        return result
+
+
+def franchise_seo_locations(business_name: str, service_areas: List[str],
+                            google_rating: float = 4.5) -> Dict[str, Dict[str, Any]]:
+    """Local SEO arguments for each service area of a franchise, keyed by area"""
+    return {area: {"business_name": business_name, "service_area": area, "google_rating": google_rating}
+            for area in service_areas}
@@ -0,0 +1,291 @@
+"""
+Pipeline executor for the Car Detailer Marketing Agent
+Runs a declared dependency graph of generator steps: independent steps in
+parallel, condensed upstream outputs passed downstream, per-step timings and
+the critical path reported, and completed steps resumed from a checkpoint
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from main import CarDetailerMarketingAgent, DetailingClient
+
+
+Condenser = Callable[[str], str]
+
+DEFAULT_CONDENSED_CHARS = 1200
+
+# A markdown heading ("## Target Audience") or a line that is all bold
+# ("**Target Audience:**"); numbered list items are content, not headings
+HEADING = re.compile(r"^\s*(?:#{1,6}\s+(?P<hashed>.+?)|\*\*(?P<bold>[^*]+?):?\*\*:?)\s*$")
+
+
+def heading_text(line: str) -> Optional[str]:
+    """The text of a heading line, or None for any other line"""
+    match = HEADING.match(line) if len(line) < 120 else None
+    return (match.group("hashed") or match.group("bold")) if match else None
+
+
+def head(max_chars: int = DEFAULT_CONDENSED_CHARS) -> Condenser:
+    """Condense an output to its first max_chars characters, cut at a line break"""
+    def condense(text: str) -> str:
+        if len(text) <= max_chars:
+            return text.strip()
+        cut = text.rfind("\n", 0, max_chars)
+        return text[:cut if cut > 0 else max_chars].strip()
+    return condense
+
+
+def sections(*headings: str, max_chars: int = DEFAULT_CONDENSED_CHARS) -> Condenser:
+    """Condense an output to the markdown sections whose headings contain any of headings"""
+    wanted = [heading.lower() for heading in headings]
+
+    def condense(text: str) -> str:
+        kept, keep = [], False
+        for line in text.splitlines():
+            title = heading_text(line)
+            if title is not None:
+                keep = any(heading in title.lower() for heading in wanted)
+            if keep:
+                kept.append(line)
+        return head(max_chars)("\n".join(kept) if kept else text)
+    return condense
+
+
+@dataclass(frozen=True)
+class Step:
+    """One generator call in a pipeline"""
+    name: str
+    generator: str
+    args: Tuple[Any, ...] = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    # Upstream step name -> how to condense its output before passing it in
+    inputs: Dict[str, Condenser] = field(default_factory=dict)
+
+    @property
+    def depends_on(self) -> Tuple[str, ...]:
+        return tuple(self.inputs)
+
+
+@dataclass
+class StepResult:
+    """Output and timing of one step"""
+    name: str
+    output: Optional[str] = None
+    condensed_inputs: Dict[str, str] = field(default_factory=dict)
+    started: float = 0.0  # seconds after the run began
+    finished: float = 0.0
+    resumed: bool = False
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+
+@dataclass
+class PipelineResult:
+    """Outcome of a pipeline run"""
+    results: Dict[str, StepResult]
+    elapsed: float
+    critical_path: List[str]
+    critical_path_seconds: float
+    failed: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> bool:
+        return not self.failed and not self.skipped
+
+    def outputs(self) -> Dict[str, str]:
+        return {name: result.output for name, result in self.results.items() if result.output is not None}
+
+    def report(self) -> Dict[str, Any]:
+        """Per-step timings plus the critical path"""
+        return {
+            "elapsed_s": round(self.elapsed, 4),
+            "critical_path": self.critical_path,
+            "critical_path_s": round(self.critical_path_seconds, 4),
+            "steps": {
+                name: {
+                    "started_s": round(result.started, 4),
+                    "duration_s": round(result.duration, 4),
+                    "resumed": result.resumed,
+                    "error": result.error,
+                }
+                for name, result in self.results.items()
+            },
+            "failed": self.failed,
+            "skipped": self.skipped,
+        }
+
+
+class PipelineCheckpoint:
+    """Completed step outputs, keyed by a hash of each step's inputs"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.steps: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as handle:
+                self.steps = json.load(handle)
+
+    def get(self, name: str, digest: str) -> Optional[str]:
+        entry = self.steps.get(name)
+        return entry["output"] if entry and entry["inputs"] == digest else None
+
+    def put(self, name: str, digest: str, output: str):
+        with self._lock:
+            self.steps[name] = {"inputs": digest, "output": output}
+            if self.path:
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as handle:
+                    json.dump(self.steps, handle)
+                os.replace(tmp_path, self.path)
+
+
+class Pipeline:
+    """
+    A validated dependency graph of generator steps
+    Upstream outputs reach a step through its inputs: each is condensed and
+    appended to the step's prompt as context.
+    """
+
+    CONTEXT_HEADER = "Build on these earlier deliverables for the same business:"
+
+    def __init__(self, steps: List[Step]):
+        self.steps = {step.name: step for step in steps}
+        if len(self.steps) != len(steps):
+            raise ValueError("Pipeline step names must be unique")
+        for step in steps:
+            missing = [name for name in step.depends_on if name not in self.steps]
+            if missing:
+                raise ValueError(f"Step {step.name!r} depends on unknown steps: {', '.join(missing)}")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        remaining = {name: set(step.depends_on) for name, step in self.steps.items()}
+        order = []
+        while remaining:
+            ready = sorted(name for name, deps in remaining.items() if not deps)
+            if not ready:
+                raise ValueError(f"Pipeline has a cycle among: {', '.join(sorted(remaining))}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    def _prompt(self, agent: CarDetailerMarketingAgent, step: Step, context: Dict[str, str]):
+        prepared = agent.prepare(step.generator, step.args, step.kwargs)
+        if not context:
+            return prepared, prepared.prompt
+        blocks = "\n\n".join(f"[{name}]\n{text}" for name, text in context.items())
+        return prepared, f"{prepared.prompt}\n\n{self.CONTEXT_HEADER}\n\n{blocks}"
+
+    def _input_hash(self, step: Step, context: Dict[str, str]) -> str:
+        payload = json.dumps([step.generator, step.args, step.kwargs, context], sort_keys=True, default=repr)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def run(self, agent: CarDetailerMarketingAgent, checkpoint_path: Optional[str] = None,
+            max_workers: int = 4) -> PipelineResult:
+        """Run every step, resuming completed ones from checkpoint_path when given
+
+        A failed step does not stop independent branches; its dependents are
+        skipped and the failure is reported. Rerun with the same checkpoint to
+        resume from the completed steps.
+        """
+        checkpoint = PipelineCheckpoint(checkpoint_path)
+        completed: Dict[str, StepResult] = {}
+        errors: Dict[str, StepResult] = {}
+        skipped: List[str] = []
+        pending = dict(self.steps)
+        started_at = time.perf_counter()
+
+        def run_step(step: Step, context: Dict[str, str], digest: str) -> StepResult:
+            result = StepResult(step.name, condensed_inputs=context, started=time.perf_counter() - started_at)
+            try:
+                prepared, prompt = self._prompt(agent, step, context)
+                result.output = agent.complete(step.generator, prompt, prepared.max_tokens, model=prepared.model,
+                                               values=prepared.values)
+                checkpoint.put(step.name, digest, result.output)
+            except Exception as exc:
+                result.error = f"{type(exc).__name__}: {exc}"
+            result.finished = time.perf_counter() - started_at
+            return result
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            running = {}
+            while True:
+                # Topological order lets a resumed step unblock its dependents in the same pass
+                for name in [name for name in self.order if name in pending]:
+                    step = pending[name]
+                    if any(dep in errors or dep in skipped for dep in step.depends_on):
+                        skipped.append(name)
+                        del pending[name]
+                        continue
+                    if not all(dep in completed for dep in step.depends_on):
+                        continue
+                    del pending[name]
+                    context = {dep: condense(completed[dep].output) for dep, condense in step.inputs.items()}
+                    digest = self._input_hash(step, context)
+                    cached = checkpoint.get(name, digest)
+                    if cached is not None:
+                        now = time.perf_counter() - started_at
+                        completed[name] = StepResult(name, cached, context, now, now, resumed=True)
+                    else:
+                        # Steps run in the caller's context so an enclosing time_limit applies to them
+                        running[pool.submit(copy_context().run, run_step, step, context, digest)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    (completed if result.error is None else errors)[running.pop(future)] = result
+
+        elapsed = time.perf_counter() - started_at
+        path, seconds = self._critical_path(completed)
+        results = {name: (completed.get(name) or errors[name]) for name in self.order
+                   if name in completed or name in errors}
+        return PipelineResult(results, elapsed, path, seconds, list(errors), skipped)
+
+    def _critical_path(self, results: Dict[str, StepResult]) -> Tuple[List[str], float]:
+        """Longest chain of dependent steps by measured duration"""
+        best: Dict[str, Tuple[float, List[str]]] = {}
+        for name in self.order:
+            if name not in results:
+                continue
+            upstream = [best[dep] for dep in self.steps[name].depends_on if dep in best]
+            seconds, path = max(upstream, default=(0.0, []), key=lambda item: item[0])
+            best[name] = (seconds + results[name].duration, path + [name])
+        if not best:
+            return [], 0.0
+        seconds, path = max(best.values(), key=lambda item: item[0])
+        return path, seconds
+
+
+def client_package_pipeline(client: DetailingClient, google_rating: float = 4.5,
+                            repeat_rate: float = 0.3) -> Pipeline:
+    """The onboarding package as a graph: downstream steps reuse upstream analysis"""
+    return Pipeline([
+        Step("strategy", "generate_marketing_strategy", (client,)),
+        Step("pricing", "generate_pricing_strategy", ("small", "premium", client.service_area)),
+        Step("seo", "generate_local_seo_strategy", (client.name, client.service_area, google_rating)),
+        Step("referral", "generate_referral_program", (client.business_type, "premium"),
+             inputs={"pricing": sections("pricing", "package", "tier")}),
+        Step("retention", "create_retention_marketing_strategy", (24, repeat_rate),
+             inputs={"pricing": sections("membership", "subscription", "package"),
+                     "strategy": sections("target audience")}),
+        Step("email", "generate_email_campaign", ("Past Customers", "Seasonal Promotion"),
+             inputs={"strategy": sections("target audience"), "referral": head(600)}),
+    ])
@@ -0,0 +1,273 @@
+"""
+Seasonal cache pre-warming for the Car Detailer Marketing Agent
+Ranks generator calls by how often they were requested in the coming season
+in past years and generates the top ones off-peak, within a token budget, so
+the first requests of the season are cache hits instead of cold API calls
+"""
+
+import argparse
+import copy
+import json
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from artifacts import DEFAULT_ARTIFACTS_PATH, ArtifactStore
+from batch import BatchRunner
+from cache import RefreshingCache, make_cache_key
+from main import CarDetailerMarketingAgent, DetailingClient
+from ratelimit import BULK, estimate_tokens
+
+
+SEASONS: Dict[str, Tuple[int, ...]] = {
+    "winter": (12, 1, 2),
+    "spring": (3, 4, 5),
+    "summer": (6, 7, 8),
+    "fall": (9, 10, 11),
+}
+
+# Spring and summer are the detailing peak (see the agent's marketing knowledge)
+PEAK_SEASONS = ("spring", "summer")
+
+DEFAULT_OFF_PEAK_HOURS = (1, 2, 3, 4, 5)
+
+
+def season_of(when: datetime) -> str:
+    return next(name for name, months in SEASONS.items() if when.month in months)
+
+
+def season_start(season: str, now: datetime) -> datetime:
+    """Start of the next occurrence of season after now (today's, if it starts today)"""
+    month = SEASONS[season][0]
+    start = datetime(now.year, month, 1)
+    return start if start.date() >= now.date() else datetime(now.year + 1, month, 1)
+
+
+def next_season(now: datetime, seasons: Sequence[str] = tuple(SEASONS)) -> Tuple[str, datetime]:
+    """The first of seasons to start after now, with its start"""
+    return min(((season, season_start(season, now)) for season in seasons), key=lambda item: item[1])
+
+
+@dataclass
+class WarmCandidate:
+    """A generator call seen in the request history, with its warming priority"""
+    method: str
+    args: Dict[str, Any]
+    season_requests: int  # requests in the target season's months in past years
+    other_requests: int
+    score: float
+    tokens: int  # observed usage per call, or an estimate when never sent
+    key: str
+    status: str = "pending"  # pending, cached, expires_early, over_budget, warmed or error
+
+
+@dataclass
+class WarmReport:
+    """What one pre-warm pass planned and did"""
+    season: str
+    season_start: datetime
+    budget_tokens: int
+    tokens_used: int = 0
+    candidates: List[WarmCandidate] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)  # cache key -> error
+
+    def count(self, status: str) -> int:
+        return sum(1 for candidate in self.candidates if candidate.status == status)
+
+
+def _decode_args(agent: CarDetailerMarketingAgent, method: str, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Rebuild a generator's keyword arguments from their recorded JSON, or None if they no longer fit"""
+    if method not in agent.generators:
+        return None
+    params = agent._spec(method).params
+    values = {param.name: args[param.name] for param in params if param.name in args}
+    try:
+        for param in params:
+            if param.kind == "client" and isinstance(values.get(param.name), dict):
+                values[param.name] = DetailingClient(**{"email": "", "phone": "", **values[param.name]})
+        agent._spec(method).bind((), values)
+    except TypeError:
+        return None
+    return values
+
+
+class Prewarmer:
+    """
+    Generates the most requested calls of the coming season ahead of time
+
+    Calls are ranked by requests recorded in history during the season's
+    months in past years, plus off_season_weight times their other requests.
+    A pass warms them in rank order while they fit in what is left of the
+    season's token budget. Calls already cached through the season's start
+    are skipped, as are calls whose cache TTL would run out before it; a later
+    pass, closer to the season, picks those up. Warming skips the cache
+    lookup, so an entry that exists but expires too early is regenerated and
+    stored with a fresh TTL.
+
+    The agent must have a response cache and must not record to history,
+    or warming calls would be counted as requests.
+    """
+
+    def __init__(self, agent: CarDetailerMarketingAgent, history: ArtifactStore, budget_tokens: int = 500_000,
+                 seasons: Sequence[str] = PEAK_SEASONS, off_season_weight: float = 0.25, lookback_years: int = 3,
+                 min_requests: int = 2, use_batches: bool = False):
+        if agent.cache is None:
+            raise ValueError("Pre-warming needs an agent with a response cache")
+        if agent.artifacts is history:
+            raise ValueError("Warm with an agent that does not record to the history store")
+        self.agent = agent
+        self.history = history
+        self.budget_tokens = budget_tokens
+        self.seasons = tuple(seasons)
+        self.off_season_weight = off_season_weight
+        self.lookback_years = lookback_years
+        self.min_requests = min_requests
+        self.use_batches = use_batches
+        self._spent: Dict[Tuple[str, int], int] = defaultdict(int)  # (season, year) -> tokens
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def plan(self, season: Optional[str] = None, now: Optional[datetime] = None) -> WarmReport:
+        """Rank the history's calls for the next season and mark which fit this pass"""
+        now = now or datetime.now()
+        season, start = (season, season_start(season, now)) if season else next_season(now, self.seasons)
+        months = SEASONS[season]
+
+        groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        since = now - timedelta(days=365 * self.lookback_years)
+        for artifact in self.history.query(since=since, newest_first=False):
+            group = groups.setdefault((artifact.method, json.dumps(artifact.args, sort_keys=True)),
+                                      {"args": artifact.args, "season": 0, "other": 0, "tokens": []})
+            created = datetime.fromtimestamp(artifact.created_at)
+            group["season" if created.month in months else "other"] += 1
+            if not artifact.cache_hit and any(artifact.usage.values()):
+                group["tokens"].append(sum(artifact.usage.values()))
+
+        candidates = []
+        for (method, _), group in groups.items():
+            if group["season"] + group["other"] < self.min_requests:
+                continue
+            args = _decode_args(self.agent, method, group["args"])
+            if args is None:
+                continue
+            # A preview: only calls warm() actually sends count as routing decisions
+            prepared = self.agent.prepare(method, (), args, record=False)
+            request = self.agent._build_request(prepared.prompt, prepared.max_tokens, model=prepared.model)
+            tokens = (sum(group["tokens"]) // len(group["tokens"]) if group["tokens"]
+                      else estimate_tokens(request))
+            score = group["season"] + self.off_season_weight * group["other"]
+            candidates.append(WarmCandidate(method, args, group["season"], group["other"], score, tokens,
+                                            make_cache_key(request)))
+        candidates.sort(key=lambda candidate: (-candidate.score, candidate.tokens))
+
+        with self._lock:
+            spent = self._spent[(season, start.year)]
+        report = WarmReport(season, start, self.budget_tokens, candidates=candidates)
+        remaining = self.budget_tokens - spent
+        cache = self.agent.cache
+        for candidate in candidates:
+            expires = cache.expires_at(candidate.key)
+            if expires is not None and expires >= start.timestamp():
+                candidate.status = "cached"
+            elif now.timestamp() + cache.ttl_for(candidate.method) < start.timestamp():
+                candidate.status = "expires_early"
+            elif candidate.tokens > remaining:
+                candidate.status = "over_budget"
+            else:
+                remaining -= candidate.tokens
+        return report
+
+    def warm(self, season: Optional[str] = None, now: Optional[datetime] = None) -> WarmReport:
+        """Run one pass: generate the planned calls into the cache"""
+        report = self.plan(season, now)
+        pending = [candidate for candidate in report.candidates if candidate.status == "pending"]
+        # A copy keeps its own last_call, so each candidate is charged for its own call
+        worker = copy.copy(self.agent)
+        worker.cache = RefreshingCache(self.agent.cache)
+        if self.use_batches:
+            runner = BatchRunner(worker)
+            for candidate in pending:
+                runner.add(candidate.method, **candidate.args)
+            for candidate, result in zip(pending, runner.run()):
+                self._finish(report, candidate, result.error, sum(result.usage.values()))
+        else:
+            for candidate in pending:
+                worker.last_call = None
+                try:
+                    worker.generate(candidate.method, **candidate.args)
+                except Exception as exc:
+                    self._finish(report, candidate, f"{type(exc).__name__}: {exc}", 0)
+                    continue
+                self._finish(report, candidate, None, worker.last_call.tokens if worker.last_call else 0)
+        return report
+
+    def _finish(self, report: WarmReport, candidate: WarmCandidate, error: Optional[str], tokens: int):
+        candidate.status = "warmed" if error is None else "error"
+        if error is not None:
+            report.errors[candidate.key] = error
+        report.tokens_used += tokens
+        with self._lock:
+            self._spent[(report.season, report.season_start.year)] += tokens
+
+    def due(self, now: datetime, off_peak_hours: Sequence[int], lead_days: int) -> bool:
+        """Whether now is off-peak and within lead_days of one of the seasons"""
+        _, start = next_season(now, self.seasons)
+        return now.hour in off_peak_hours and start - now <= timedelta(days=lead_days)
+
+    def start(self, interval: float = 15 * 60, off_peak_hours: Sequence[int] = DEFAULT_OFF_PEAK_HOURS,
+              lead_days: int = 14) -> "Prewarmer":
+        """Check every interval seconds on a background thread and warm when due"""
+        if self._thread is not None:
+            return self
+
+        def loop():
+            while not self._stop.wait(interval):
+                if self.due(datetime.now(), off_peak_hours, lead_days):
+                    try:
+                        self.warm()
+                    except Exception:
+                        pass  # a failed pass is retried at the next check
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="prewarm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    """Command-line entry point for planning and running a pre-warm pass"""
+    from advanced_agent import AdvancedMarketingAgent
+    from cache import DEFAULT_CACHE_PATH, ResponseCache
+
+    parser = argparse.ArgumentParser(description="Pre-warm the response cache for the coming season")
+    parser.add_argument("--history", default=DEFAULT_ARTIFACTS_PATH, help="artifact store to rank requests from")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--season", choices=list(SEASONS), help="default: the next peak season")
+    parser.add_argument("--budget", type=int, default=500_000, help="tokens to spend on the season")
+    parser.add_argument("--batches", action="store_true", help="warm through Message Batches")
+    parser.add_argument("--plan", action="store_true", help="only print the ranked plan")
+    args = parser.parse_args()
+
+    agent = AdvancedMarketingAgent(cache=ResponseCache(args.cache_path), priority=BULK)
+    prewarmer = Prewarmer(agent, ArtifactStore(args.history), budget_tokens=args.budget, use_batches=args.batches)
+    report = prewarmer.plan(args.season) if args.plan else prewarmer.warm(args.season)
+    print(f"{report.season} starts {report.season_start.date()}; budget {report.budget_tokens} tokens")
+    for candidate in report.candidates:
+        print(f"{candidate.status:<14}{candidate.score:>7.2f}{candidate.tokens:>8}  {candidate.method} "
+              f"{json.dumps(candidate.args, default=repr)[:80]}")
+    if not args.plan:
+        print(f"Warmed {report.count('warmed')} calls with {report.tokens_used} tokens; "
+              f"{len(report.errors)} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Client-side rate limiting for the Car Detailer Marketing Agent
+Token buckets for requests and tokens per minute, priority lanes, and
+jittered exponential backoff that honors retry-after
+"""
+
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from hedging import time_left
+
+
+# Priority lanes: lower values are served first
+INTERACTIVE = 0
+BULK = 10
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504, 529}
+
+# Rough characters-per-token ratio used to estimate prompt size before sending
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(request: Dict[str, Any]) -> int:
+    """Estimate the tokens a messages.create request will consume: prompt plus max_tokens"""
+    prompt = json.dumps([request.get("system", ""), request["messages"]], ensure_ascii=False)
+    return len(prompt) // CHARS_PER_TOKEN + request["max_tokens"]
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Read the retry-after header from an API error, if it has one"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Return whether an API error is a rate limit or transient overload"""
+    return getattr(exc, "status_code", None) in RETRYABLE_STATUS
+
+
+def _attempt_options(deadline: Optional[float]) -> Dict[str, float]:
+    """Per-attempt request options: a timeout of whatever is left of the deadline"""
+    return {} if deadline is None else {"timeout": time_left(deadline)}
+
+
+def _capped(wait: Optional[float], deadline: Optional[float]) -> Optional[float]:
+    """wait, cut short at the deadline; raises DeadlineExceeded once it has passed"""
+    left = time_left(deadline)
+    if left is None:
+        return wait
+    return left if wait is None else min(wait, left)
+
+
+def stream_usage(stream) -> Any:
+    """Usage so far of an open message stream, or None before its first event
+
+    Output tokens are only reported when a stream completes, so for one cut
+    short they are estimated from the text received.
+    """
+    try:
+        message = stream.current_message_snapshot
+    except Exception:
+        return None
+    if message.stop_reason is not None:
+        return message.usage
+    received = sum(len(getattr(block, "text", "") or getattr(block, "partial_json", "") or "")
+                   for block in message.content)
+    usage = message.usage.model_copy()
+    usage.output_tokens = max(usage.output_tokens or 0, received // CHARS_PER_TOKEN)
+    return usage
+
+
+class TokenBucket:
+    """Refills continuously at capacity per minute"""
+
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until amount is available, 0 if it is available now"""
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+@dataclass(order=True)
+class _Ticket:
+    priority: int
+    sequence: int
+    tokens: int = field(compare=False)
+
+
+class RequestScheduler:
+    """
+    Shared gate in front of messages.create
+    Callers queue by priority; the head of the queue proceeds once both the
+    request and token buckets can cover it. Share one scheduler between every
+    agent in a process so they draw from the same account limits.
+    """
+
+    def __init__(self, requests_per_minute: int = 50, tokens_per_minute: int = 80_000,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        now = clock()
+        self.requests = TokenBucket(requests_per_minute, now)
+        self.tokens = TokenBucket(tokens_per_minute, now)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+
+        self.retries = 0
+        self.throttled = 0
+        self._paused_until = 0.0
+        self._queue = []
+        self._sequence = itertools.count()
+        self._lock = threading.Condition()
+        self._async_waiters: List[Tuple[Any, Any]] = []  # (event loop, asyncio.Event)
+
+    def _enqueue(self, tokens: int, priority: int) -> _Ticket:
+        ticket = _Ticket(priority, next(self._sequence), min(tokens, int(self.tokens.capacity)))
+        with self._lock:
+            heapq.heappush(self._queue, ticket)
+            self._notify()
+        return ticket
+
+    def _notify(self):
+        """Wake every waiter, threads and asyncio tasks alike; called with the lock held"""
+        self._lock.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _poll(self, ticket: _Ticket) -> Optional[float]:
+        """Take capacity for ticket if it is at the head of the queue
+
+        Returns 0 once taken, seconds to wait for the buckets or a pause, or
+        None when another ticket is ahead (wait to be notified). Called with
+        the lock held.
+        """
+        now = self.clock()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._queue[0] is not ticket:
+            return None
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(self.requests.wait_for(1), self.tokens.wait_for(ticket.tokens))
+        if wait > 0:
+            return wait
+        self.requests.level -= 1
+        self.tokens.level -= ticket.tokens
+        heapq.heappop(self._queue)
+        self._notify()
+        return 0.0
+
+    def _abandon(self, ticket: _Ticket):
+        """Drop a ticket whose caller stopped waiting, so it does not block the queue"""
+        with self._lock:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._notify()
+
+    def acquire(self, tokens: int, priority: int = INTERACTIVE, deadline: Optional[float] = None):
+        """Block until a request of the given token estimate may be sent
+
+        Raises DeadlineExceeded if the deadline passes first.
+        """
+        ticket = self._enqueue(tokens, priority)
+        try:
+            with self._lock:
+                while True:
+                    wait = self._poll(ticket)
+                    if wait == 0:
+                        return
+                    self._lock.wait(timeout=_capped(wait, deadline))
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    async def acquire_async(self, tokens: int, priority: int = INTERACTIVE, deadline: Optional[float] = None):
+        """Await until a request of the given token estimate may be sent, or DeadlineExceeded"""
+        import asyncio  # Deferred: only async callers should pay for importing asyncio
+
+        loop = asyncio.get_running_loop()
+        ticket = self._enqueue(tokens, priority)
+        try:
+            while True:
+                waiter = (loop, asyncio.Event())
+                with self._lock:
+                    wait = self._poll(ticket)
+                    if wait == 0:
+                        return
+                    wait = _capped(wait, deadline)
+                    # Registered under the lock, so a notification cannot slip in unseen
+                    self._async_waiters.append(waiter)
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self._lock:
+                        self._async_waiters.remove(waiter)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    def settle(self, estimated: int, usage):
+        """Correct the token bucket by the estimate's error once real usage is known
+
+        Over-estimates are returned; under-estimates are debited, which can
+        take the bucket below zero so later requests wait for the overdraft.
+        """
+        if usage is None:
+            return
+        actual = (getattr(usage, "input_tokens", 0) or 0) + (getattr(usage, "output_tokens", 0) or 0)
+        with self._lock:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated - actual)
+            self._notify()
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        """Jittered exponential delay; a retry-after header pauses every lane"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = retry_after_seconds(exc)
+        with self._lock:
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+                self._paused_until = max(self._paused_until, self.clock() + retry_after)
+            self.retries += 1
+            if getattr(exc, "status_code", None) == 429:
+                self.throttled += 1
+        return delay
+
+    def call(self, send: Callable[..., Any], request: Dict[str, Any], priority: int = INTERACTIVE,
+             on_retry: Optional[Callable[[], None]] = None, deadline: Optional[float] = None):
+        """Send request through the scheduler, retrying rate limits and overloads
+
+        With a deadline (an absolute time.monotonic() value), queueing and
+        backoff stop at it with DeadlineExceeded, and each attempt is sent
+        with the time left as its timeout.
+        """
+        estimated = estimate_tokens(request)
+        for attempt in range(self.max_retries + 1):
+            self.acquire(estimated, priority, deadline)
+            try:
+                response = send(**request, **_attempt_options(deadline))
+            except Exception as exc:
+                if not is_retryable(exc) or attempt == self.max_retries:
+                    raise
+                if on_retry is not None:
+                    on_retry()
+                time.sleep(_capped(self._backoff(attempt, exc), deadline))
+                continue
+            self.settle(estimated, getattr(response, "usage", None))
+            return response
+
+    async def call_async(self, send: Callable[..., Any], request: Dict[str, Any], priority: int = INTERACTIVE,
+                         on_retry: Optional[Callable[[], None]] = None, deadline: Optional[float] = None):
+        """Await request through the scheduler, retrying rate limits and overloads"""
+        import asyncio
+
+        estimated = estimate_tokens(request)
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async(estimated, priority, deadline)
+            try:
+                response = await send(**request, **_attempt_options(deadline))
+            except Exception as exc:
+                if not is_retryable(exc) or attempt == self.max_retries:
+                    raise
+                if on_retry is not None:
+                    on_retry()
+                await asyncio.sleep(_capped(self._backoff(attempt, exc), deadline))
+                continue
+            self.settle(estimated, getattr(response, "usage", None))
+            return response
+
+    @contextmanager
+    def stream(self, open_stream: Callable[..., Any], request: Dict[str, Any], priority: int = INTERACTIVE,
+               on_retry: Optional[Callable[[], None]] = None, deadline: Optional[float] = None) -> Iterator[Any]:
+        """Open a message stream through the scheduler, retrying rate limits and overloads
+
+        open_stream(**request) returns the SDK's stream manager, which sends
+        the request when it is entered. Tokens are settled from the stream's
+        usage when the block exits, however far it was read. A deadline
+        applies as in call.
+        """
+        estimated = estimate_tokens(request)
+        for attempt in range(self.max_retries + 1):
+            self.acquire(estimated, priority, deadline)
+            stack = ExitStack()
+            try:
+                stream = stack.enter_context(open_stream(**request, **_attempt_options(deadline)))
+            except Exception as exc:
+                if not is_retryable(exc) or attempt == self.max_retries:
+                    raise
+                if on_retry is not None:
+                    on_retry()
+                time.sleep(_capped(self._backoff(attempt, exc), deadline))
+                continue
+            with stack:
+                try:
+                    yield stream
+                finally:
+                    self.settle(estimated, stream_usage(stream))
+            return
+
+    @asynccontextmanager
+    async def stream_async(self, open_stream: Callable[..., Any], request: Dict[str, Any],
+                           priority: int = INTERACTIVE,
+                           on_retry: Optional[Callable[[], None]] = None,
+                           deadline: Optional[float] = None) -> AsyncIterator[Any]:
+        """stream for the async SDK client"""
+        import asyncio
+
+        estimated = estimate_tokens(request)
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async(estimated, priority, deadline)
+            stack = AsyncExitStack()
+            try:
+                stream = await stack.enter_async_context(open_stream(**request, **_attempt_options(deadline)))
+            except Exception as exc:
+                if not is_retryable(exc) or attempt == self.max_retries:
+                    raise
+                if on_retry is not None:
+                    on_retry()
+                await asyncio.sleep(_capped(self._backoff(attempt, exc), deadline))
+                continue
+            async with stack:
+                try:
+                    yield stream
+                finally:
+                    self.settle(estimated, stream_usage(stream))
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        """Return retry counters and current bucket levels"""
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "queued": len(self._queue),
+                "request_budget": round(self.requests.level, 2),
+                "token_budget": round(self.tokens.level, 2),
+            }
@@ -0,0 +1,429 @@
+"""
+Staleness-driven refresh planning for the Car Detailer Marketing Agent
+Keeps every client deliverable in a priority queue scored by artifact age,
+BusinessMetrics drift, config changes and client tier, and regenerates the
+most valuable ones within a daily token or cost budget
+"""
+
+import argparse
+import csv
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from artifacts import DEFAULT_ARTIFACTS_PATH, ArtifactStore
+from bulk import JOBS, parse_record
+from cache import DAY, DEFAULT_METHOD_TTLS, RefreshingCache
+from config import BusinessMetrics, MarketingConfig
+from main import USAGE_FIELDS, CarDetailerMarketingAgent
+from telemetry import estimate_cost
+
+
+TIER_WEIGHTS: Dict[str, float] = {"enterprise": 3.0, "premium": 2.0, "standard": 1.0, "basic": 0.5}
+
+# Generator behind each bulk job, for its TTL and its artifacts
+JOB_METHODS: Dict[str, str] = {
+    "marketing_strategy": "generate_marketing_strategy",
+    "social_media_content": "create_social_media_content",
+    "email_campaign": "generate_email_campaign",
+    "referral_program": "generate_referral_program",
+    "pricing_strategy": "generate_pricing_strategy",
+    "local_seo_strategy": "generate_local_seo_strategy",
+    "retention_marketing_strategy": "create_retention_marketing_strategy",
+}
+
+# Assumed usage of a deliverable that has never been generated
+DEFAULT_USAGE = {"input_tokens": 1500, "output_tokens": 2500}
+
+CONFIG_FIELDS = ("business_type", "service_area", "monthly_budget", "channels", "goals",
+                 "unique_selling_points", "target_demographics")
+
+_METRIC_FIELDS = tuple(metric.name for metric in fields(BusinessMetrics))
+
+
+def metrics_change(old: Optional[BusinessMetrics], new: Optional[BusinessMetrics]) -> float:
+    """Largest relative change of any metric, capped at 1; 1 when metrics appear or disappear"""
+    if old is None or new is None:
+        return 0.0 if old is new else 1.0
+    largest = 0.0
+    for name in _METRIC_FIELDS:
+        before, after = float(getattr(old, name)), float(getattr(new, name))
+        if after != before:
+            largest = max(largest, min(1.0, abs(after - before) / max(abs(before), 1e-9)))
+    return largest
+
+
+def config_change(old: MarketingConfig, new: MarketingConfig) -> float:
+    """Number of config fields that differ, capped at 1; the budget counts by its relative change"""
+    changed = 0.0
+    for name in CONFIG_FIELDS:
+        before, after = getattr(old, name), getattr(new, name)
+        if name == "monthly_budget":
+            changed += min(1.0, abs(after - before) / max(abs(before), 1.0))
+        elif name == "channels":
+            changed += float(asdict(before) != asdict(after))
+        else:
+            changed += float(before != after)
+    return min(1.0, changed)
+
+
+@dataclass
+class RefreshItem:
+    """One deliverable for one client, with what it was generated from"""
+    client: str
+    job: str
+    tier: str
+    config: MarketingConfig  # current
+    snapshot: Optional[MarketingConfig] = None  # as of the last generation
+    generated_at: float = 0.0  # 0 when never generated
+    usage: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_USAGE))
+    metrics_change: float = 0.0
+    config_change: float = 0.0
+    version: int = 0
+    running: bool = False
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.client, self.job
+
+    @property
+    def tokens(self) -> int:
+        return sum(self.usage.values())
+
+
+@dataclass
+class RefreshReport:
+    """What one refresh run selected and did"""
+    selected: List[Tuple[str, str]] = field(default_factory=list)  # (client, job)
+    scores: Dict[Tuple[str, str], float] = field(default_factory=dict)
+    completed: int = 0
+    outputs: Dict[Tuple[str, str], str] = field(default_factory=dict)  # regenerated text
+    errors: Dict[Tuple[str, str], str] = field(default_factory=dict)
+    tokens: int = 0
+    cost_usd: float = 0.0
+
+
+class RefreshPlanner:
+    """
+    Priority queue of client deliverables, ordered by how much a refresh is worth
+
+    score = tier weight * (age_weight * age / TTL + metrics_weight * metrics
+    change + config_weight * config change), where age is the time since the
+    deliverable was generated and TTL is its generator's cache TTL. With
+    nothing changed, a standard-tier deliverable reaches min_score at its TTL;
+    drift and config edits bring it forward.
+
+    Deliverables sharing a tier and TTL gain age score at the same rate, so
+    each such group is a heap ordered by a time-independent key and only
+    the group heads are compared at selection time. update() and record()
+    re-score one client in place; nothing rescans the portfolio.
+    """
+
+    def __init__(self, jobs: Iterable[str] = ("marketing_strategy",), age_weight: float = 1.0,
+                 metrics_weight: float = 2.0, config_weight: float = 3.0, min_score: float = 1.0,
+                 tier_weights: Optional[Dict[str, float]] = None, model: str = "claude-3-5-sonnet-20241022",
+                 history: Optional[ArtifactStore] = None):
+        self.jobs = tuple(jobs)
+        unknown = [job for job in self.jobs if job not in JOBS]
+        if unknown:
+            raise ValueError(f"Unknown jobs: {', '.join(unknown)}")
+        self.age_weight = age_weight
+        self.metrics_weight = metrics_weight
+        self.config_weight = config_weight
+        self.min_score = min_score
+        self.tier_weights = {**TIER_WEIGHTS, **(tier_weights or {})}
+        self.model = model
+        self.history = history
+        self.items: Dict[Tuple[str, str], RefreshItem] = {}
+        self._groups: Dict[Tuple[float, float], List[Tuple[float, int, Tuple[str, str], int]]] = {}
+        self._entries = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def ttl(self, job: str) -> float:
+        return DEFAULT_METHOD_TTLS.get(JOB_METHODS.get(job, ""), 30 * DAY)
+
+    def _rate(self, item: RefreshItem) -> Tuple[float, float]:
+        """(tier weight, TTL): the group whose members gain score at the same rate"""
+        return self.tier_weights.get(item.tier, 1.0), self.ttl(item.job)
+
+    def _base(self, item: RefreshItem) -> float:
+        """Score at time 0; score(now) = base + tier * age_weight * now / TTL"""
+        tier, ttl = self._rate(item)
+        return tier * (self.metrics_weight * item.metrics_change + self.config_weight * item.config_change
+                       - self.age_weight * item.generated_at / ttl)
+
+    def score(self, item: RefreshItem, now: Optional[float] = None) -> float:
+        tier, ttl = self._rate(item)
+        return self._base(item) + tier * self.age_weight * (time.time() if now is None else now) / ttl
+
+    def cost(self, item: RefreshItem) -> float:
+        return estimate_cost(self.model, **item.usage)
+
+    def _push(self, item: RefreshItem):
+        """Queue the item's current version; called with the lock held"""
+        item.version += 1
+        heapq.heappush(self._groups.setdefault(self._rate(item), []),
+                       (-self._base(item), next(self._seq), item.key, item.version))
+        self._entries += 1
+        if self._entries > 2 * len(self.items) + 1024:
+            self._compact()
+
+    def _compact(self):
+        """Drop superseded heap entries once they outnumber live ones"""
+        groups: Dict[Tuple[float, float], List] = {}
+        for item in self.items.values():
+            if not item.running:
+                groups.setdefault(self._rate(item), []).append(
+                    (-self._base(item), next(self._seq), item.key, item.version))
+        for heap in groups.values():
+            heapq.heapify(heap)
+        self._groups = groups
+        self._entries = sum(len(heap) for heap in groups.values())
+
+    def _live_head(self, heap: List) -> Optional[RefreshItem]:
+        while heap:
+            _, _, key, version = heap[0]
+            item = self.items.get(key)
+            if item is not None and item.version == version and not item.running:
+                return item
+            heapq.heappop(heap)
+            self._entries -= 1
+        return None
+
+    def update(self, config: MarketingConfig, tier: Optional[str] = None):
+        """Add a client or re-score its deliverables against the config they were generated from"""
+        with self._lock:
+            for job in self.jobs:
+                item = self.items.get((config.business_name, job))
+                if item is None:
+                    item = RefreshItem(config.business_name, job, tier or "standard", config)
+                    self._seed(item)
+                    self.items[item.key] = item
+                else:
+                    snapshot = item.snapshot or config
+                    changes = (metrics_change(snapshot.metrics, config.metrics), config_change(snapshot, config))
+                    unchanged = changes == (item.metrics_change, item.config_change) and tier in (None, item.tier)
+                    item.config, item.tier = config, tier or item.tier
+                    if unchanged:
+                        continue  # its queued entry is still current
+                    item.metrics_change, item.config_change = changes
+                if not item.running:
+                    self._push(item)
+
+    def _seed(self, item: RefreshItem):
+        """Take a new item's last generation from history, if it has one"""
+        if self.history is None:
+            return
+        latest = self.history.latest(item.client, JOB_METHODS[item.job])
+        if latest is not None:
+            item.generated_at = latest.created_at
+            item.snapshot = item.config
+            if any(latest.usage.values()):
+                item.usage = {name: value for name, value in latest.usage.items() if value}
+
+    def remove(self, client: str):
+        with self._lock:
+            for job in self.jobs:
+                self.items.pop((client, job), None)
+
+    def record(self, client: str, job: str, usage: Optional[Dict[str, int]] = None,
+               generated_at: Optional[float] = None):
+        """Note that a deliverable was regenerated from its current config"""
+        with self._lock:
+            item = self.items[(client, job)]
+            item.snapshot = item.config
+            item.generated_at = time.time() if generated_at is None else generated_at
+            item.metrics_change = item.config_change = 0.0
+            if usage and any(usage.values()):
+                item.usage = {name: value for name, value in usage.items() if value}
+            item.running = False
+            self._push(item)
+
+    def release(self, client: str, job: str):
+        """Return a selected deliverable to the queue without regenerating it"""
+        with self._lock:
+            item = self.items[(client, job)]
+            if item.running:
+                item.running = False
+                self._push(item)
+
+    def select(self, budget_tokens: Optional[int] = None, budget_usd: Optional[float] = None,
+               now: Optional[float] = None, pool_factor: float = 2.0) -> List[Tuple[RefreshItem, float]]:
+        """Pick the deliverables to regenerate within a budget, as (item, score)
+
+        Candidates are taken from the top of the queue until their cost is
+        pool_factor times the budget, then chosen by score per unit of cost.
+        Chosen items leave the queue until record() or release(); the rest
+        go back.
+        """
+        if budget_tokens is None and budget_usd is None:
+            raise ValueError("Give a token or cost budget")
+        now = time.time() if now is None else now
+        spend = (lambda item: item.tokens) if budget_usd is None else self.cost
+        budget = budget_tokens if budget_usd is None else budget_usd
+
+        with self._lock:
+            pool: List[Tuple[RefreshItem, float]] = []
+            pooled = 0.0
+            while pooled < budget * pool_factor:
+                best, best_score = None, self.min_score
+                for heap in self._groups.values():
+                    item = self._live_head(heap)
+                    if item is not None and self.score(item, now) >= best_score:
+                        best, best_score = item, self.score(item, now)
+                if best is None:
+                    break
+                heapq.heappop(self._groups[self._rate(best)])
+                self._entries -= 1
+                best.running = True
+                pool.append((best, best_score))
+                pooled += spend(best)
+
+            chosen, remaining = [], budget
+            for item, score in sorted(pool, key=lambda entry: -entry[1] / max(spend(entry[0]), 1e-9)):
+                if spend(item) <= remaining:
+                    chosen.append((item, score))
+                    remaining -= spend(item)
+                else:
+                    item.running = False
+                    self._push(item)
+        return sorted(chosen, key=lambda entry: -entry[1])
+
+    def save(self, path: str):
+        """Write the planner's items to a JSON file"""
+        with self._lock:
+            state = [{"client": item.client, "job": item.job, "tier": item.tier, "config": asdict(item.config),
+                      "snapshot": asdict(item.snapshot) if item.snapshot else None,
+                      "generated_at": item.generated_at, "usage": item.usage}
+                     for item in self.items.values()]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(state, handle)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        """Restore items written by save() and re-score them"""
+        with open(path, encoding="utf-8") as handle:
+            state = json.load(handle)
+        with self._lock:
+            for entry in state:
+                if entry["job"] not in self.jobs:
+                    continue
+                config = parse_record(entry["config"])
+                snapshot = parse_record(entry["snapshot"]) if entry["snapshot"] else None
+                item = RefreshItem(entry["client"], entry["job"], entry["tier"], config, snapshot,
+                                   entry["generated_at"], entry["usage"])
+                if snapshot is not None:
+                    item.metrics_change = metrics_change(snapshot.metrics, config.metrics)
+                    item.config_change = config_change(snapshot, config)
+                self.items[item.key] = item
+                self._push(item)
+
+
+def refresh(planner: RefreshPlanner, agent: CarDetailerMarketingAgent, budget_tokens: Optional[int] = None,
+            budget_usd: Optional[float] = None, max_workers: int = 4) -> RefreshReport:
+    """Regenerate the planner's best deliverables within the budget and record them
+
+    Refreshes skip the response cache lookup (the cached text is what is being
+    replaced) and store the new output in its place. Outputs are returned in
+    the report and, when the agent has an artifact store, saved under their
+    client.
+    """
+    selected = planner.select(budget_tokens, budget_usd)
+    report = RefreshReport(selected=[item.key for item, _ in selected],
+                           scores={item.key: score for item, score in selected})
+    agent.client  # build the SDK client once, so every worker shares it
+    lock = threading.Lock()
+
+    def run(item: RefreshItem):
+        # Each worker counts its own usage, so usage is per deliverable; it is added to the agent's below
+        worker = agent.for_client(item.client)
+        worker.usage = dict.fromkeys(USAGE_FIELDS, 0)
+        if worker.cache is not None:
+            worker.cache = RefreshingCache(agent.cache)
+        try:
+            text = JOBS[item.job](worker, item.config)
+        except Exception as exc:
+            planner.release(item.client, item.job)
+            with lock:
+                report.errors[item.key] = f"{type(exc).__name__}: {exc}"
+            return
+        finally:
+            with agent._usage_lock:
+                for name, value in worker.usage.items():
+                    agent.usage[name] += value
+        usage = dict(worker.usage)
+        planner.record(item.client, item.job, usage)
+        with lock:
+            report.outputs[item.key] = text
+            report.completed += 1
+            report.tokens += sum(usage.values())
+            report.cost_usd += estimate_cost(worker.model, **usage)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(run, [item for item, _ in selected]))
+    return report
+
+
+def _read_rows(path: str) -> Iterable[Dict[str, Any]]:
+    with open(path, newline="", encoding="utf-8") as handle:
+        rows = csv.DictReader(handle) if path.lower().endswith(".csv") else (
+            json.loads(line) for line in handle if line.strip())
+        yield from rows
+
+
+def main():
+    """Command-line entry point for a daily refresh run"""
+    from advanced_agent import AdvancedMarketingAgent
+    from cache import DEFAULT_CACHE_PATH, ResponseCache
+    from ratelimit import BULK
+
+    parser = argparse.ArgumentParser(description="Regenerate the stalest client deliverables within a budget")
+    parser.add_argument("input", help="CSV or JSONL of MarketingConfig records; an optional tier column")
+    parser.add_argument("--state", default="refresh_state.json", help="planner state kept between runs")
+    parser.add_argument("--jobs", default="marketing_strategy", help=f"comma-separated from: {', '.join(JOBS)}")
+    budget = parser.add_mutually_exclusive_group(required=True)
+    budget.add_argument("--budget-tokens", type=int)
+    budget.add_argument("--budget-usd", type=float)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--artifacts", default=DEFAULT_ARTIFACTS_PATH, help="artifact store outputs are saved to")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH, help="response cache outputs replace")
+    parser.add_argument("--history", help="artifact store new clients' last generation is read from "
+                                          "(default: --artifacts)")
+    parser.add_argument("--plan", action="store_true", help="only print what would be regenerated")
+    args = parser.parse_args()
+
+    artifacts = ArtifactStore(args.artifacts)
+    history = artifacts if args.history in (None, args.artifacts) else ArtifactStore(args.history)
+    planner = RefreshPlanner(jobs=[job.strip() for job in args.jobs.split(",") if job.strip()], history=history)
+    if os.path.exists(args.state):
+        planner.load(args.state)
+    for row in _read_rows(args.input):
+        record = parse_record(row)
+        if isinstance(record, MarketingConfig):
+            planner.update(record, row.get("tier") or None)
+
+    if args.plan:
+        for item, score in planner.select(args.budget_tokens, args.budget_usd):
+            print(f"{score:>8.2f}  {item.tier:<10}  {item.job:<28}  {item.client}")
+        return
+
+    agent = AdvancedMarketingAgent(cache=ResponseCache(args.cache_path), artifacts=artifacts, priority=BULK)
+    report = refresh(planner, agent, args.budget_tokens, args.budget_usd, args.workers)
+    planner.save(args.state)
+    print(f"Regenerated {report.completed} of {len(report.selected)} selected deliverables "
+          f"({report.tokens} tokens, ${report.cost_usd:.2f}); {len(report.errors)} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+"""
+Generator registry for the Car Detailer Marketing Agent
+Every generator is declared once here: name, parameter schema, prompt template
+and max_tokens. Templates are whitespace-normalized and parsed at import time.
+"""
+
+import string
+import textwrap
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+REQUIRED = object()
+
+# JSON schema for each parameter kind; "client" is a DetailingClient and
+# "figures" maps labels to numbers computed outside the model (see analytics.py)
+PARAM_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "str": {"type": "string"},
+    "figures": {"type": "object", "additionalProperties": {"type": "number"}},
+    "int": {"type": "integer"},
+    "float": {"type": "number"},
+    "list[str]": {"type": "array", "items": {"type": "string"}},
+    "client": {
+        "type": "object",
+        "properties": {
+            "name": {"type": "string"},
+            "email": {"type": "string"},
+            "phone": {"type": "string"},
+            "business_type": {"type": "string"},
+            "service_area": {"type": "string"},
+            "monthly_budget": {"type": "number"},
+            "goals": {"type": "array", "items": {"type": "string"}},
+        },
+        "required": ["name", "business_type", "service_area", "monthly_budget", "goals"],
+    },
+}
+
+
+def normalize_whitespace(text: str) -> str:
+    """Dedent, strip trailing spaces and collapse runs of blank lines"""
+    lines = [line.rstrip() for line in textwrap.dedent(text).strip().splitlines()]
+    normalized = []
+    for line in lines:
+        if line or (normalized and normalized[-1]):
+            normalized.append(line)
+    return "\n".join(normalized)
+
+
+FIGURES_HEADER = "Use these figures, computed from the business's own metrics, as given instead of estimating them:"
+
+
+def _format_number(value: float) -> str:
+    return f"{value:,.2f}".rstrip("0").rstrip(".")
+
+
+class _PromptFormatter(string.Formatter):
+    """Joins list values with commas, as the prompts always have
+
+    The "figures" format spec renders a dict of computed figures as a block
+    after its line, or nothing when there are none.
+    """
+
+    def format_field(self, value: Any, format_spec: str) -> str:
+        if format_spec == "figures":
+            if not value:
+                return ""
+            lines = "\n".join(f"- {label}: {_format_number(number)}" for label, number in value.items())
+            return f"\n\n{FIGURES_HEADER}\n{lines}"
+        if isinstance(value, (list, tuple)):
+            return ", ".join(str(item) for item in value)
+        return format(value, format_spec)
+
+
+_FORMATTER = _PromptFormatter()
+
+
+class PromptTemplate:
+    """
+    A prompt in str.format syntax, normalized and parsed once
+    Rendering walks the pre-parsed segments instead of re-parsing the text
+    """
+
+    def __init__(self, text: str):
+        self.text = normalize_whitespace(text)
+        self._segments: List[Tuple[str, Optional[str], str, Optional[str]]] = list(_FORMATTER.parse(self.text))
+        self.fields = sorted({field.split(".")[0].split("[")[0] for _, field, _, _ in self._segments if field})
+
+    def render(self, values: Dict[str, Any]) -> str:
+        parts = []
+        for literal, field, format_spec, conversion in self._segments:
+            parts.append(literal)
+            if field is not None:
+                value, _ = _FORMATTER.get_field(field, (), values)
+                value = _FORMATTER.convert_field(value, conversion)
+                parts.append(_FORMATTER.format_field(value, format_spec))
+        return "".join(parts)
+
+
+@dataclass(frozen=True)
+class Param:
+    """One generator argument: name, kind (a PARAM_SCHEMAS key) and optional default"""
+    name: str
+    kind: str
+    default: Any = REQUIRED
+
+    @property
+    def required(self) -> bool:
+        return self.default is REQUIRED
+
+
+@dataclass(frozen=True)
+class GeneratorSpec:
+    """Declarative description of one generator"""
+    name: str
+    stream_name: str
+    tier: str  # core generators live on every agent, advanced on AdvancedMarketingAgent
+    params: Tuple[Param, ...]
+    max_tokens: int
+    template: PromptTemplate
+
+    def bind(self, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Map positional and keyword arguments onto the parameter schema"""
+        if len(args) > len(self.params):
+            raise TypeError(f"{self.name}() takes {len(self.params)} arguments but {len(args)} were given")
+        values = {param.name: value for param, value in zip(self.params, args)}
+        for name, value in kwargs.items():
+            if name in values:
+                raise TypeError(f"{self.name}() got multiple values for argument '{name}'")
+            if name not in self.param_names:
+                raise TypeError(f"{self.name}() got an unexpected keyword argument '{name}'")
+            values[name] = value
+        for param in self.params:
+            if param.name not in values:
+                if param.required:
+                    raise TypeError(f"{self.name}() missing required argument '{param.name}'")
+                values[param.name] = param.default
+        return values
+
+    def render(self, *args, **kwargs) -> str:
+        """Render the prompt for a call"""
+        return self.template.render(self.bind(args, kwargs))
+
+    @property
+    def param_names(self) -> Tuple[str, ...]:
+        return tuple(param.name for param in self.params)
+
+    def schema(self) -> Dict[str, Any]:
+        """JSON schema describing this generator's arguments"""
+        properties = {}
+        for param in self.params:
+            properties[param.name] = dict(PARAM_SCHEMAS[param.kind])
+            if not param.required:
+                properties[param.name]["default"] = param.default
+        return {
+            "type": "object",
+            "properties": properties,
+            "required": [param.name for param in self.params if param.required],
+        }
+
+
+GENERATOR_SPECS: Tuple[GeneratorSpec, ...] = (
+    GeneratorSpec(
+        name="generate_marketing_strategy",
+        stream_name="stream_marketing_strategy",
+        tier="core",
+        params=(Param("client", "client"),),
+        max_tokens=2000,
+        template=PromptTemplate("""
+        Please create a detailed, actionable marketing strategy for this car detailing business:
+
+        Business Name: {client.name}
+        Business Type: {client.business_type}
+        Service Area: {client.service_area}
+        Monthly Marketing Budget: ${client.monthly_budget}
+        Goals: {client.goals}
+
+        Provide:
+        1. Executive Summary
+        2. Target Audience Analysis
+        3. Recommended Marketing Channels (with expected ROI)
+        4. 90-Day Action Plan
+        5. Content Calendar (next 30 days)
+        6. Key Performance Indicators (KPIs)
+        7. Budget Allocation Strategy
+        8. Competitive Positioning
+        """),
+    ),
+    GeneratorSpec(
+        name="create_social_media_content",
+        stream_name="stream_social_media_content",
+        tier="core",
+        params=(Param("service_type", "str"), Param("num_posts", "int", 5)),
+        max_tokens=1500,
+        template=PromptTemplate("""
+        Create {num_posts} engaging social media posts for a car detailing business promoting {service_type}.
+
+        For each post, provide:
+        - Platform (Instagram, TikTok, Facebook)
+        - Caption (with relevant hashtags)
+        - Recommended visuals/video idea
+        - Best posting time
+        - Engagement strategy
+
+        Make content viral-worthy and conversion-focused.
+        """),
+    ),
+    GeneratorSpec(
+        name="generate_email_campaign",
+        stream_name="stream_email_campaign",
+        tier="core",
+        params=(Param("audience_segment", "str"), Param("campaign_type", "str")),
+        max_tokens=1800,
+        template=PromptTemplate("""
+        Create a 5-email marketing campaign for {audience_segment} focused on {campaign_type}.
+
+        Include:
+        1. Subject lines (A/B testing variants)
+        2. Email templates with copy
+        3. CTA strategies
+        4. Timing/frequency recommendations
+        5. Expected conversion rates
+        6. Personalization elements
+
+        Make it high-converting and value-focused.
+        """),
+    ),
+    GeneratorSpec(
+        name="analyze_competitor",
+        stream_name="stream_competitor_analysis",
+        tier="core",
+        params=(Param("competitor_name", "str"), Param("service_area", "str")),
+        max_tokens=1200,
+        template=PromptTemplate("""
+        Analyze the likely marketing strategy for a car detailing competitor:
+        Business: {competitor_name}
+        Service Area: {service_area}
+
+        Provide:
+        1. Estimated Marketing Channels
+        2. Likely Target Customer Profile
+        3. Probable Pricing Strategy
+        4. Competitive Advantages & Weaknesses
+        5. Differentiation Opportunities
+        6. Win-Back Strategies
+        """),
+    ),
+    GeneratorSpec(
+        name="generate_referral_program",
+        stream_name="stream_referral_program",
+        tier="core",
+        params=(Param("business_type", "str"), Param("service_level", "str")),
+        max_tokens=1400,
+        template=PromptTemplate("""
+        Design a high-performing referral program for a {business_type} car detailing business at {service_level} level.
+
+        Include:
+        1. Referral Incentive Structure
+        2. Program Rules & Terms
+        3. Marketing Materials Needed
+        4. Implementation Steps
+        5. Tracking Mechanisms
+        6. Expected Conversion Rates
+        7. Budget Requirements
+        8. Launch Strategy
+        """),
+    ),
+    GeneratorSpec(
+        name="generate_pricing_strategy",
+        stream_name="stream_pricing_strategy",
+        tier="core",
+        params=(Param("business_size", "str"), Param("market_position", "str"), Param("service_area", "str")),
+        max_tokens=1400,
+        template=PromptTemplate("""
+        Create a pricing and promotional strategy for a {business_size} car detailing business
+        positioned as {market_position} in the {service_area} market.
+
+        Provide:
+        1. Service Pricing Recommendations
+        2. Seasonal Promotions Calendar
+        3. Bundle Strategies
+        4. Dynamic Pricing Rules
+        5. Discount Strategy Framework
+        6. Psychological Pricing Tactics
+        7. Upsell Opportunities
+        8. Package Recommendations
+        """),
+    ),
+    GeneratorSpec(
+        name="generate_local_seo_strategy",
+        stream_name="stream_local_seo_strategy",
+        tier="advanced",
+        params=(Param("business_name", "str"), Param("service_area", "str"), Param("google_rating", "float")),
+        max_tokens=1600,
+        template=PromptTemplate("""
+        Create a detailed local SEO strategy for a car detailing business:
+
+        Business Name: {business_name}
+        Service Area: {service_area}
+        Current Google Rating: {google_rating}/5.0
+
+        Include:
+        1. Google My Business Optimization Checklist
+        2. Local Keyword Strategy
+        3. Citation Building Plan
+        4. Review Generation System
+        5. Local Link Building
+        6. Schema Markup Implementation
+        7. Monthly Action Items
+        8. Expected Traffic Growth Timeline
+        """),
+    ),
+    GeneratorSpec(
+        name="create_video_marketing_strategy",
+        stream_name="stream_video_marketing_strategy",
+        tier="advanced",
+        params=(Param("business_type", "str"), Param("monthly_budget", "float")),
+        max_tokens=2000,
+        template=PromptTemplate("""
+        Create a viral video marketing strategy for a {business_type} car detailing business
+        with a ${monthly_budget} monthly video budget.
+
+        Provide:
+        1. Video Content Ideas (30 short videos)
+        2. Equipment & Production Requirements
+        3. Platform-Specific Strategies (TikTok, YouTube Shorts, Instagram Reels)
+        4. Hashtag & SEO Strategy for Videos
+        5. Monetization Opportunities
+        6. Team & Resource Requirements
+        7. Budget Breakdown
+        8. Expected Viral Metrics & KPIs
+        9. Editing & Publishing Workflow
+        10. Collaboration Opportunities
+        """),
+    ),
+    GeneratorSpec(
+        name="create_fleet_marketing_strategy",
+        stream_name="stream_fleet_marketing_strategy",
+        tier="advanced",
+        params=(Param("industry_targets", "list[str]"), Param("service_area", "str")),
+        max_tokens=1800,
+        template=PromptTemplate("""
+        Create a B2B fleet marketing strategy for car detailing targeting:
+        Industries: {industry_targets}
+        Service Area: {service_area}
+
+        Include:
+        1. Fleet Manager Buyer Personas
+        2. Target Company List & Criteria
+        3. Cold Outreach Email Sequences
+        4. ROI Case Studies & Proposals
+        5. Fleet Contract Templates
+        6. Volume Pricing Strategy
+        7. Account Management Plans
+        8. Partnership Opportunities
+        9. Implementation Timeline
+        10. Expected Close Rates & Deal Size
+        """),
+    ),
+    GeneratorSpec(
+        name="create_influencer_partnership_plan",
+        stream_name="stream_influencer_partnership_plan",
+        tier="advanced",
+        params=(Param("niche", "str"), Param("region", "str"), Param("budget", "float")),
+        max_tokens=1600,
+        template=PromptTemplate("""
+        Create an influencer partnership strategy for a car detailing business:
+        Niche: {niche}
+        Region: {region}
+        Partnership Budget: ${budget}
+
+        Include:
+        1. Influencer Tier Strategy (Macro, Micro, Nano)
+        2. Ideal Influencer Profiles & Niches
+        3. Finding & Vetting Process
+        4. Outreach Email Templates
+        5. Partnership Deal Structures
+        6. Content Requirements & Guidelines
+        7. Performance Metrics & Tracking
+        8. Budget Allocation
+        9. Contract Template Elements
+        10. Long-term Relationship Building
+        """),
+    ),
+    GeneratorSpec(
+        name="generate_crisis_management_plan",
+        stream_name="stream_crisis_management_plan",
+        tier="advanced",
+        params=(Param("business_name", "str"),),
+        max_tokens=1500,
+        template=PromptTemplate("""
+        Create a crisis management and reputation protection plan for {business_name}.
+
+        Include:
+        1. Potential Crisis Scenarios
+        2. Response Templates for Each Scenario
+        3. Media Response Procedures
+        4. Social Media Crisis Protocol
+        5. Review Management Strategy
+        6. Legal Coordination Guidelines
+        7. Customer Communication Templates
+        8. Team Communication Plan
+        9. Prevention Strategies
+        10. Recovery & Rebuilding Strategy
+        """),
+    ),
+    GeneratorSpec(
+        name="generate_partnership_strategy",
+        stream_name="stream_partnership_strategy",
+        tier="advanced",
+        params=(Param("potential_partners", "list[str]"), Param("service_area", "str")),
+        max_tokens=1700,
+        template=PromptTemplate("""
+        Create a strategic partnership strategy for a car detailing business in {service_area}.
+        Potential Partners: {potential_partners}
+
+        Include:
+        1. Partner Evaluation Criteria
+        2. Partnership Models (Revenue Share, Referral, Co-Marketing)
+        3. Outreach & Pitch Templates
+        4. Mutual Benefit Analysis for Each Partner
+        5. Contract Framework
+        6. Co-Marketing Campaign Ideas
+        7. Integration & Operational Plans
+        8. Performance Metrics
+        9. Long-term Relationship Building
+        10. Scaling Partnership Model
+        """),
+    ),
+    GeneratorSpec(
+        name="create_retention_marketing_strategy",
+        stream_name="stream_retention_marketing_strategy",
+        tier="advanced",
+        params=(Param("average_customer_lifetime", "int"), Param("repeat_rate", "float"),
+                Param("figures", "figures", None)),
+        max_tokens=1600,
+        template=PromptTemplate("""
+        Create a comprehensive customer retention strategy for a car detailing business:
+        Average Customer Lifetime (months): {average_customer_lifetime}
+        Current Repeat Purchase Rate: {repeat_rate:.0%}
+
+        Include:
+        1. Customer Lifecycle Mapping
+        2. Retention Marketing Funnel
+        3. Win-Back Campaigns for Inactive Customers
+        4. Loyalty Program Design
+        5. Subscription Model Options
+        6. VIP/Premium Tier Strategy
+        7. Personalized Communication Plan
+        8. Customer Satisfaction Surveys
+        9. NPS Improvement Strategies
+        10. Lifetime Value Projections{figures:figures}
+        """),
+    ),
+)
+
+GENERATORS: Dict[str, GeneratorSpec] = {spec.name: spec for spec in GENERATOR_SPECS}
+
+CORE_GENERATORS = tuple(spec.name for spec in GENERATOR_SPECS if spec.tier == "core")
+ADVANCED_GENERATORS = tuple(spec.name for spec in GENERATOR_SPECS if spec.tier == "advanced")
+
+
+def get_spec(name: str) -> GeneratorSpec:
+    """Look up a generator by name"""
+    try:
+        return GENERATORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown generator: {name}") from None
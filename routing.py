@@ -0,0 +1,180 @@
+"""
+Model and max_tokens routing for the Car Detailer Marketing Agent
+Picks a model tier and output limit per generator call from the requested
+size, the observed output lengths of past calls and an override table
+"""
+
+import json
+import math
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from registry import GeneratorSpec
+from telemetry import Telemetry, percentile
+
+
+MODEL_TIERS: Dict[str, str] = {
+    "fast": "claude-3-5-haiku-20241022",
+    "standard": "claude-3-5-sonnet-20241022",
+}
+
+MIN_MAX_TOKENS = 256
+MAX_MAX_TOKENS = 4096
+
+# Limits learned from telemetry snap up to one of these, so a drifting p95
+# does not change max_tokens (and with it the response cache key) on every call
+OBSERVED_LIMITS = (256, 384, 512, 768, 1024, 1536, 2048, 3072, 4096)
+
+# Output size estimates for generators whose length depends on their arguments
+SIZE_RULES: Dict[str, Callable[[Dict[str, Any]], int]] = {
+    "create_social_media_content": lambda values: 200 + 220 * int(values["num_posts"]),
+    "create_fleet_marketing_strategy": lambda values: 1000 + 200 * len(values["industry_targets"]),
+    "generate_partnership_strategy": lambda values: 900 + 200 * len(values["potential_partners"]),
+}
+
+
+@dataclass(frozen=True)
+class Route:
+    """Model and output limit chosen for one call"""
+    tier: str
+    model: str
+    max_tokens: int
+    reason: str  # default, size, observed or override
+
+
+def _round_up(tokens: float, step: int = 64) -> int:
+    return int(math.ceil(tokens / step) * step)
+
+
+def _bucket(tokens: float) -> int:
+    return next((limit for limit in OBSERVED_LIMITS if limit >= tokens), MAX_MAX_TOKENS)
+
+
+class Router:
+    """
+    Chooses a model tier and max_tokens for every generator call
+
+    Calls whose expected output fits within fast_threshold tokens go to the fast
+    tier. Generators in SIZE_RULES are sized from their arguments; for the rest,
+    once telemetry holds min_samples outputs the limit shrinks toward the
+    observed p95 times headroom, never below the longest output seen, rounded
+    up to one of OBSERVED_LIMITS; a response cut off at such a limit is
+    retried with the static one (see retry_limit). Overrides ({generator:
+    {"tier": ..., "max_tokens": ...}}) win. Pass the agent's Telemetry so the
+    router learns from its calls.
+    """
+
+    def __init__(self, telemetry: Optional[Telemetry] = None, overrides: Optional[Dict[str, Dict[str, Any]]] = None,
+                 tiers: Optional[Dict[str, str]] = None, fast_threshold: int = 1024, min_samples: int = 20,
+                 headroom: float = 1.25):
+        self.telemetry = telemetry
+        self.overrides = dict(overrides or {})
+        self.tiers = dict(tiers or MODEL_TIERS)
+        self.fast_threshold = fast_threshold
+        self.min_samples = min_samples
+        self.headroom = headroom
+        self._lock = threading.Lock()
+        self._decisions: Dict[str, Counter] = defaultdict(Counter)
+        self._static: Dict[str, int] = {}  # limit a generator had before an observed one replaced it
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "Router":
+        """Build a router whose override table is read from a JSON file"""
+        with open(path, encoding="utf-8") as handle:
+            return cls(overrides=json.load(handle), **kwargs)
+
+    def _observed_limit(self, method: str) -> Optional[int]:
+        if self.telemetry is None:
+            return None
+        outputs = self.telemetry.output_samples(method)
+        if len(outputs) < self.min_samples:
+            return None
+        return _bucket(max(percentile(outputs, 0.95) * self.headroom, max(outputs)))
+
+    def route(self, spec: GeneratorSpec, values: Dict[str, Any], structured: bool = False,
+              record: bool = True) -> Route:
+        """Pick the tier and max_tokens for a call with bound arguments
+
+        record=False previews the route without counting it in report().
+        """
+        reason = "default"
+        max_tokens = spec.max_tokens
+        rule = SIZE_RULES.get(spec.name)
+        if rule is not None:
+            max_tokens, reason = _round_up(rule(values)), "size"
+
+        # Size rules already scale with the arguments, and structured output
+        # is longer than the prose telemetry mostly sees
+        observed = None if structured or rule is not None else self._observed_limit(spec.name)
+        static = min(MAX_MAX_TOKENS, max(MIN_MAX_TOKENS, max_tokens))
+        if observed is not None and observed < max_tokens:
+            max_tokens, reason = observed, "observed"
+        max_tokens = min(MAX_MAX_TOKENS, max(MIN_MAX_TOKENS, max_tokens))
+        tier = "fast" if max_tokens <= self.fast_threshold else "standard"
+
+        override = self.overrides.get(spec.name)
+        if override:
+            tier = override.get("tier", tier)
+            max_tokens = override.get("max_tokens", max_tokens)
+            reason = "override"
+
+        if record:
+            with self._lock:
+                self._decisions[spec.name][f"{tier}/{reason}"] += 1
+                if reason == "observed":
+                    self._static[spec.name] = static
+        return Route(tier, self.tiers[tier], max_tokens, reason)
+
+    def retry_limit(self, method: str, max_tokens: int) -> Optional[int]:
+        """The static limit to retry a response cut off at max_tokens with, or None
+
+        Only limits the router shrank from telemetry are retried; a size rule,
+        override or default limit is what the caller asked for.
+        """
+        with self._lock:
+            static = self._static.get(method)
+            if static is None or static <= max_tokens:
+                return None
+            self._decisions[method]["truncated_retry"] += 1
+        return static
+
+    def report(self) -> Dict[str, Any]:
+        """Routing decisions and latency by generator and tier, from telemetry"""
+        with self._lock:
+            decisions = {method: dict(counts) for method, counts in self._decisions.items()}
+        tier_of = {model: tier for tier, model in self.tiers.items()}
+        latencies: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        limits: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+        if self.telemetry is not None:
+            for record in self.telemetry.recent_records():
+                if record.cache_hit or record.error is not None:
+                    continue
+                tier = tier_of.get(record.model, record.model)
+                latencies[record.method][tier].append(record.latency)
+                latencies["*"][tier].append(record.latency)
+                limits[record.method][tier].append(record.max_tokens)
+
+        methods = {}
+        for method in sorted(set(decisions) | set(latencies)):
+            by_tier = {
+                tier: {
+                    "calls": len(values),
+                    "latency_p50": percentile(values, 0.5),
+                    "latency_p95": percentile(values, 0.95),
+                    "mean_max_tokens": (round(sum(limits[method][tier]) / len(limits[method][tier]))
+                                        if limits[method][tier] else None),
+                }
+                for tier, values in latencies[method].items()
+            }
+            methods[method] = {"decisions": decisions.get(method, {}), "tiers": by_tier}
+
+        overall = {tier: {"calls": len(values), "latency_p50": percentile(values, 0.5),
+                          "latency_p95": percentile(values, 0.95)}
+                   for tier, values in latencies["*"].items()}
+        methods.pop("*", None)
+        fast, standard = overall.get("fast"), overall.get("standard")
+        speedup = (standard["latency_p50"] / fast["latency_p50"]
+                   if fast and standard and fast["latency_p50"] else None)
+        return {"overall": overall, "fast_tier_p50_speedup": speedup, "methods": methods}
@@ -0,0 +1,253 @@
+"""
+Section-level marketing strategies for the Car Detailer Marketing Agent
+Stores the 8-section strategy as addressable sections, each declaring the
+config fields it depends on, so a config edit regenerates only the sections
+whose inputs changed
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, is_dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from config import MarketingConfig
+from main import CarDetailerMarketingAgent, DetailingClient
+from registry import PromptTemplate
+
+
+DEFAULT_SECTIONS_PATH = os.path.join(os.path.expanduser("~"), ".cache", "car-detailer-agent", "sections.sqlite3")
+
+FIELD_LABELS = {
+    "business_name": "Business Name",
+    "business_type": "Business Type",
+    "service_area": "Service Area",
+    "monthly_budget": "Monthly Marketing Budget",
+    "goals": "Goals",
+    "unique_selling_points": "Unique Selling Points",
+    "target_demographics": "Target Demographics",
+    "channels": "Marketing Channels",
+    "metrics": "Business Metrics",
+}
+
+
+@dataclass(frozen=True)
+class Section:
+    """One addressable part of the marketing strategy"""
+    name: str
+    title: str
+    depends_on: Tuple[str, ...]  # MarketingConfig fields the section reads
+    max_tokens: int
+    instruction: str
+
+
+STRATEGY_SECTIONS: Tuple[Section, ...] = (
+    Section("executive_summary", "Executive Summary",
+            ("business_name", "business_type", "service_area", "monthly_budget", "goals"), 400,
+            "A short overview of the business's situation, its goals and the strategy's core bets."),
+    Section("target_audience", "Target Audience Analysis",
+            ("business_type", "service_area", "target_demographics"), 500,
+            "The customer segments to pursue, what each cares about and where to reach them."),
+    Section("marketing_channels", "Recommended Marketing Channels (with expected ROI)",
+            ("business_type", "channels", "monthly_budget", "target_demographics"), 500,
+            "The channels to use, why each suits this business and the ROI to expect from each."),
+    Section("action_plan", "90-Day Action Plan",
+            ("goals", "channels", "monthly_budget"), 600,
+            "Week-by-week actions for the next 90 days, grouped by month."),
+    Section("content_calendar", "Content Calendar (next 30 days)",
+            ("channels", "unique_selling_points", "target_demographics"), 700,
+            "Posts and campaigns for the next 30 days with dates, channels and topics."),
+    Section("kpis", "Key Performance Indicators (KPIs)",
+            ("goals", "metrics"), 350,
+            "The metrics to track, their current baselines where known and 90-day targets."),
+    Section("budget_allocation", "Budget Allocation Strategy",
+            ("monthly_budget", "channels"), 400,
+            "How to split the monthly budget across channels, in dollars and percent."),
+    Section("competitive_positioning", "Competitive Positioning",
+            ("business_type", "service_area", "unique_selling_points"), 450,
+            "How the business should position itself against local competitors."),
+)
+
+SECTION_TEMPLATE = PromptTemplate("""
+    Write the "{title}" section of a marketing strategy for this car detailing business:
+
+    {facts}
+
+    Cover: {instruction}
+    Respond with the section body only, in markdown, without the section heading.
+    """)
+
+
+def config_fields(config: Union[MarketingConfig, DetailingClient]) -> Dict[str, Any]:
+    """Flatten a MarketingConfig (or DetailingClient) into the fields sections depend on"""
+    if isinstance(config, DetailingClient):
+        return {
+            "business_name": config.name,
+            "business_type": config.business_type,
+            "service_area": config.service_area,
+            "monthly_budget": config.monthly_budget,
+            "goals": config.goals,
+            "unique_selling_points": [],
+            "target_demographics": [],
+            "channels": None,
+            "metrics": None,
+        }
+    return {name: getattr(config, name) for name in FIELD_LABELS}
+
+
+def _describe(value: Any) -> str:
+    if is_dataclass(value):
+        value = asdict(value)
+    if isinstance(value, dict):
+        return "; ".join(f"{key.replace('_', ' ')}: {_describe(item)}" for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value) or "none given"
+    if value is None:
+        return "not provided"
+    return str(value)
+
+
+def render_section_prompt(section: Section, fields: Dict[str, Any]) -> str:
+    """Prompt for one section, showing only the fields it depends on"""
+    facts = "\n".join(
+        f"{FIELD_LABELS[name]}: {'$' if name == 'monthly_budget' else ''}{_describe(fields[name])}"
+        for name in section.depends_on
+    )
+    return SECTION_TEMPLATE.render({"title": section.title, "facts": facts, "instruction": section.instruction})
+
+
+def input_hash(section: Section, fields: Dict[str, Any]) -> str:
+    """Hash of everything a section's text depends on, including its prompt"""
+    payload = json.dumps([render_section_prompt(section, fields), section.max_tokens], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class StrategyDocument:
+    """A marketing strategy held as addressable sections"""
+    client_id: str
+    sections: Dict[str, str] = field(default_factory=dict)
+    regenerated: List[str] = field(default_factory=list)
+    reused: List[str] = field(default_factory=list)
+
+    def section(self, name: str) -> str:
+        return self.sections[name]
+
+    def to_markdown(self) -> str:
+        """The full strategy, sections in their standard order"""
+        parts = []
+        for number, section in enumerate(STRATEGY_SECTIONS, 1):
+            if section.name in self.sections:
+                parts.append(f"## {number}. {section.title}\n\n{self.sections[section.name].strip()}")
+        return "\n\n".join(parts)
+
+
+class SectionStore:
+    """SQLite store of generated sections and the input hash each was built from"""
+
+    def __init__(self, path: str = DEFAULT_SECTIONS_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sections (
+                client_id TEXT NOT NULL,
+                section TEXT NOT NULL,
+                input_hash TEXT NOT NULL,
+                text TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (client_id, section)
+            )
+            """
+        )
+
+    def load(self, client_id: str) -> Dict[str, Tuple[str, str]]:
+        """Return {section: (input_hash, text)} for a client"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT section, input_hash, text FROM sections WHERE client_id = ?", (client_id,)
+            ).fetchall()
+        return {section: (digest, text) for section, digest, text in rows}
+
+    def save(self, client_id: str, section: str, digest: str, text: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?, ?)",
+                (client_id, section, digest, text, time.time()),
+            )
+
+    def delete(self, client_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sections WHERE client_id = ?", (client_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SectionedStrategy:
+    """
+    Generates and incrementally regenerates sectioned marketing strategies
+    Each section is its own model call; regenerate() only sends the sections
+    whose dependent config fields (or prompt) changed since they were stored.
+    """
+
+    def __init__(self, agent: Optional[CarDetailerMarketingAgent] = None, store: Optional[SectionStore] = None,
+                 sections: Tuple[Section, ...] = STRATEGY_SECTIONS, max_workers: int = 4):
+        self.agent = agent or CarDetailerMarketingAgent()
+        self.store = store or SectionStore()
+        self.sections = sections
+        self.max_workers = max_workers
+
+    def _generate_section(self, client_id: str, section: Section, fields: Dict[str, Any], digest: str) -> str:
+        prompt = render_section_prompt(section, fields)
+        text = self.agent.complete(f"strategy_section.{section.name}", prompt, section.max_tokens,
+                                   values={"client_id": client_id, **fields})
+        self.store.save(client_id, section.name, digest, text)
+        return text
+
+    def regenerate(self, config: Union[MarketingConfig, DetailingClient], client_id: Optional[str] = None,
+                   force: bool = False) -> StrategyDocument:
+        """Bring a client's stored strategy up to date with config, regenerating only stale sections"""
+        fields = config_fields(config)
+        client_id = client_id or fields["business_name"]
+        stored = {} if force else self.store.load(client_id)
+        document = StrategyDocument(client_id)
+
+        stale = []
+        for section in self.sections:
+            digest = input_hash(section, fields)
+            previous = stored.get(section.name)
+            if previous is not None and previous[0] == digest:
+                document.sections[section.name] = previous[1]
+                document.reused.append(section.name)
+            else:
+                stale.append((section, digest))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {section.name: pool.submit(self._generate_section, client_id, section, fields, digest)
+                       for section, digest in stale}
+            for name, future in futures.items():
+                document.sections[name] = future.result()
+                document.regenerated.append(name)
+        return document
+
+    def generate(self, config: Union[MarketingConfig, DetailingClient],
+                 client_id: Optional[str] = None) -> StrategyDocument:
+        """Generate every section from scratch"""
+        return self.regenerate(config, client_id, force=True)
+
+    def stale_sections(self, config: Union[MarketingConfig, DetailingClient],
+                       client_id: Optional[str] = None) -> List[str]:
+        """Names of the sections regenerate() would send for config"""
+        fields = config_fields(config)
+        stored = self.store.load(client_id or fields["business_name"])
+        return [section.name for section in self.sections
+                if stored.get(section.name, (None,))[0] != input_hash(section, fields)]
@@ -0,0 +1,416 @@
+"""
+HTTP service for the Car Detailer Marketing Agent
+Exposes every registered generator over asyncio streams with a bounded job
+queue, per-tenant concurrency caps, fair round-robin scheduling between
+tenants, streaming responses and job polling
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from async_agent import AsyncAdvancedMarketingAgent
+from main import DetailingClient
+from registry import GENERATORS, GeneratorSpec
+
+
+DEFAULT_TENANT = "default"
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+@dataclass
+class Job:
+    """One generator call submitted to the service"""
+    id: str
+    tenant: str
+    generator: str
+    values: Dict[str, Any]
+    stream: bool = False
+    status: str = "queued"  # queued, running, succeeded, failed
+    result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    chunks: Optional[asyncio.Queue] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "tenant": self.tenant,
+            "generator": self.generator,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "succeeded":
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class FairJobQueue:
+    """
+    Bounded job queue shared by every tenant
+    Tenants are served round-robin, and a tenant at its concurrency cap is
+    skipped until one of its running jobs finishes.
+    """
+
+    def __init__(self, max_queued: int = 256, tenant_concurrency: int = 4):
+        self.max_queued = max_queued
+        self.tenant_concurrency = tenant_concurrency
+        self.rejected = 0
+        self._queued = 0
+        self._queues: Dict[str, Deque[Job]] = {}
+        self._order: Deque[str] = deque()
+        self._running: Dict[str, int] = defaultdict(int)
+        self._changed = asyncio.Condition()
+
+    async def submit(self, job: Job) -> bool:
+        """Queue a job; False when the queue is full"""
+        async with self._changed:
+            if self._queued >= self.max_queued:
+                self.rejected += 1
+                return False
+            if job.tenant not in self._queues:
+                self._queues[job.tenant] = deque()
+                self._order.append(job.tenant)
+            self._queues[job.tenant].append(job)
+            self._queued += 1
+            self._changed.notify()
+            return True
+
+    def _pick(self) -> Optional[Job]:
+        for _ in range(len(self._order)):
+            tenant = self._order.popleft()
+            if self._running[tenant] >= self.tenant_concurrency:
+                self._order.append(tenant)
+                continue
+            queue = self._queues[tenant]
+            job = queue.popleft()
+            if queue:
+                self._order.append(tenant)
+            else:
+                del self._queues[tenant]
+            self._queued -= 1
+            self._running[tenant] += 1
+            return job
+        return None
+
+    async def next(self) -> Job:
+        """Wait for the next job, taking tenants in turn"""
+        async with self._changed:
+            while True:
+                job = self._pick()
+                if job is not None:
+                    return job
+                await self._changed.wait()
+
+    async def release(self, job: Job):
+        """Mark a job finished so its tenant may run another"""
+        async with self._changed:
+            self._running[job.tenant] -= 1
+            if not self._running[job.tenant]:
+                del self._running[job.tenant]
+            self._changed.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queued,
+            "running": sum(self._running.values()),
+            "rejected": self.rejected,
+            "tenants_waiting": len(self._order),
+        }
+
+
+class HTTPError(Exception):
+    """An error answered with a JSON body and status code"""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _coerce(spec: GeneratorSpec, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Bind a JSON body to a generator's parameters"""
+    if not isinstance(body, dict):
+        raise HTTPError(400, "Request body must be a JSON object of generator arguments")
+    kwargs = dict(body)
+    for param in spec.params:
+        if param.kind == "client" and isinstance(kwargs.get(param.name), dict):
+            try:
+                kwargs[param.name] = DetailingClient(**{"email": "", "phone": "", **kwargs[param.name]})
+            except TypeError as exc:
+                raise HTTPError(400, str(exc)) from None
+    try:
+        return spec.bind((), kwargs)
+    except TypeError as exc:
+        raise HTTPError(400, str(exc)) from None
+
+
+class MarketingService:
+    """
+    Asyncio HTTP front end for an async marketing agent
+    All generators run as tasks on one event loop; max_concurrency worker
+    tasks drain the fair queue.
+
+    Routes:
+        GET  /generators                  generator names and argument schemas
+        POST /generators/{name}           run and wait (?mode=job to poll, ?mode=stream to stream)
+        GET  /jobs/{id}                   job status and result
+        GET  /healthz                     queue statistics
+    Tenants identify themselves with the X-Tenant header.
+    """
+
+    def __init__(self, agent=None, max_concurrency: int = 32, max_queued: int = 256,
+                 tenant_concurrency: int = 4, max_jobs: int = 10_000, retry_after: float = 1.0):
+        self.agent = agent or AsyncAdvancedMarketingAgent()
+        self.max_concurrency = max_concurrency
+        self.max_jobs = max_jobs
+        self.retry_after = retry_after
+        self.queue = FairJobQueue(max_queued, tenant_concurrency)
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._workers = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> Tuple[str, int]:
+        """Start the workers and listening socket; returns the bound address"""
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+        self._server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        """Stop accepting connections and cancel the workers"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 8080):
+        await self.start(host, port)
+        async with self._server:
+            await self._server.serve_forever()
+
+    def _remember(self, job: Job):
+        """Keep a job for polling; past max_jobs the oldest finished jobs are forgotten, unfinished ones kept"""
+        self.jobs[job.id] = job
+        excess = len(self.jobs) - self.max_jobs
+        victims = []
+        for job_id, old in self.jobs.items():
+            if len(victims) >= excess:
+                break
+            if old.done.is_set():
+                victims.append(job_id)
+        for job_id in victims:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.next()
+            try:
+                await self._run(job)
+            finally:
+                await self.queue.release(job)
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            if job.stream:
+                chunks = []
+                async for chunk in self.agent.stream(job.generator, **job.values):
+                    chunks.append(chunk)
+                    await job.chunks.put(chunk)
+                job.result = "".join(chunks)
+            else:
+                job.result = await self.agent.generate(job.generator, **job.values)
+            job.status = "succeeded"
+        except Exception as exc:
+            job.status = "failed"
+            job.error = f"{type(exc).__name__}: {exc}"
+        finally:
+            job.finished_at = time.time()
+            if job.chunks is not None:
+                await job.chunks.put(None)
+            job.done.set()
+
+    async def _submit(self, tenant: str, name: str, body: Any, stream: bool) -> Job:
+        spec = GENERATORS.get(name)
+        if spec is None or name not in self.agent.generators:
+            raise HTTPError(404, f"Unknown generator {name!r}")
+        job = Job(uuid.uuid4().hex, tenant, name, _coerce(spec, body), stream=stream,
+                  chunks=asyncio.Queue() if stream else None)
+        if not await self.queue.submit(job):
+            raise HTTPError(429, "Job queue is full", {"retry-after": f"{self.retry_after:g}"})
+        self._remember(job)
+        return job
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HTTPError as exc:
+                    await _send_json(writer, exc.status, {"error": str(exc)}, keep_alive=False)
+                    return
+                if request is None:
+                    return
+                method, target, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    await self._dispatch(writer, method, target, headers, body, keep_alive)
+                except HTTPError as exc:
+                    await _send_json(writer, exc.status, {"error": str(exc)}, exc.headers, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, writer: asyncio.StreamWriter, method: str, target: str,
+                        headers: Dict[str, str], body: bytes, keep_alive: bool):
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        tenant = headers.get("x-tenant", DEFAULT_TENANT)
+
+        if parts == ["healthz"] and method == "GET":
+            await _send_json(writer, 200, {"status": "ok", **self.queue.stats()}, keep_alive=keep_alive)
+        elif parts == ["generators"] and method == "GET":
+            listing = [{"name": name, "tier": GENERATORS[name].tier, "schema": GENERATORS[name].schema()}
+                       for name in self.agent.generators]
+            await _send_json(writer, 200, {"generators": listing}, keep_alive=keep_alive)
+        elif len(parts) == 2 and parts[0] == "jobs":
+            if method != "GET":
+                raise HTTPError(405, "Use GET to poll a job")
+            job = self.jobs.get(parts[1])
+            if job is None or job.tenant != tenant:
+                raise HTTPError(404, "Unknown job")
+            await _send_json(writer, 200, job.to_dict(), keep_alive=keep_alive)
+        elif len(parts) == 2 and parts[0] == "generators":
+            if method != "POST":
+                raise HTTPError(405, "Use POST to run a generator")
+            mode = parse_qs(url.query).get("mode", ["wait"])[0]
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "Request body is not valid JSON") from None
+            job = await self._submit(tenant, parts[1], payload, stream=(mode == "stream"))
+            if mode == "job":
+                await _send_json(writer, 202, job.to_dict(), {"location": f"/jobs/{job.id}"}, keep_alive)
+            elif mode == "stream":
+                await _stream_job(writer, job, keep_alive)
+            else:
+                await job.done.wait()
+                await _send_json(writer, 200 if job.status == "succeeded" else 500, job.to_dict(),
+                                 keep_alive=keep_alive)
+        else:
+            raise HTTPError(404, f"No route for {method} {url.path}")
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    """Read one HTTP/1.1 request; None when the client closed the connection"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as exc:
+        if exc.partial.strip():
+            raise HTTPError(400, "Incomplete request") from None
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "Request headers too large") from None
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line") from None
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0) or 0)
+    except ValueError:
+        raise HTTPError(400, "Invalid content-length") from None
+    if length < 0:
+        raise HTTPError(400, "Invalid content-length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def _head(status: int, headers: Dict[str, str], keep_alive: bool) -> bytes:
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    lines.append(f"connection: {'keep-alive' if keep_alive else 'close'}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _send_json(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any],
+                     headers: Optional[Dict[str, str]] = None, keep_alive: bool = True):
+    data = json.dumps(payload).encode("utf-8")
+    head = {"content-type": "application/json", "content-length": str(len(data)), **(headers or {})}
+    writer.write(_head(status, head, keep_alive) + data)
+    await writer.drain()
+
+
+async def _stream_job(writer: asyncio.StreamWriter, job: Job, keep_alive: bool):
+    """Write a job's text deltas as a chunked response while it runs"""
+    head = {"content-type": "text/plain; charset=utf-8", "transfer-encoding": "chunked", "x-job-id": job.id}
+    writer.write(_head(200, head, keep_alive))
+    while True:
+        chunk = await job.chunks.get()
+        if chunk is None:
+            break
+        data = chunk.encode("utf-8")
+        writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        await writer.drain()
+    if job.status == "failed":
+        # Headers are already sent; report the failure in a trailing chunk
+        data = f"\n[error] {job.error}".encode("utf-8")
+        writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+def main():
+    """Command-line entry point for the HTTP service"""
+    parser = argparse.ArgumentParser(description="Serve the marketing generators over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=32, help="generations running at once")
+    parser.add_argument("--max-queue", type=int, default=256, help="queued jobs before answering 429")
+    parser.add_argument("--tenant-concurrency", type=int, default=4, help="running jobs per tenant")
+    args = parser.parse_args()
+
+    service = MarketingService(max_concurrency=args.workers, max_queued=args.max_queue,
+                               tenant_concurrency=args.tenant_concurrency)
+    print(f"Serving {len(service.agent.generators)} generators on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(service.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
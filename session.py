@@ -0,0 +1,186 @@
+"""
+Client sessions for the Car Detailer Marketing Agent
+Carries a client's profile and condensed earlier outputs from one generator
+call to the next as a cached system prefix, so follow-up deliverables build on
+earlier ones without resending their full text
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+from main import CarDetailerMarketingAgent, DetailingClient
+from pipeline import Condenser, head, heading_text
+from ratelimit import CHARS_PER_TOKEN
+
+
+DEFAULT_SESSION_TOKENS = 2000
+
+SUMMARY_METHOD = "session_summary"
+
+SUMMARY_PROMPT = """
+Condense these marketing deliverables for {name} into at most {words} words of
+notes for whoever writes the next deliverable. Keep every decision they commit
+to: positioning, offers and prices, channels, budgets, dates, audiences and
+brand voice. Drop explanations and examples.
+
+{deliverables}
+""".strip()
+
+def _tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def outline(max_chars: int) -> Condenser:
+    """Condense an output to its headings, each with the first line under it"""
+    def condense(text: str) -> str:
+        kept, after_heading = [], False
+        for line in text.splitlines():
+            if heading_text(line) is not None:
+                kept.append(line.strip())
+                after_heading = True
+            elif after_heading and line.strip():
+                kept.append(line.strip())
+                after_heading = False
+        return head(max_chars)("\n".join(kept) if len(kept) > 1 else text)
+    return condense
+
+
+@dataclass
+class SessionEntry:
+    """One earlier output as the session carries it"""
+    method: str
+    text: str
+    tokens: int
+    summary: bool = False  # a model-written summary of several earlier entries
+
+
+def client_profile(client: DetailingClient) -> str:
+    goals = "\n".join(f"  - {goal}" for goal in client.goals)
+    return (f"Client profile:\n- Business: {client.name}\n- Type: {client.business_type}\n"
+            f"- Service area: {client.service_area}\n- Monthly marketing budget: ${client.monthly_budget}\n"
+            f"- Goals:\n{goals}")
+
+
+class ClientSession:
+    """
+    A run of generator calls for one client that share context
+
+    Each output is condensed to at most entry_tokens and appended to the
+    session. Every later call sends the client profile and those condensed
+    outputs as system blocks after the agent's shared prefix. Entries are only
+    appended, so the prefix stays stable and is served from the prompt cache.
+    When the session grows past budget_tokens, all but the newest entry are
+    replaced by a model-written summary (summarize=True), then the oldest
+    entries are dropped until it fits.
+    """
+
+    def __init__(self, agent: CarDetailerMarketingAgent, client: DetailingClient,
+                 budget_tokens: int = DEFAULT_SESSION_TOKENS, entry_tokens: int = 500,
+                 condense: Optional[Condenser] = None, summarize: bool = True, summary_tokens: int = 400):
+        self.client = client
+        self.budget_tokens = budget_tokens
+        self.entry_tokens = entry_tokens
+        self.condense = condense or outline(entry_tokens * CHARS_PER_TOKEN)
+        self.summarize = summarize
+        self.summary_tokens = summary_tokens
+        self.profile = client_profile(client)
+        self.entries: List[SessionEntry] = []
+        self.summaries = 0
+        self.evicted: List[str] = []
+        self._lock = threading.Lock()
+        self._base = agent
+        # A copy filed under the client: it shares caches and telemetry but sends this session's context
+        self.agent = agent.for_client(client.name)
+        self.agent.session = self
+
+    def system_blocks(self) -> List[Dict[str, Any]]:
+        """The profile and earlier outputs, with a cache breakpoint after the last one"""
+        with self._lock:
+            texts = [self.profile] + [
+                f"{'Summary of earlier deliverables' if entry.summary else 'Earlier deliverable: ' + entry.method}"
+                f" (build on it and stay consistent):\n{entry.text}"
+                for entry in self.entries
+            ]
+        blocks = [{"type": "text", "text": text} for text in texts]
+        blocks[-1]["cache_control"] = {"type": "ephemeral"}
+        return blocks
+
+    def tokens(self) -> int:
+        """Estimated size of the session context"""
+        with self._lock:
+            return _tokens(self.profile) + sum(entry.tokens for entry in self.entries)
+
+    def _args(self, name: str, args, kwargs) -> Dict[str, Any]:
+        """Fill a generator's client argument from the session when it is not given"""
+        spec = self.agent._spec(name)
+        given = {param.name for param in spec.params[:len(args)]} | set(kwargs)
+        for param in spec.params:
+            if param.kind == "client" and param.name not in given:
+                kwargs = {**kwargs, param.name: self.client}
+        return kwargs
+
+    def generate(self, name: str, *args, **kwargs) -> str:
+        """Run a generator with the session's context and add its output to the session"""
+        text = self.agent.generate(name, *args, **self._args(name, args, kwargs))
+        self.add(name, text)
+        return text
+
+    def stream(self, name: str, *args, **kwargs) -> Iterator[str]:
+        """Stream a generator with the session's context; its output is added once complete"""
+        chunks = []
+        for chunk in self.agent.stream(name, *args, **self._args(name, args, kwargs)):
+            chunks.append(chunk)
+            yield chunk
+        self.add(name, "".join(chunks))
+
+    async def agenerate(self, name: str, *args, **kwargs) -> str:
+        """generate for an async agent"""
+        text = await self.agent.generate(name, *args, **self._args(name, args, kwargs))
+        older = self._append(name, text)
+        if older:
+            self._replace(older, await self._base.complete(SUMMARY_METHOD, self._summary_prompt(older),
+                                                           self.summary_tokens))
+        self._evict()
+        return text
+
+    def add(self, method: str, text: str):
+        """Add an output to the session, then fit the session to its budget"""
+        older = self._append(method, text)
+        if older:
+            # Summaries go through the base agent, so they are written without the session's context
+            self._replace(older, self._base.complete(SUMMARY_METHOD, self._summary_prompt(older),
+                                                     self.summary_tokens))
+        self._evict()
+
+    def _append(self, method: str, text: str) -> List[SessionEntry]:
+        """Append a condensed output; returns the entries to summarize when over budget"""
+        condensed = self.condense(text)
+        with self._lock:
+            self.entries.append(SessionEntry(method, condensed, _tokens(condensed)))
+        if not self.summarize or self.tokens() <= self.budget_tokens:
+            return []
+        with self._lock:
+            older = self.entries[:-1]
+        return older if len(older) > 1 else []
+
+    def _summary_prompt(self, entries: List[SessionEntry]) -> str:
+        deliverables = "\n\n".join(f"## {entry.method}\n{entry.text}" for entry in entries)
+        return SUMMARY_PROMPT.format(name=self.client.name, words=int(self.summary_tokens * 0.75),
+                                     deliverables=deliverables)
+
+    def _replace(self, entries: List[SessionEntry], summary: str):
+        """Swap entries for one summary of them"""
+        summary = summary.strip()
+        with self._lock:
+            kept = [entry for entry in self.entries if not any(entry is old for old in entries)]
+            self.entries = [SessionEntry(SUMMARY_METHOD, summary, _tokens(summary), summary=True)] + kept
+            self.summaries += 1
+
+    def _evict(self):
+        """Drop the oldest entries, never the newest, until the session fits its budget"""
+        while self.tokens() > self.budget_tokens:
+            with self._lock:
+                if len(self.entries) < 2:
+                    return
+                self.evicted.append(self.entries.pop(0).method)
@@ -0,0 +1,200 @@
+"""
+Structured output for the Car Detailer Marketing Agent
+Tool-use JSON schemas for posts, email sequences, calendar entries and budget
+allocations, plus an incremental parser that yields each list item as soon as
+it has streamed in full
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class StructuredOutput:
+    """The tool a generator answers through in structured mode"""
+    tool_name: str
+    description: str
+    schema: Dict[str, Any]
+    item_fields: Tuple[str, ...]  # top-level list fields streamed item by item
+
+    def tool(self) -> Dict[str, Any]:
+        """Tool definition for messages.create"""
+        return {"name": self.tool_name, "description": self.description, "input_schema": self.schema}
+
+    def tool_choice(self) -> Dict[str, str]:
+        """Force the model to answer through this tool"""
+        return {"type": "tool", "name": self.tool_name}
+
+    def instruction(self) -> str:
+        return f"\n\nReturn the result by calling the {self.tool_name} tool."
+
+
+def _string_list() -> Dict[str, Any]:
+    return {"type": "array", "items": {"type": "string"}}
+
+
+SOCIAL_POST = {
+    "type": "object",
+    "properties": {
+        "platform": {"type": "string", "enum": ["Instagram", "TikTok", "Facebook"]},
+        "caption": {"type": "string"},
+        "hashtags": _string_list(),
+        "visual": {"type": "string", "description": "Recommended visual or video idea"},
+        "posting_time": {"type": "string", "description": "Best day and time to post"},
+        "engagement_strategy": {"type": "string"},
+    },
+    "required": ["platform", "caption", "hashtags", "visual", "posting_time"],
+}
+
+EMAIL = {
+    "type": "object",
+    "properties": {
+        "sequence_number": {"type": "integer"},
+        "send_day": {"type": "integer", "description": "Days after the campaign starts"},
+        "subject": {"type": "string"},
+        "subject_variant": {"type": "string", "description": "A/B test alternative subject line"},
+        "preview_text": {"type": "string"},
+        "body": {"type": "string"},
+        "call_to_action": {"type": "string"},
+    },
+    "required": ["sequence_number", "send_day", "subject", "body", "call_to_action"],
+}
+
+CALENDAR_ENTRY = {
+    "type": "object",
+    "properties": {
+        "day": {"type": "integer", "description": "Day 1-30 of the content calendar"},
+        "channel": {"type": "string"},
+        "content": {"type": "string"},
+        "goal": {"type": "string"},
+    },
+    "required": ["day", "channel", "content"],
+}
+
+BUDGET_ALLOCATION = {
+    "type": "object",
+    "properties": {
+        "channel": {"type": "string"},
+        "monthly_amount": {"type": "number"},
+        "percent": {"type": "number"},
+        "expected_roi": {"type": "string"},
+    },
+    "required": ["channel", "monthly_amount", "percent"],
+}
+
+# Generators that support structured mode, keyed by generator name
+STRUCTURED_OUTPUTS: Dict[str, StructuredOutput] = {
+    "create_social_media_content": StructuredOutput(
+        tool_name="record_social_posts",
+        description="Record the social media posts for the content calendar",
+        schema={
+            "type": "object",
+            "properties": {"posts": {"type": "array", "items": SOCIAL_POST}},
+            "required": ["posts"],
+        },
+        item_fields=("posts",),
+    ),
+    "generate_email_campaign": StructuredOutput(
+        tool_name="record_email_sequence",
+        description="Record the email campaign, one entry per email in send order",
+        schema={
+            "type": "object",
+            "properties": {
+                "emails": {"type": "array", "items": EMAIL},
+                "segmentation_notes": {"type": "string"},
+                "success_metrics": _string_list(),
+            },
+            "required": ["emails"],
+        },
+        item_fields=("emails",),
+    ),
+    "generate_marketing_strategy": StructuredOutput(
+        tool_name="record_marketing_plan",
+        description="Record the marketing strategy with its content calendar and budget allocation",
+        schema={
+            "type": "object",
+            "properties": {
+                "executive_summary": {"type": "string"},
+                "target_audience": {"type": "string"},
+                "action_plan": _string_list(),
+                "content_calendar": {"type": "array", "items": CALENDAR_ENTRY},
+                "budget_allocation": {"type": "array", "items": BUDGET_ALLOCATION},
+                "kpis": _string_list(),
+                "competitive_positioning": {"type": "string"},
+            },
+            "required": ["executive_summary", "content_calendar", "budget_allocation", "kpis"],
+        },
+        item_fields=("content_calendar", "budget_allocation"),
+    ),
+}
+
+
+def get_output(name: str) -> StructuredOutput:
+    """Look up the structured output for a generator"""
+    try:
+        return STRUCTURED_OUTPUTS[name]
+    except KeyError:
+        raise ValueError(f"Generator {name!r} has no structured output mode") from None
+
+
+class ItemStreamParser:
+    """
+    Incremental scanner over a streamed JSON object
+    feed() takes each partial_json chunk and returns (field, item) for every
+    element of a watched top-level list that completed in that chunk. Each
+    character is scanned once; only finished items are decoded.
+    """
+
+    def __init__(self, fields: Tuple[str, ...]):
+        self.fields = set(fields)
+        self._text = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._field: Optional[str] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        items = []
+        offset = len(self._text)
+        self._text += chunk
+        for index, char in enumerate(chunk, offset):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = json.loads(self._text[self._string_start:index + 1])
+                    elif self._depth == 2 and self._item_start == self._string_start:
+                        items.append(self._finish(index))
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+                if self._depth == 2 and self._field is not None:
+                    self._item_start = index
+            elif char in "{[":
+                if self._depth == 1 and char == "[":
+                    self._field = self._last_key if self._last_key in self.fields else None
+                elif self._depth == 2 and self._field is not None:
+                    self._item_start = index
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 2 and self._item_start is not None:
+                    items.append(self._finish(index))
+                elif self._depth == 1:
+                    self._field = None
+        return items
+
+    def _finish(self, end: int) -> Tuple[str, Any]:
+        item = json.loads(self._text[self._item_start:end + 1])
+        self._item_start = None
+        return self._field, item
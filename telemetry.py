@@ -0,0 +1,287 @@
+"""
+Per-call telemetry for the Car Detailer Marketing Agent
+Latency, token usage and cost for every API call, with JSON and Prometheus export
+"""
+
+import json
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+
+# USD per million tokens: input, output, cache write, cache read
+MODEL_PRICING: Dict[str, Dict[str, float]] = {
+    "claude-3-5-sonnet-20241022": {"input": 3.00, "output": 15.00, "cache_write": 3.75, "cache_read": 0.30},
+    "claude-3-5-sonnet-20240620": {"input": 3.00, "output": 15.00, "cache_write": 3.75, "cache_read": 0.30},
+    "claude-3-5-haiku-20241022": {"input": 0.80, "output": 4.00, "cache_write": 1.00, "cache_read": 0.08},
+    "claude-3-haiku-20240307": {"input": 0.25, "output": 1.25, "cache_write": 0.30, "cache_read": 0.03},
+    "claude-3-opus-20240229": {"input": 15.00, "output": 75.00, "cache_write": 18.75, "cache_read": 1.50},
+}
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+# Running totals kept as floats; every other total is a count
+FLOAT_TOTALS = {"cost_usd", "latency_seconds", "ttfb_seconds"}
+
+
+def estimate_cost(model: str, input_tokens: int = 0, output_tokens: int = 0,
+                  cache_creation_input_tokens: int = 0, cache_read_input_tokens: int = 0) -> float:
+    """Estimate the USD cost of one call from its token usage"""
+    prices = MODEL_PRICING.get(model)
+    if prices is None:
+        return 0.0
+    return (input_tokens * prices["input"]
+            + output_tokens * prices["output"]
+            + cache_creation_input_tokens * prices["cache_write"]
+            + cache_read_input_tokens * prices["cache_read"]) / 1_000_000
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of values, 0.0 when empty"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+@dataclass
+class CallRecord:
+    """Measurements for a single generator call"""
+    method: str
+    model: str
+    max_tokens: int
+    started_at: float = field(default_factory=time.time)
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    ttfb: Optional[float] = None
+    latency: float = 0.0
+    retries: int = 0
+    cache_hit: bool = False
+    streamed: bool = False
+    error: Optional[str] = None
+    cost: float = 0.0
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+
+    def mark_first_byte(self):
+        """Record time to first byte, once"""
+        if self.ttfb is None:
+            self.ttfb = time.perf_counter() - self._start
+
+    def add_retry(self):
+        self.retries += 1
+
+    def set_usage(self, usage: Dict[str, int]):
+        for name, value in usage.items():
+            setattr(self, name, value)
+
+    @property
+    def tokens(self) -> int:
+        """Every token the call was billed for, cache reads and writes included"""
+        return (self.input_tokens + self.output_tokens + self.cache_creation_input_tokens
+                + self.cache_read_input_tokens)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("_start")
+        return data
+
+
+class Telemetry:
+    """
+    Collects CallRecords and keeps rolling per-method statistics
+    Percentiles cover the most recent window calls per method
+    """
+
+    def __init__(self, window: int = 1000, namespace: str = "marketing_agent"):
+        self.window = window
+        self.namespace = namespace
+        self.records: Deque[CallRecord] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._latency: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._ttfb: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._output: Dict[str, Deque[int]] = defaultdict(lambda: deque(maxlen=window))
+        # Counters are kept per (method, model), so a method the router moves
+        # to another tier starts a new Prometheus series instead of jumping
+        self._totals: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._series_latency: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._series_ttfb: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._max_tokens: Dict[Tuple[str, str], int] = {}
+        self._models: Dict[str, str] = {}
+
+    @contextmanager
+    def track(self, method: str, model: str, max_tokens: int) -> Iterator[CallRecord]:
+        """Measure one call; the yielded record is filled in by the caller"""
+        record = CallRecord(method=method, model=model, max_tokens=max_tokens)
+        try:
+            yield record
+        except Exception as exc:
+            record.error = type(exc).__name__
+            raise
+        finally:
+            record.latency = time.perf_counter() - record._start
+            if record.ttfb is None:
+                record.ttfb = record.latency
+            self.record(record)
+
+    def record(self, record: CallRecord):
+        """Add a finished call to the rolling statistics"""
+        record.cost = estimate_cost(
+            record.model,
+            record.input_tokens,
+            record.output_tokens,
+            record.cache_creation_input_tokens,
+            record.cache_read_input_tokens,
+        )
+        with self._lock:
+            self.records.append(record)
+            series = (record.method, record.model)
+            totals = self._totals[series]
+            totals["calls"] += 1
+            totals["cache_hits"] += record.cache_hit
+            totals["errors"] += record.error is not None
+            totals["retries"] += record.retries
+            totals["input_tokens"] += record.input_tokens
+            totals["output_tokens"] += record.output_tokens
+            totals["cache_creation_input_tokens"] += record.cache_creation_input_tokens
+            totals["cache_read_input_tokens"] += record.cache_read_input_tokens
+            totals["cost_usd"] += record.cost
+            self._max_tokens[series] = record.max_tokens
+            self._models[record.method] = record.model
+            if not record.cache_hit and record.error is None:
+                totals["measured"] += 1
+                totals["latency_seconds"] += record.latency
+                totals["ttfb_seconds"] += record.ttfb
+                self._latency[record.method].append(record.latency)
+                self._ttfb[record.method].append(record.ttfb)
+                self._output[record.method].append(record.output_tokens)
+                self._series_latency[series].append(record.latency)
+                self._series_ttfb[series].append(record.ttfb)
+
+    def recent_records(self) -> List[CallRecord]:
+        """Copy of the most recent call records"""
+        with self._lock:
+            return list(self.records)
+
+    def output_samples(self, method: str) -> List[int]:
+        """Output token counts of the method's recent measured calls"""
+        with self._lock:
+            return list(self._output.get(method, ()))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return per-method totals and rolling percentiles; model is the method's latest"""
+        with self._lock:
+            by_method: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+            for (method, _), totals in self._totals.items():
+                for name, value in totals.items():
+                    by_method[method][name] += value
+            methods = {}
+            for method, totals in by_method.items():
+                latency = list(self._latency[method])
+                ttfb = list(self._ttfb[method])
+                output = list(self._output[method])
+                model = self._models[method]
+                methods[method] = {
+                    "model": model,
+                    "max_tokens": self._max_tokens[(method, model)],
+                    **{name: (round(value, 6) if name in FLOAT_TOTALS else int(value)) for name, value in totals.items()},
+                    "latency": {f"p{int(q * 100)}": percentile(latency, q) for q in QUANTILES},
+                    "ttfb": {f"p{int(q * 100)}": percentile(ttfb, q) for q in QUANTILES},
+                    "output_tokens_observed": {
+                        "p50": percentile(output, 0.5),
+                        "p95": percentile(output, 0.95),
+                        "max": max(output) if output else 0,
+                    },
+                }
+        return {
+            "generated_at": time.time(),
+            "total_cost_usd": round(sum(m["cost_usd"] for m in methods.values()), 6),
+            "total_calls": sum(m["calls"] for m in methods.values()),
+            "methods": methods,
+        }
+
+    def export_json(self, include_records: bool = False) -> str:
+        """Serialize the snapshot, optionally with the recent raw call records"""
+        data = self.snapshot()
+        if include_records:
+            with self._lock:
+                data["records"] = [record.to_dict() for record in self.records]
+        return json.dumps(data, indent=2)
+
+    def _series(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Totals and rolling percentiles per (method, model)"""
+        with self._lock:
+            series = {}
+            for key, totals in self._totals.items():
+                latency, ttfb = list(self._series_latency[key]), list(self._series_ttfb[key])
+                series[key] = {
+                    **totals,
+                    "max_tokens": self._max_tokens[key],
+                    "latency": {f"p{int(q * 100)}": percentile(latency, q) for q in QUANTILES},
+                    "ttfb": {f"p{int(q * 100)}": percentile(ttfb, q) for q in QUANTILES},
+                }
+        return series
+
+    def export_prometheus(self) -> str:
+        """Render the statistics in the Prometheus text exposition format, one series per method and model"""
+        ns = self.namespace
+        snapshot = self._series()
+        lines = []
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {ns}_{name} {help_text}")
+            lines.append(f"# TYPE {ns}_{name} {kind}")
+
+        def labels(series: Tuple[str, str], **extra) -> str:
+            method, model = series
+            pairs = {"method": method, "model": model, **extra}
+            return "{" + ",".join(f'{key}="{value}"' for key, value in pairs.items()) + "}"
+
+        family("calls_total", "counter", "Generator calls")
+        for series, stats in snapshot.items():
+            lines.append(f"{ns}_calls_total{labels(series)} {int(stats['calls'])}")
+
+        family("cache_hits_total", "counter", "Calls answered from the response cache")
+        for series, stats in snapshot.items():
+            lines.append(f"{ns}_cache_hits_total{labels(series)} {int(stats['cache_hits'])}")
+
+        family("errors_total", "counter", "Calls that raised an error")
+        for series, stats in snapshot.items():
+            lines.append(f"{ns}_errors_total{labels(series)} {int(stats['errors'])}")
+
+        family("retries_total", "counter", "Rate limit and overload retries")
+        for series, stats in snapshot.items():
+            lines.append(f"{ns}_retries_total{labels(series)} {int(stats['retries'])}")
+
+        family("tokens_total", "counter", "Tokens consumed by type")
+        for series, stats in snapshot.items():
+            for kind in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"):
+                lines.append(f"{ns}_tokens_total{labels(series, type=kind)} {int(stats[kind])}")
+
+        family("cost_usd_total", "counter", "Estimated spend in USD")
+        for series, stats in snapshot.items():
+            lines.append(f"{ns}_cost_usd_total{labels(series)} {round(stats['cost_usd'], 6)}")
+
+        family("max_tokens", "gauge", "Configured max_tokens")
+        for series, stats in snapshot.items():
+            lines.append(f"{ns}_max_tokens{labels(series)} {stats['max_tokens']}")
+
+        for metric, key, help_text in (
+            ("latency_seconds", "latency", "Total call latency"),
+            ("ttfb_seconds", "ttfb", "Time to first byte"),
+        ):
+            family(metric, "summary", help_text)
+            for series, stats in snapshot.items():
+                for q in QUANTILES:
+                    value = stats[key][f"p{int(q * 100)}"]
+                    lines.append(f"{ns}_{metric}{labels(series, quantile=q)} {value:.6f}")
+            for series, stats in snapshot.items():
+                lines.append(f"{ns}_{metric}_sum{labels(series)} {stats.get(metric, 0.0):.6f}")
+                lines.append(f"{ns}_{metric}_count{labels(series)} {int(stats.get('measured', 0))}")
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,34 @@
+"""
+Shared fixtures: an in-process fake Messages API server and agents pointed at it
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_server import FakeMessagesServer, FakeServerConfig  # noqa: E402
+
+
+def fast_config(**overrides) -> FakeServerConfig:
+    """A fake server that answers at once, so tests spend their time in the agent"""
+    options = dict(latency_distribution="fixed", ttft_s=0.0, tokens_per_second=1e6, retry_after_s=0.0, seed=7)
+    options.update(overrides)
+    return FakeServerConfig(**options)
+
+
+@pytest.fixture
+def fake_server():
+    """Start a fake server with the given config overrides; returns its base URL"""
+    servers = []
+
+    def start(**overrides) -> str:
+        server = FakeMessagesServer(fast_config(**overrides)).start()
+        servers.append(server)
+        return server.base_url
+
+    yield start
+    for server in servers:
+        server.stop()
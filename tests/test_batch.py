@@ -0,0 +1,47 @@
+"""
+Batches: canonical arguments, shared cache keys and artifacts with the interactive path
+"""
+
+from artifacts import ArtifactStore
+from batch import BatchRunner, FakeBatchClient
+from cache import ResponseCache
+from canonical import Canonicalizer
+from main import CarDetailerMarketingAgent
+
+GENERATOR = "generate_pricing_strategy"
+
+
+def make_agent(tmp_path):
+    return CarDetailerMarketingAgent(api_key="test", client=FakeBatchClient(), canonicalizer=Canonicalizer(),
+                                     cache=ResponseCache(str(tmp_path / "cache.sqlite3")),
+                                     artifacts=ArtifactStore(str(tmp_path / "artifacts.sqlite3")))
+
+
+def test_batched_result_is_an_interactive_cache_hit_and_filed_with_canonical_args(tmp_path):
+    agent = make_agent(tmp_path)
+    runner = BatchRunner(agent, sleep=lambda seconds: None)
+    runner.add(GENERATOR, "Small", "Premium ", "austin texas")
+    [result] = runner.run()
+    assert result.succeeded and not result.cached
+
+    [artifact] = agent.artifacts.query(method=GENERATOR)
+    assert artifact.args == {"business_size": "small", "market_position": "premium", "service_area": "Austin, TX"}
+
+    # The batch client has no messages.create, so anything but a cache hit would fail
+    assert agent.generate(GENERATOR, "small", "premium", "Austin, TX") == result.text
+    assert agent.last_call.cache_hit
+
+
+def test_equivalent_calls_are_submitted_once(tmp_path):
+    agent = make_agent(tmp_path)
+    runner = BatchRunner(agent, sleep=lambda seconds: None)
+    runner.add(GENERATOR, "small", "premium", "Austin, TX")
+    runner.add(GENERATOR, "SMALL", "premium", "austin tx")
+    first, second = runner.run()
+    assert first.text == second.text
+    [batch] = agent.client.messages.batches.batches.values()
+    assert len(batch["requests"]) == 1
+
+    runner.add(GENERATOR, "small", "premium", "Austin Texas")
+    [cached] = runner.run()
+    assert cached.cached and cached.text == first.text
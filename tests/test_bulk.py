@@ -0,0 +1,94 @@
+"""
+Bulk runs: checkpoint resume, failed records and malformed rows
+"""
+
+import json
+
+from advanced_agent import AdvancedMarketingAgent
+from bulk import Checkpoint, run_bulk
+from fake_server import fetch_stats
+
+ROWS = [
+    {"name": "Shine Co", "service_area": "Austin, TX", "monthly_budget": 1500},
+    {"name": "Gloss Works", "service_area": "Dallas, TX", "monthly_budget": 2500},
+    "{not json",
+    {"business_name": "Mirror Finish", "service_area": "Denver, CO", "monthly_budget": 3000,
+     "goals": ["More fleet clients"]},
+]
+
+
+def write_input(path):
+    with open(path, "w", encoding="utf-8") as handle:
+        for row in ROWS:
+            handle.write((row if isinstance(row, str) else json.dumps(row)) + "\n")
+    return str(path)
+
+
+def read_output(path):
+    with open(path, encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle]
+
+
+def test_checkpoint_advances_past_out_of_order_and_failed_records(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "run.checkpoint"))
+    checkpoint.mark_done(1)
+    checkpoint.mark_done(2, failed=True)
+    assert checkpoint.next_index == 0 and checkpoint.done_ahead == {1, 2}
+
+    checkpoint.mark_done(0)
+    assert checkpoint.next_index == 3 and not checkpoint.done_ahead
+
+    resumed = Checkpoint(checkpoint.path)
+    assert resumed.next_index == 3 and resumed.failed == {2}
+    assert resumed.is_done(2)
+    assert not Checkpoint(checkpoint.path, retry_failed=True).is_done(2)
+
+
+def test_rerun_skips_finished_and_failed_records(tmp_path, fake_server):
+    url = fake_server()
+    input_path, output_path = write_input(tmp_path / "clients.jsonl"), str(tmp_path / "out.jsonl")
+    agent = AdvancedMarketingAgent(api_key="test", base_url=url)
+
+    counts = run_bulk(input_path, output_path, agent=agent, max_workers=2)
+    assert counts == {"completed": 3, "failed": 1, "skipped": 0}
+    lines = {line["index"]: line for line in read_output(output_path)}
+    assert lines[2]["error"].startswith("Malformed record")
+    assert lines[3]["name"] == "Mirror Finish" and lines[3]["results"]["marketing_strategy"]
+
+    requests = fetch_stats(url)["requests"]
+    counts = run_bulk(input_path, output_path, agent=agent, max_workers=2)
+    assert counts == {"completed": 0, "failed": 0, "skipped": 4}
+    assert fetch_stats(url)["requests"] == requests
+
+    counts = run_bulk(input_path, output_path, agent=agent, max_workers=2, retry_failed=True)
+    assert counts == {"completed": 0, "failed": 1, "skipped": 3}
+
+
+def test_resume_runs_only_unfinished_records(tmp_path, fake_server):
+    url = fake_server()
+    input_path, output_path = write_input(tmp_path / "clients.jsonl"), str(tmp_path / "out.jsonl")
+    # As left by a run that crashed with record 1 in flight and 3 already written
+    with open(output_path + ".checkpoint", "w", encoding="utf-8") as handle:
+        json.dump({"next_index": 1, "done_ahead": [3], "failed": []}, handle)
+
+    counts = run_bulk(input_path, output_path, agent=AdvancedMarketingAgent(api_key="test", base_url=url))
+
+    assert counts == {"completed": 1, "failed": 1, "skipped": 2}
+    assert sorted(line["index"] for line in read_output(output_path)) == [1, 2]
+    assert fetch_stats(url)["requests"] == 1
+    assert Checkpoint(output_path + ".checkpoint").next_index == len(ROWS)
+
+
+def test_failed_api_call_is_recorded_and_retried(tmp_path, fake_server):
+    input_path, output_path = write_input(tmp_path / "clients.jsonl"), str(tmp_path / "out.jsonl")
+    broken = AdvancedMarketingAgent(api_key="test", base_url=fake_server(overload_rate=1.0))
+    broken.client = broken.client.with_options(max_retries=0)
+
+    counts = run_bulk(input_path, output_path, agent=broken)
+    assert counts == {"completed": 0, "failed": 4, "skipped": 0}
+    assert Checkpoint(output_path + ".checkpoint").failed == {0, 1, 2, 3}
+
+    healthy = AdvancedMarketingAgent(api_key="test", base_url=fake_server())
+    counts = run_bulk(input_path, output_path, agent=healthy, retry_failed=True)
+    assert counts == {"completed": 3, "failed": 1, "skipped": 0}
+    assert Checkpoint(output_path + ".checkpoint").failed == {2}
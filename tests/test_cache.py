@@ -0,0 +1,113 @@
+"""
+Response cache: lookup accounting, LRU eviction by count and size, expiry and purging
+"""
+
+import pytest
+
+import cache as cache_module
+from cache import RefreshingCache, ResponseCache
+
+
+class Clock:
+    """Stands in for the time module so recency and expiry are deterministic"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+
+def make_cache(tmp_path, **kwargs):
+    return ResponseCache(str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_hits_and_misses_are_counted_once_per_lookup(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.set("a", "method", "text a")
+
+    assert cache.get("a") == "text a"
+    assert cache.get("missing") is None
+    assert cache.get_any(["missing", "other", "a"]) == "text a"
+    assert cache.get_any(["missing", "other"]) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 2, 0.5)
+
+
+def test_least_recently_used_entries_are_evicted_by_count(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=2)
+    for key in ("a", "b"):
+        cache.set(key, "method", key)
+        clock.advance(1)
+    cache.get("a")
+    clock.advance(1)
+    cache.set("c", "method", "c")
+
+    assert cache.get("b") is None and cache.get("a") == "a" and cache.get("c") == "c"
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"], stats["expirations"]) == (2, 1, 0)
+
+
+def test_entries_are_evicted_by_size(tmp_path, clock):
+    cache = make_cache(tmp_path, max_bytes=25)
+    for key in ("a", "b", "c"):
+        cache.set(key, "method", key * 10)
+        clock.advance(1)
+
+    assert cache.get("a") is None and cache.get("b") == "b" * 10
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 20, 1)
+
+    # Replacing an entry counts its new size, not both
+    cache.set("b", "method", "b")
+    assert cache.stats()["bytes"] == 11 and cache.get("c") == "c" * 10
+
+
+def test_expired_entries_are_counted_as_expirations_not_evictions(tmp_path, clock):
+    cache = make_cache(tmp_path, method_ttls={"short": 10})
+    cache.set("a", "short", "text")
+    cache.set("b", "long", "text")
+    clock.advance(11)
+
+    assert cache.get("a") is None and cache.get("b") == "text"
+    stats = cache.stats()
+    assert (stats["expirations"], stats["evictions"], stats["entries"]) == (1, 0, 1)
+
+
+def test_expired_entries_are_purged_once_per_interval(tmp_path, clock):
+    cache = make_cache(tmp_path, method_ttls={"short": 10}, purge_interval=60)
+    cache.set("a", "short", "text")
+    clock.advance(30)
+    cache.set("b", "long", "text")
+    assert cache.stats()["entries"] == 2
+
+    clock.advance(30)
+    cache.set("c", "long", "text")
+    stats = cache.stats()
+    assert (stats["entries"], stats["expirations"]) == (2, 1)
+    assert cache.expires_at("a") is None
+
+
+def test_refreshing_view_misses_but_writes_through(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.set("a", "method", "old")
+    refreshing = RefreshingCache(cache)
+
+    assert refreshing.get("a") is None and refreshing.get_any(["a"]) is None
+    refreshing.set("a", "method", "new")
+    assert cache.get("a") == "new"
+    assert cache.stats()["misses"] == 0
@@ -0,0 +1,72 @@
+"""
+Input canonicalization and near-duplicate matching
+"""
+
+import pytest
+
+from cache import ResponseCache
+from canonical import (Canonicalizer, NearDuplicateIndex, bucket_budget, canonical_list, canonical_location)
+from fake_server import fetch_stats
+from main import CarDetailerMarketingAgent, DetailingClient
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("austin tx", "Austin, TX"),
+    ("Austin Texas", "Austin, TX"),
+    ("Austin, TX.", "Austin, TX"),
+    ("new york new york", "New York, NY"),
+    ("central texas", "Central Texas"),
+    ("miami-dade fl", "Miami-Dade, FL"),
+    ("toronto, ON", "Toronto, ON"),
+])
+def test_canonical_location(text, expected):
+    assert canonical_location(text) == expected
+
+
+def test_bucket_budget_and_lists():
+    assert bucket_budget(0) == 0
+    assert bucket_budget(1900) == 2000
+    assert bucket_budget(41_000) == 40_000
+    assert canonical_list(["Build brand ", "leads", "build brand."]) == ["Build brand", "leads"]
+
+
+def make_client(area: str, name: str = "Shine Co", goals=("Increase leads by 40%", "Build brand awareness")):
+    return DetailingClient(name=name, email="", phone="", business_type="independent", service_area=area,
+                           monthly_budget=2000, goals=list(goals))
+
+
+def fingerprint(canonicalizer: Canonicalizer, client: DetailingClient):
+    values = canonicalizer.canonicalize({"client": client})
+    return canonicalizer.fingerprint("generate_marketing_strategy", values)
+
+
+def test_location_and_name_are_part_of_the_exact_scope():
+    canonicalizer = Canonicalizer(near_duplicates=NearDuplicateIndex())
+    austin = fingerprint(canonicalizer, make_client("Austin, TX"))
+
+    assert fingerprint(canonicalizer, make_client("austin texas")) == austin
+    assert fingerprint(canonicalizer, make_client("Dallas, TX")).scope != austin.scope
+    assert fingerprint(canonicalizer, make_client("Austin, TX", name="Gloss Works")).scope != austin.scope
+    reworded = fingerprint(canonicalizer, make_client("Austin, TX", goals=("Increase leads by 40 %",
+                                                                           "Build brand awareness")))
+    assert reworded.scope == austin.scope and reworded.signature != austin.signature
+
+
+def test_near_duplicates_are_served_only_within_a_business(tmp_path, fake_server):
+    url = fake_server()
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url, cache=ResponseCache(str(tmp_path / "cache")),
+                                      canonicalizer=Canonicalizer(near_duplicates=NearDuplicateIndex(threshold=0.8)))
+    austin = agent.generate_marketing_strategy(make_client("Austin, TX"))
+
+    assert agent.generate_marketing_strategy(make_client("austin tx")) == austin
+    assert fetch_stats(url)["requests"] == 1
+
+    reworded = make_client("Austin, TX", goals=("Increase leads by 40 %", "Build brand awareness"))
+    assert agent.generate_marketing_strategy(reworded) == austin
+    assert fetch_stats(url)["requests"] == 1
+    assert agent.canonicalizer.near_duplicates.matches == 1
+    assert agent.cache.hits == 2 and agent.cache.misses == 1
+
+    agent.generate_marketing_strategy(make_client("Dallas, TX"))
+    agent.generate_marketing_strategy(make_client("Austin, TX", name="Gloss Works"))
+    assert fetch_stats(url)["requests"] == 3
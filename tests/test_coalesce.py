@@ -0,0 +1,97 @@
+"""
+Single-flight request coalescing
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from coalesce import SingleFlight
+from fake_server import fetch_stats
+from main import CarDetailerMarketingAgent
+
+
+def test_concurrent_threads_share_one_call():
+    flight, release, calls = SingleFlight(), threading.Event(), []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(flight.do, "key", fn) for _ in range(4)]
+        while flight.stats()["calls"] < 4:
+            pass
+        release.set()
+        assert [future.result() for future in futures] == ["result"] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 4, "saved": 3, "in_flight": 0}
+
+
+def test_followers_receive_the_leaders_error():
+    flight, release = SingleFlight(), threading.Event()
+
+    def fn():
+        release.wait(5)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(flight.do, "key", fn) for _ in range(2)]
+        while flight.stats()["calls"] < 2:
+            pass
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+
+
+def test_async_callers_share_one_call():
+    flight, calls = SingleFlight(), []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*(flight.do_async("key", fn) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["result"] * 5
+    assert len(calls) == 1 and flight.saved == 4
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight, calls = SingleFlight(), []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return f"result {len(calls)}"
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do_async("key", fn))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flight.do_async("key", fn)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(run()) == ["result 2"] * 3
+    assert len(calls) == 2
+    assert flight.stats() == {"calls": 4, "saved": 2, "in_flight": 0}
+
+
+def test_agent_coalesces_identical_calls(fake_server):
+    url = fake_server(ttft_s=0.2)
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url, coalescer=SingleFlight())
+
+    with ThreadPoolExecutor(4) as pool:
+        texts = list(pool.map(lambda _: agent.generate_email_campaign("Past Customers", "Win-back"), range(4)))
+
+    assert len(set(texts)) == 1
+    assert fetch_stats(url)["requests"] == 1
@@ -0,0 +1,66 @@
+"""
+Deadlines bound scheduler queueing, backoff and each attempt
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from async_agent import AsyncCarDetailerMarketingAgent
+from hedging import DeadlineExceeded, time_limit
+from main import CarDetailerMarketingAgent
+from ratelimit import RequestScheduler
+
+METHOD = "generate_email_campaign"
+
+
+def test_deadline_stops_waiting_in_the_queue(fake_server):
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=fake_server(),
+                                      scheduler=RequestScheduler(requests_per_minute=1))
+    agent.generate(METHOD, "Past Customers", "Seasonal Promotion")
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        agent.generate(METHOD, "New Customers", "Seasonal Promotion", deadline=0.3)
+    assert time.monotonic() - started < 1.0
+    assert agent.scheduler.stats()["queued"] == 0
+
+
+def test_deadline_stops_backoff(fake_server):
+    url = fake_server(rate_limit_rate=1.0, retry_after_s=5.0)
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url, scheduler=RequestScheduler(base_delay=0.01))
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        agent.generate(METHOD, "Past Customers", "Seasonal Promotion", deadline=0.3)
+    with pytest.raises(DeadlineExceeded), time_limit(0.3):
+        "".join(agent.stream(METHOD, "Past Customers", "Win-back"))
+    assert time.monotonic() - started < 2.0
+
+
+def test_async_deadline_stops_waiting_in_the_queue(fake_server):
+    agent = AsyncCarDetailerMarketingAgent(api_key="test", base_url=fake_server(),
+                                           scheduler=RequestScheduler(requests_per_minute=1))
+
+    async def run():
+        await agent.generate(METHOD, "Past Customers", "Seasonal Promotion")
+        with pytest.raises(DeadlineExceeded):
+            await agent.generate(METHOD, "New Customers", "Seasonal Promotion", deadline=0.3)
+
+    started = time.monotonic()
+    asyncio.run(run())
+    assert time.monotonic() - started < 1.0
+    assert agent.scheduler.stats()["queued"] == 0
+
+
+def test_deadline_passes_time_left_to_each_attempt():
+    timeouts = []
+
+    def send(**request):
+        timeouts.append(request["timeout"])
+        return None
+
+    scheduler = RequestScheduler()
+    scheduler.call(send, {"messages": [], "max_tokens": 10}, deadline=time.monotonic() + 5)
+    assert 4 < timeouts[0] <= 5
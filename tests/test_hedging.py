@@ -0,0 +1,133 @@
+"""
+Hedged requests and deadlines
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from fake_server import fetch_stats
+from hedging import DeadlineExceeded, HedgePolicy, resolve_deadline, time_limit
+from main import CarDetailerMarketingAgent
+
+METHOD = "generate_email_campaign"
+
+
+class CountingPolicy(HedgePolicy):
+    """Counts first_token() calls made by the agent's attempts"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.first_tokens = 0
+
+    def run(self, method, attempt, deadline=None):
+        def counted(cancelled, first_token):
+            def first():
+                self.first_tokens += 1
+                first_token()
+            return attempt(cancelled, first)
+        return super().run(method, counted, deadline)
+
+
+def test_late_primary_is_hedged_and_cancelled():
+    policy = HedgePolicy(initial_delay=0.05)
+    cancellations = []
+
+    def attempt(cancelled, first_token):
+        if not cancellations:
+            cancellations.append(cancelled)
+            cancelled.wait(5)
+            return "primary"
+        first_token()
+        return "hedge"
+
+    assert policy.run(METHOD, attempt) == "hedge"
+    assert cancellations[0].is_set()
+    report = policy.report()
+    assert report["hedge_rate"] == 1.0 and report["hedge_won"] == 1
+
+
+def test_fast_primary_is_not_hedged():
+    policy = HedgePolicy(initial_delay=1.0)
+
+    def attempt(cancelled, first_token):
+        first_token()
+        return "primary"
+
+    assert policy.run(METHOD, attempt) == "primary"
+    assert policy.report()["hedge_rate"] == 0.0
+
+
+def test_cancellation_runs_callbacks_once():
+    policy = HedgePolicy(initial_delay=0.05)
+    closed = []
+
+    def attempt(cancelled, first_token):
+        if threading.current_thread().name.endswith("-0"):
+            cancelled.on_cancel(lambda: closed.append("primary"))
+            cancelled.wait(5)
+            return None
+        return "hedge"
+
+    assert policy.run(METHOD, attempt) == "hedge"
+    time.sleep(0.05)
+    assert closed == ["primary"]
+
+
+def test_deadline_raises_and_is_counted():
+    policy = HedgePolicy(initial_delay=10)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        policy.run(METHOD, lambda cancelled, first_token: cancelled.wait(5), deadline=started + 0.2)
+    assert time.monotonic() - started < 1.0
+    assert policy.report()["methods"][METHOD]["deadline_exceeded"] == 1
+
+
+def test_nested_time_limits_keep_the_earliest():
+    with time_limit(10):
+        outer = resolve_deadline(None)
+        with time_limit(60):
+            assert resolve_deadline(None) == outer
+        with time_limit(1):
+            assert resolve_deadline(None) < outer
+    assert resolve_deadline(None) is None
+
+
+def test_async_hedge_wins_over_a_late_primary():
+    policy = HedgePolicy(initial_delay=0.05)
+    calls = []
+
+    async def attempt(first_token):
+        calls.append(len(calls))
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+            return "primary"
+        first_token()
+        return "hedge"
+
+    assert asyncio.run(policy.run_async(METHOD, attempt)) == "hedge"
+    assert policy.report()["hedge_won"] == 1
+
+
+def test_agent_signals_first_token_once_per_attempt(fake_server):
+    url = fake_server(output_tokens=400, tokens_per_chunk=4)
+    policy = CountingPolicy(initial_delay=5)
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url, hedging=policy)
+
+    assert agent.generate(METHOD, "Past Customers", "Seasonal Promotion")
+    assert policy.first_tokens == 1
+    assert fetch_stats(url)["requests"] == 1
+
+
+def test_agent_hedges_a_slow_first_token(fake_server):
+    url = fake_server(ttft_s=0.3)
+    policy = HedgePolicy(initial_delay=0.05)
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url, hedging=policy)
+
+    assert agent.generate(METHOD, "Past Customers", "Seasonal Promotion")
+    assert fetch_stats(url)["requests"] == 2
+    assert policy.report()["hedge_rate"] == 1.0
+    time.sleep(0.3)
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("hedge-")]
@@ -0,0 +1,62 @@
+"""
+Location packing: splitting packed responses, canonical and routed packed calls, fallbacks
+"""
+
+from advanced_agent import AdvancedMarketingAgent
+from canonical import Canonicalizer
+from fake_server import fetch_stats
+from packing import LocationPacker, franchise_seo_locations, split_packed
+from routing import MODEL_TIERS, Router
+from telemetry import Telemetry
+
+GENERATOR = "generate_local_seo_strategy"
+
+
+def test_split_packed_matches_markers_in_any_case():
+    text = "=== Base ===\nShared plan\n== location 1 ==\nNorth delta\n=== LOCATION 2 ===\nSouth delta\n"
+    base, deltas = split_packed(text, 2)
+    assert base == "Shared plan"
+    assert deltas == {1: "North delta", 2: "South delta"}
+
+
+def test_split_packed_ignores_out_of_range_and_unmarked_text():
+    base, deltas = split_packed("=== BASE ===\nPlan\n=== LOCATION 3 ===\nExtra\n", 2)
+    assert base == "Plan" and deltas == {}
+    assert split_packed("No markers at all", 2) == ("No markers at all", {})
+
+
+def test_packed_call_uses_canonical_values_and_routing():
+    router = Router(overrides={GENERATOR: {"tier": "fast"}})
+    agent = AdvancedMarketingAgent(api_key="test", router=router, canonicalizer=Canonicalizer())
+    sent = []
+
+    def complete(method, prompt, max_tokens, model=None, values=None, deadline=None):
+        sent.append((method, prompt, model))
+        return "=== base ===\nShared plan\n=== location 1 ===\nAustin delta\n=== location 2 ===\nRound Rock delta"
+
+    agent.complete = complete
+    packer = LocationPacker(agent)
+    result = packer.generate(GENERATOR, franchise_seo_locations("Shine Co", ["austin texas", "round rock tx"]))
+
+    [(method, prompt, model)] = sent
+    assert method == f"{GENERATOR}.packed" and model == MODEL_TIERS["fast"]
+    assert "Austin, TX" in prompt and "Round Rock, TX" in prompt
+    assert result.requests == 1 and not result.fallbacks
+    assert result.results["round rock tx"].endswith("Round Rock delta")
+    assert router.report()["methods"][GENERATOR]["decisions"] == {"fast/override": 2}
+
+
+def test_locations_missing_from_the_response_fall_back_to_single_calls(fake_server):
+    url = fake_server()
+    telemetry = Telemetry()
+    agent = AdvancedMarketingAgent(api_key="test", base_url=url, telemetry=telemetry,
+                                   router=Router(overrides={GENERATOR: {"tier": "fast"}}))
+    areas = ["Austin, TX", "Dallas, TX", "Houston, TX"]
+    result = LocationPacker(agent).generate(GENERATOR, franchise_seo_locations("Shine Co", areas))
+
+    # The fake server's filler has no section markers, so every location is answered on its own
+    assert result.fallbacks == areas and result.pack_sizes == [3]
+    assert result.requests == fetch_stats(url)["requests"] == 4
+    assert list(result.results) == areas and all(result.results.values())
+    packed = [record for record in telemetry.recent_records() if record.method == f"{GENERATOR}.packed"]
+    assert [record.model for record in packed] == [MODEL_TIERS["fast"]]
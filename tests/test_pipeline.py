@@ -0,0 +1,78 @@
+"""
+Pipeline condensers and runs against a fake server
+"""
+
+from fake_server import fetch_stats
+from main import CarDetailerMarketingAgent, DetailingClient
+from pipeline import Pipeline, Step, head, heading_text, sections
+
+STRATEGY = """# Marketing Strategy for Shine Co
+
+## Executive Summary
+Shine Co should lead with ceramic coating.
+
+## Target Audience
+1. Luxury car owners in West Austin
+2. Fleet managers at rental agencies
+3. New car buyers within 90 days of purchase
+
+**Channels:**
+1. Instagram before-and-after reels
+2. Google Local Services Ads
+
+### Budget Allocation
+- 40% paid search
+"""
+
+
+def test_heading_text():
+    assert heading_text("## Target Audience") == "Target Audience"
+    assert heading_text("**Channels:**") == "Channels"
+    assert heading_text("**Channels**:") == "Channels"
+    assert heading_text("1. Luxury car owners") is None
+    assert heading_text("**Bold** lead-in to a sentence") is None
+
+
+def test_sections_keep_numbered_content_under_the_heading():
+    condensed = sections("target audience")(STRATEGY)
+    assert condensed.splitlines() == ["## Target Audience", "1. Luxury car owners in West Austin",
+                                      "2. Fleet managers at rental agencies",
+                                      "3. New car buyers within 90 days of purchase"]
+    assert "Instagram" not in condensed
+
+    both = sections("audience", "channels")(STRATEGY)
+    assert "Fleet managers" in both and "Instagram" in both and "paid search" not in both
+
+
+def test_sections_fall_back_to_head_without_a_match():
+    text = "line one\nline two\n" * 50
+    assert sections("pricing", max_chars=30)(text) == head(30)(text) == "line one\nline two\nline one"
+
+
+def make_client() -> DetailingClient:
+    return DetailingClient(name="Shine Co", email="", phone="", business_type="independent",
+                           service_area="Austin, TX", monthly_budget=2000, goals=["More leads"])
+
+
+def test_run_passes_condensed_outputs_and_resumes(tmp_path, fake_server):
+    url = fake_server()
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url)
+    pipeline = Pipeline([
+        Step("strategy", "generate_marketing_strategy", (make_client(),)),
+        Step("pricing", "generate_pricing_strategy", ("small", "premium", "Austin, TX")),
+        Step("email", "generate_email_campaign", ("Past Customers", "Seasonal Promotion"),
+             inputs={"strategy": head(200), "pricing": head(100)}),
+    ])
+    checkpoint = str(tmp_path / "pipeline.json")
+
+    result = pipeline.run(agent, checkpoint_path=checkpoint)
+    assert result.succeeded and set(result.outputs()) == {"strategy", "pricing", "email"}
+    assert result.critical_path[-1] == "email"
+    email_inputs = result.results["email"].condensed_inputs
+    assert email_inputs["strategy"] == head(200)(result.outputs()["strategy"])
+    assert fetch_stats(url)["requests"] == 3
+
+    resumed = pipeline.run(agent, checkpoint_path=checkpoint)
+    assert all(step.resumed for step in resumed.results.values())
+    assert resumed.outputs() == result.outputs()
+    assert fetch_stats(url)["requests"] == 3
@@ -0,0 +1,102 @@
+"""
+Seasonal pre-warming against a fake server
+"""
+
+from datetime import datetime
+
+import pytest
+
+from artifacts import ArtifactStore
+from cache import DAY, ResponseCache
+from fake_server import fetch_stats
+from main import CarDetailerMarketingAgent
+from prewarm import Prewarmer, season_start
+from routing import Router
+
+METHOD = "generate_referral_program"
+ARGS = {"business_type": "independent", "service_level": "premium"}
+
+
+@pytest.fixture
+def history(tmp_path):
+    """Three past spring requests for the same referral program"""
+    store = ArtifactStore(str(tmp_path / "history"))
+    for month in (3, 4, 5):
+        created = datetime(datetime.now().year - 1, month, 10).timestamp()
+        store.save(METHOD, "old program", args=ARGS, usage={"input_tokens": 300, "output_tokens": 700},
+                   created_at=created)
+    yield store
+    store.close()
+
+
+def make_prewarmer(url, cache, history, router=None, **kwargs):
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url, cache=cache, router=router)
+    return Prewarmer(agent, history, seasons=("spring",), **kwargs)
+
+
+def test_warm_generates_and_then_skips_cached_calls(tmp_path, fake_server, history):
+    url = fake_server()
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), method_ttls={METHOD: 400 * DAY})
+    prewarmer = make_prewarmer(url, cache, history)
+
+    report = prewarmer.warm()
+    [candidate] = report.candidates
+    assert candidate.status == "warmed" and candidate.season_requests == 3
+    assert report.tokens_used > 0
+    assert cache.expires_at(candidate.key) >= season_start("spring", datetime.now()).timestamp()
+    assert fetch_stats(url)["requests"] == 1
+
+    again = prewarmer.warm()
+    assert again.candidates[0].status == "cached" and again.tokens_used == 0
+    assert fetch_stats(url)["requests"] == 1
+
+
+def test_warm_regenerates_entry_that_expires_before_the_season(tmp_path, fake_server, history):
+    url = fake_server()
+    path = str(tmp_path / "cache.sqlite3")
+    short = make_prewarmer(url, ResponseCache(path, method_ttls={METHOD: 60}), history)
+    short.agent.generate(METHOD, **ARGS)
+    assert fetch_stats(url)["requests"] == 1
+
+    cache = ResponseCache(path, method_ttls={METHOD: 400 * DAY})
+    report = make_prewarmer(url, cache, history).warm()
+
+    [candidate] = report.candidates
+    assert candidate.status == "warmed"
+    assert fetch_stats(url)["requests"] == 2
+    assert cache.expires_at(candidate.key) >= season_start("spring", datetime.now()).timestamp()
+
+
+def test_warm_skips_entries_whose_ttl_cannot_reach_the_season(tmp_path, fake_server, history):
+    url = fake_server()
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), method_ttls={METHOD: 60})
+    now = datetime(datetime.now().year, 1, 1)
+
+    report = make_prewarmer(url, cache, history).warm(now=now)
+
+    assert report.candidates[0].status == "expires_early"
+    assert fetch_stats(url)["requests"] == 0
+
+
+def test_warm_stays_within_budget(tmp_path, fake_server, history):
+    url = fake_server()
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), method_ttls={METHOD: 400 * DAY})
+
+    report = make_prewarmer(url, cache, history, budget_tokens=500).warm()
+
+    assert report.candidates[0].status == "over_budget"
+    assert fetch_stats(url)["requests"] == 0
+
+
+def test_plan_does_not_count_routing_decisions(tmp_path, fake_server, history):
+    url = fake_server()
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), method_ttls={METHOD: 400 * DAY})
+    router = Router()
+    prewarmer = make_prewarmer(url, cache, history, router=router)
+
+    prewarmer.plan()
+    prewarmer.plan()
+    assert router.report()["methods"] == {}
+
+    prewarmer.warm()
+    assert router.report()["methods"][METHOD]["decisions"] == {"standard/default": 1}
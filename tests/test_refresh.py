@@ -0,0 +1,85 @@
+"""
+Staleness-driven refresh against a fake server
+"""
+
+from artifacts import ArtifactStore
+from cache import ResponseCache
+from config import MarketingChannels, MarketingConfig
+from fake_server import fetch_stats
+from main import USAGE_FIELDS, CarDetailerMarketingAgent
+from refresh import RefreshPlanner, refresh
+
+JOBS = ("marketing_strategy", "pricing_strategy")
+
+
+def make_config(name: str, area: str) -> MarketingConfig:
+    return MarketingConfig(business_name=name, business_type="independent", service_area=area,
+                           monthly_budget=2000, channels=MarketingChannels())
+
+
+def make_planner(**kwargs) -> RefreshPlanner:
+    planner = RefreshPlanner(jobs=JOBS, **kwargs)
+    planner.update(make_config("Shine Co", "Austin, TX"), tier="premium")
+    planner.update(make_config("Gloss Works", "Dallas, TX"))
+    return planner
+
+
+def test_refresh_regenerates_and_saves_per_client(tmp_path, fake_server):
+    url = fake_server()
+    artifacts = ArtifactStore(str(tmp_path / "artifacts"))
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url, artifacts=artifacts)
+    planner = make_planner()
+
+    report = refresh(planner, agent, budget_tokens=100_000)
+
+    assert report.completed == 4 and not report.errors
+    assert set(report.outputs) == {(client, job) for client in ("Shine Co", "Gloss Works") for job in JOBS}
+    assert all(report.outputs.values())
+    assert report.tokens == sum(agent.usage[name] for name in USAGE_FIELDS)
+    for client in ("Shine Co", "Gloss Works"):
+        saved = artifacts.query(client=client)
+        assert sorted(artifact.method for artifact in saved) == ["generate_marketing_strategy",
+                                                                 "generate_pricing_strategy"]
+    # Freshly regenerated deliverables are not due again
+    assert refresh(planner, agent, budget_tokens=100_000).completed == 0
+    artifacts.close()
+
+
+def test_refresh_replaces_cached_output(tmp_path, fake_server):
+    url = fake_server()
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url, cache=cache)
+    agent.generate_pricing_strategy("small", "premium", "Austin, TX")
+    requests = fetch_stats(url)["requests"]
+
+    report = refresh(make_planner(), agent, budget_tokens=100_000)
+
+    assert report.completed == 4
+    assert fetch_stats(url)["requests"] == requests + 4
+    assert cache.hits == 0
+    assert agent.generate_pricing_strategy("small", "premium", "Austin, TX") == \
+        report.outputs[("Shine Co", "pricing_strategy")]
+
+
+def test_refresh_stays_within_budget(fake_server):
+    url = fake_server()
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url)
+    planner = make_planner()
+
+    report = refresh(planner, agent, budget_tokens=5000)
+
+    assert report.completed == 1
+    assert report.selected[0][0] == "Shine Co"  # the premium client scores higher
+    assert len(refresh(planner, agent, budget_tokens=100_000).selected) == 3
+
+
+def test_planner_seeds_from_history(tmp_path):
+    history = ArtifactStore(str(tmp_path / "artifacts"))
+    history.save("generate_marketing_strategy", "strategy", client="Shine Co",
+                 usage={"input_tokens": 400, "output_tokens": 900})
+    planner = make_planner(history=history)
+
+    item = planner.items[("Shine Co", "marketing_strategy")]
+    assert item.generated_at > 0 and item.tokens == 1300
+    assert planner.items[("Gloss Works", "marketing_strategy")].generated_at == 0
+    history.close()
@@ -0,0 +1,94 @@
+"""
+Model routing, observed limits and the truncation retry
+"""
+
+from fake_server import fetch_stats
+from main import CarDetailerMarketingAgent
+from registry import get_spec
+from routing import MAX_MAX_TOKENS, OBSERVED_LIMITS, Router
+from telemetry import Telemetry
+
+METHOD = "generate_email_campaign"
+
+
+def trained_router(url: str, samples: int = 5) -> Router:
+    """A router whose telemetry has seen short email campaigns from the server at url"""
+    telemetry = Telemetry()
+    router = Router(telemetry=telemetry, min_samples=samples)
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url, telemetry=telemetry, router=router)
+    for i in range(samples):
+        agent.generate(METHOD, f"Segment {i}", "Seasonal Promotion")
+    return router
+
+
+def test_route_sizes_and_tiers():
+    router = Router()
+    small = router.route(get_spec("create_social_media_content"), {"service_type": "Tint", "num_posts": 1})
+    large = router.route(get_spec("create_social_media_content"), {"service_type": "Tint", "num_posts": 20})
+    assert (small.tier, small.reason) == ("fast", "size") and small.max_tokens == 448
+    assert (large.tier, large.max_tokens) == ("standard", MAX_MAX_TOKENS)
+
+    overridden = Router(overrides={METHOD: {"tier": "fast", "max_tokens": 300}})
+    route = overridden.route(get_spec(METHOD), {})
+    assert (route.tier, route.max_tokens, route.reason) == ("fast", 300, "override")
+    assert overridden.retry_limit(METHOD, 300) is None
+
+
+def test_observed_limit_snaps_to_a_bucket(fake_server):
+    router = trained_router(fake_server(output_tokens=100))
+    route = router.route(get_spec(METHOD), {})
+    assert (route.reason, route.max_tokens) == ("observed", 256)
+    assert route.max_tokens in OBSERVED_LIMITS
+    assert router.retry_limit(METHOD, 256) == get_spec(METHOD).max_tokens
+
+
+def test_truncated_response_is_retried_and_both_attempts_are_counted(fake_server):
+    router = trained_router(fake_server(output_tokens=100))
+    url = fake_server(output_tokens=400)
+    telemetry = router.telemetry
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url, telemetry=telemetry, router=router)
+
+    text = agent.generate(METHOD, "Lapsed Customers", "Win-back")
+
+    assert fetch_stats(url)["requests"] == 2
+    assert len(text) >= 400 * 4 - 8
+    record = telemetry.recent_records()[-1]
+    assert record.output_tokens == 256 + 400
+    assert agent.last_usage["output_tokens"] == agent.usage["output_tokens"] == 656
+    assert router.report()["methods"][METHOD]["decisions"]["truncated_retry"] == 1
+
+
+def test_truncated_stream_is_continued_and_cached_whole(tmp_path, fake_server):
+    from cache import ResponseCache
+
+    router = trained_router(fake_server(output_tokens=100))
+    url = fake_server(output_tokens=400)
+    # Telemetry of its own, so the router's observed limit, and with it the cache key, stays put
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url, telemetry=Telemetry(), router=router,
+                                      cache=ResponseCache(str(tmp_path / "cache")))
+
+    text = "".join(agent.stream(METHOD, "Lapsed Customers", "Win-back"))
+
+    assert fetch_stats(url)["requests"] == 2
+    assert len(text) > 256 * 4
+    assert agent.last_usage["output_tokens"] == 256 + 400
+    assert "".join(agent.stream(METHOD, "Lapsed Customers", "Win-back")) == text
+    assert agent.generate(METHOD, "Lapsed Customers", "Win-back") == text
+    assert fetch_stats(url)["requests"] == 2
+
+
+def test_async_truncated_stream_is_continued(fake_server):
+    import asyncio
+
+    from async_agent import AsyncCarDetailerMarketingAgent
+
+    router = trained_router(fake_server(output_tokens=100))
+    url = fake_server(output_tokens=400)
+    agent = AsyncCarDetailerMarketingAgent(api_key="test", base_url=url, telemetry=Telemetry(), router=router)
+
+    async def collect():
+        return "".join([text async for text in agent.stream(METHOD, "Lapsed Customers", "Win-back")])
+
+    assert len(asyncio.run(collect())) > 256 * 4
+    assert fetch_stats(url)["requests"] == 2
+    assert agent.last_usage["output_tokens"] == 656
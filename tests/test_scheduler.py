@@ -0,0 +1,114 @@
+"""
+Rate limit scheduler retries against injected 429s
+"""
+
+import threading
+
+import pytest
+
+from fake_server import fetch_stats
+from main import CarDetailerMarketingAgent
+from ratelimit import RequestScheduler
+from telemetry import Telemetry
+
+
+def make_agent(base_url: str) -> CarDetailerMarketingAgent:
+    scheduler = RequestScheduler(base_delay=0.01, max_delay=0.05)
+    return CarDetailerMarketingAgent(api_key="test", base_url=base_url, scheduler=scheduler, telemetry=Telemetry())
+
+
+def test_call_retries_rate_limits(fake_server):
+    url = fake_server(rate_limit_rate=0.4)
+    agent = make_agent(url)
+
+    texts = [agent.generate_email_campaign(f"Segment {i}", "Seasonal Promotion") for i in range(6)]
+
+    stats = fetch_stats(url)
+    assert all(texts)
+    assert stats["errors"] > 0
+    assert agent.scheduler.retries == stats["errors"]
+    assert agent.scheduler.throttled == stats["errors"]
+    assert stats["requests"] == len(texts) + stats["errors"]
+
+
+def test_stream_retries_rate_limits(fake_server):
+    url = fake_server(rate_limit_rate=0.4)
+    agent = make_agent(url)
+
+    texts = ["".join(agent.stream_email_campaign(f"Segment {i}", "Win-back")) for i in range(6)]
+
+    stats = fetch_stats(url)
+    assert all(texts)
+    assert stats["errors"] > 0
+    assert agent.scheduler.retries == stats["errors"]
+    assert agent.usage["output_tokens"] > 0
+
+
+def test_retries_are_recorded_per_call(fake_server):
+    url = fake_server(rate_limit_rate=0.4)
+    agent = make_agent(url)
+
+    for i in range(6):
+        agent.generate_email_campaign(f"Segment {i}", "Seasonal Promotion")
+
+    retries = sum(record.retries for record in agent.telemetry.recent_records())
+    assert retries == fetch_stats(url)["errors"]
+
+
+class Usage:
+    def __init__(self, input_tokens: int, output_tokens: int):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def test_settle_refunds_and_debits_the_estimate_error():
+    now = [0.0]
+    scheduler = RequestScheduler(tokens_per_minute=1000, clock=lambda: now[0])
+
+    scheduler.acquire(400)
+    scheduler.settle(400, Usage(100, 100))
+    assert scheduler.stats()["token_budget"] == 800
+
+    scheduler.acquire(400)
+    scheduler.settle(400, Usage(300, 1200))
+    assert scheduler.stats()["token_budget"] == -700
+
+    # The overdraft has to be earned back before the next request goes out
+    assert scheduler.tokens.wait_for(100) == pytest.approx(48.0)
+
+
+def test_retry_counters_are_exact_under_concurrency():
+    scheduler = RequestScheduler(base_delay=0.0)
+    threads = [threading.Thread(target=lambda: [scheduler._backoff(0, RateLimited()) for _ in range(2000)])
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert scheduler.stats()["retries"] == scheduler.stats()["throttled"] == 16_000
+
+
+def test_interactive_requests_go_before_bulk():
+    from ratelimit import BULK, INTERACTIVE
+
+    scheduler = RequestScheduler(requests_per_minute=60)
+    scheduler.requests.level = 0
+    order = []
+
+    def take(name, priority):
+        scheduler.acquire(1, priority)
+        order.append(name)
+
+    bulk = threading.Thread(target=take, args=("bulk", BULK))
+    bulk.start()
+    while not scheduler.stats()["queued"]:
+        pass
+    interactive = threading.Thread(target=take, args=("interactive", INTERACTIVE))
+    interactive.start()
+    bulk.join()
+    interactive.join()
+    assert order == ["interactive", "bulk"]
@@ -0,0 +1,137 @@
+"""
+HTTP service: fair queue, routes, malformed requests and job retention
+"""
+
+import asyncio
+import json
+
+from async_agent import AsyncAdvancedMarketingAgent
+from service import FairJobQueue, Job, MarketingService
+
+REFERRAL = "generate_referral_program"
+BODY = {"business_type": "independent", "service_level": "premium"}
+
+
+def job(tenant, number=0):
+    return Job(f"{tenant}-{number}", tenant, REFERRAL, dict(BODY))
+
+
+def test_fair_queue_takes_tenants_in_turn_and_rejects_when_full():
+    async def run():
+        queue = FairJobQueue(max_queued=4)
+        for item in (job("a", 1), job("a", 2), job("a", 3), job("b", 1)):
+            assert await queue.submit(item)
+        assert not await queue.submit(job("c"))
+        order = [(await queue.next()).id for _ in range(4)]
+        return order, queue.stats()
+
+    order, stats = asyncio.run(run())
+    assert order == ["a-1", "b-1", "a-2", "a-3"]
+    assert stats == {"queued": 0, "running": 4, "rejected": 1, "tenants_waiting": 0}
+
+
+def test_fair_queue_holds_a_tenant_at_its_cap_until_a_job_is_released():
+    async def run():
+        queue = FairJobQueue(tenant_concurrency=1)
+        for number in (1, 2):
+            await queue.submit(job("a", number))
+        first = await queue.next()
+        waiting = asyncio.create_task(queue.next())
+        await asyncio.sleep(0.01)
+        blocked = not waiting.done()
+        await queue.release(first)
+        return blocked, (await asyncio.wait_for(waiting, 1)).id
+
+    assert asyncio.run(run()) == (True, "a-2")
+
+
+async def send(address, raw: bytes):
+    """Send one raw request and return (status, headers, body)"""
+    reader, writer = await asyncio.open_connection(*address)
+    writer.write(raw)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.lower().split(": ", 1) for line in lines[1:])
+    return int(lines[0].split(" ")[1]), headers, body
+
+
+def dechunk(body: bytes) -> bytes:
+    """Join the chunks of a chunked response body"""
+    data = b""
+    while True:
+        size, _, body = body.partition(b"\r\n")
+        if not int(size, 16):
+            return data
+        data, body = data + body[:int(size, 16)], body[int(size, 16) + 2:]
+
+
+def request(method, path, body=None, tenant="shop-1"):
+    data = json.dumps(body).encode("utf-8") if body is not None else b""
+    return (f"{method} {path} HTTP/1.1\r\nhost: test\r\nx-tenant: {tenant}\r\nconnection: close\r\n"
+            f"content-length: {len(data)}\r\n\r\n").encode("latin-1") + data
+
+
+def run_service(url, scenario, **kwargs):
+    async def run():
+        service = MarketingService(AsyncAdvancedMarketingAgent(api_key="test", base_url=url), max_concurrency=2,
+                                   **kwargs)
+        address = await service.start(port=0)
+        try:
+            return await scenario(service, address)
+        finally:
+            await service.stop()
+    return asyncio.run(run())
+
+
+def test_generators_run_wait_poll_and_stream(fake_server):
+    url = fake_server()
+
+    async def scenario(service, address):
+        status, _, body = await send(address, request("POST", f"/generators/{REFERRAL}", BODY))
+        assert status == 200 and json.loads(body)["status"] == "succeeded"
+
+        status, headers, body = await send(address, request("POST", f"/generators/{REFERRAL}?mode=job", BODY))
+        assert status == 202 and headers["location"] == f"/jobs/{json.loads(body)['id']}"
+        await service.jobs[json.loads(body)["id"]].done.wait()
+        assert (await send(address, request("GET", headers["location"], tenant="shop-2")))[0] == 404
+        status, _, body = await send(address, request("GET", headers["location"]))
+        assert status == 200 and json.loads(body)["result"]
+
+        status, headers, body = await send(address, request("POST", f"/generators/{REFERRAL}?mode=stream", BODY))
+        assert status == 200 and headers["transfer-encoding"] == "chunked" and body.endswith(b"0\r\n\r\n")
+        assert dechunk(body) == service.jobs[headers["x-job-id"]].result.encode("utf-8")
+
+    run_service(url, scenario)
+
+
+def test_bad_requests_are_answered_with_errors(fake_server):
+    url = fake_server()
+
+    async def scenario(service, address):
+        bad_length = f"POST /generators/{REFERRAL} HTTP/1.1\r\ncontent-length: ten\r\n\r\n".encode("latin-1")
+        status, _, body = await send(address, bad_length)
+        assert status == 400 and json.loads(body)["error"] == "Invalid content-length"
+
+        assert (await send(address, request("POST", f"/generators/{REFERRAL}", {"business_type": "x"})))[0] == 400
+        assert (await send(address, request("POST", "/generators/no_such_generator", BODY)))[0] == 404
+        assert (await send(address, request("GET", f"/generators/{REFERRAL}")))[0] == 405
+        status, _, body = await send(address, request("GET", "/healthz"))
+        assert status == 200 and json.loads(body)["queued"] == 0
+
+    run_service(url, scenario)
+
+
+def test_only_finished_jobs_are_forgotten_past_max_jobs():
+    async def run():
+        service = MarketingService(agent=object(), max_jobs=2)
+        jobs = [job("a", number) for number in range(4)]
+        for item in jobs[1:3]:
+            item.done.set()
+        for item in jobs:
+            service._remember(item)
+        return list(service.jobs)
+
+    assert asyncio.run(run()) == ["a-0", "a-3"]
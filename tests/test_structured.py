@@ -0,0 +1,56 @@
+"""
+Structured output: items parsed from a JSON stream as they complete
+"""
+
+import json
+
+from cache import ResponseCache
+from main import CarDetailerMarketingAgent
+from structured import ItemStreamParser
+
+DOCUMENT = {
+    "summary": "Spring push [with brackets] and \"quotes\"",
+    "posts": [
+        {"platform": "Instagram", "caption": "Before } after {", "hashtags": ["#detail", "#shine"]},
+        {"platform": "TikTok", "caption": "Escaped \\\" quote", "hashtags": []},
+    ],
+    "notes": ["not", "watched"],
+    "budget_allocation": ["Google Ads", "Flyers"],
+}
+
+
+def feed_all(parser, text, size):
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return items
+
+
+def test_items_of_watched_lists_arrive_in_order_whatever_the_chunking():
+    text = json.dumps(DOCUMENT)
+    expected = [("posts", post) for post in DOCUMENT["posts"]] + [
+        ("budget_allocation", line) for line in DOCUMENT["budget_allocation"]]
+    for size in (1, 2, 7, len(text)):
+        assert feed_all(ItemStreamParser(("posts", "budget_allocation")), text, size) == expected
+
+
+def test_each_item_is_returned_by_the_chunk_that_completes_it():
+    parser = ItemStreamParser(("posts",))
+    text = json.dumps({"posts": [{"a": 1}, {"b": 2}]})
+    cut = text.index("}") + 1
+    assert parser.feed(text[:cut - 1]) == []
+    assert parser.feed(text[cut - 1:cut]) == [("posts", {"a": 1})]
+    assert parser.feed(text[cut:]) == [("posts", {"b": 2})]
+
+
+def test_stream_structured_yields_the_items_generate_structured_returns(tmp_path, fake_server):
+    url = fake_server()
+    agent = CarDetailerMarketingAgent(api_key="test", base_url=url,
+                                      cache=ResponseCache(str(tmp_path / "cache.sqlite3")))
+    streamed = list(agent.stream_structured("create_social_media_content", "ceramic coating", 3))
+    assert streamed and all(field == "posts" for field, _ in streamed)
+
+    # The same request, now a cache hit of the streamed text
+    result = agent.generate_structured("create_social_media_content", "ceramic coating", 3)
+    assert agent.last_call.cache_hit
+    assert [item for _, item in streamed] == result["posts"]
@@ -0,0 +1,48 @@
+"""
+Telemetry snapshots and Prometheus export
+"""
+
+import re
+
+from telemetry import CallRecord, Telemetry
+
+FAST, STANDARD = "claude-3-5-haiku-20241022", "claude-3-5-sonnet-20241022"
+
+
+def record(telemetry: Telemetry, model: str, output_tokens: int = 100, cache_hit: bool = False):
+    call = CallRecord("generate_email_campaign", model, 512, input_tokens=50, output_tokens=output_tokens,
+                      cache_hit=cache_hit, latency=0.2, ttfb=0.05)
+    telemetry.record(call)
+
+
+def counter(text: str, name: str, model: str) -> float:
+    pattern = rf'^marketing_agent_{name}{{method="generate_email_campaign",model="{model}"}} (\S+)$'
+    return float(re.search(pattern, text, re.MULTILINE).group(1))
+
+
+def test_prometheus_series_per_method_and_model():
+    telemetry = Telemetry()
+    record(telemetry, STANDARD)
+    record(telemetry, STANDARD)
+    before = telemetry.export_prometheus()
+
+    record(telemetry, FAST)
+    after = telemetry.export_prometheus()
+
+    assert counter(before, "calls_total", STANDARD) == counter(after, "calls_total", STANDARD) == 2
+    assert counter(after, "calls_total", FAST) == 1
+    assert counter(after, "latency_seconds_count", FAST) == 1
+    assert counter(after, "max_tokens", FAST) == 512
+
+
+def test_snapshot_totals_cover_every_model():
+    telemetry = Telemetry()
+    record(telemetry, STANDARD, output_tokens=300)
+    record(telemetry, FAST, output_tokens=100)
+    record(telemetry, FAST, cache_hit=True)
+
+    stats = telemetry.snapshot()["methods"]["generate_email_campaign"]
+    assert stats["model"] == FAST
+    assert stats["calls"] == 3 and stats["cache_hits"] == 1 and stats["measured"] == 2
+    assert stats["output_tokens"] == 500
+    assert telemetry.output_samples("generate_email_campaign") == [300, 100]